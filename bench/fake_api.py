@@ -0,0 +1,175 @@
+"""Локальная замена Bot API для нагрузочного теста
+
+Принимает запросы бота по адресу /bot<token>/<method>, отвечает как
+Telegram (sendMessage, sendPhoto, sendMediaGroup, editMessageText,
+editMessageMedia, deleteMessage, answerCallbackQuery и др.), добавляет
+задержку и случайные ответы 429. Последнее сообщение с inline-клавиатурой
+в каждом чате доступно генератору нагрузки, чтобы «нажимать» кнопки.
+"""
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+# Методы, возвращающие сообщение
+SEND_METHODS = {"sendMessage", "sendPhoto"}
+EDIT_METHODS = {"editMessageText", "editMessageMedia", "editMessageCaption", "editMessageReplyMarkup"}
+
+
+class FakeBotAPI:
+    """Bot API с задержкой latency ± jitter секунд и долей ответов 429 rate_429"""
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.02, rate_429: float = 0.0,
+                 retry_after: int = 1, seed: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+        self._next_message_id = 1
+        # chat_id -> message_id -> сообщение
+        self.messages: Dict[int, Dict[int, Dict[str, Any]]] = {}
+        # chat_id -> последнее сообщение с inline-клавиатурой
+        self.last_markup: Dict[int, Dict[str, Any]] = {}
+        self.calls: Counter = Counter()
+        self.calls_by_chat: Counter = Counter()
+        self.injected_429 = 0
+        self.url = ""
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, handle_signals=False, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self.url = "http://%s:%d" % self._runner.addresses[0][:2]
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # ========== ОБРАБОТКА ЗАПРОСОВ ==========
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        chat_id = self._chat_of(params)
+
+        self.calls[method] += 1
+        if chat_id is not None:
+            self.calls_by_chat[chat_id] += 1
+
+        await asyncio.sleep(max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter)))
+
+        if self.rate_429 and self._rng.random() < self.rate_429:
+            self.injected_429 += 1
+            return web.json_response({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            })
+
+        handler = getattr(self, f"_{method}", None)
+        if handler is not None:
+            result = handler(chat_id, params)
+        elif method in SEND_METHODS:
+            result = self._send(chat_id, params)
+        elif method in EDIT_METHODS:
+            result = self._edit(chat_id, params)
+        else:
+            result = True
+        if isinstance(result, web.Response):
+            return result
+        return web.json_response({"ok": True, "result": result})
+
+    @staticmethod
+    def _chat_of(params: Dict[str, str]) -> Optional[int]:
+        if "chat_id" in params:
+            return int(params["chat_id"])
+        # id callback-запроса генератор нагрузки строит как <user_id>:<номер>
+        if "callback_query_id" in params:
+            return int(params["callback_query_id"].split(":")[0])
+        return None
+
+    @staticmethod
+    def _error(description: str) -> web.Response:
+        return web.json_response({"ok": False, "error_code": 400, "description": description})
+
+    def _message(self, chat_id: int, params: Dict[str, str]) -> Dict[str, Any]:
+        message = {
+            "message_id": self._next_message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+        }
+        self._next_message_id += 1
+        self._fill(message, params)
+        return message
+
+    def _fill(self, message: Dict[str, Any], params: Dict[str, str]):
+        if "photo" in params:
+            message["photo"] = [self._photo_size(params["photo"])]
+            message.pop("text", None)
+        if "text" in params:
+            message["text"] = params["text"]
+        if "caption" in params:
+            message["caption"] = params["caption"]
+        if "reply_markup" in params:
+            markup = json.loads(params["reply_markup"])
+            if "inline_keyboard" in markup:
+                message["reply_markup"] = markup
+            else:
+                message.pop("reply_markup", None)
+
+    @staticmethod
+    def _photo_size(file_id: str) -> Dict[str, Any]:
+        return {"file_id": file_id, "file_unique_id": file_id[-16:], "width": 800, "height": 600}
+
+    def _store(self, chat_id: int, message: Dict[str, Any]):
+        self.messages.setdefault(chat_id, {})[message["message_id"]] = message
+        if "reply_markup" in message:
+            self.last_markup[chat_id] = message
+
+    def _send(self, chat_id: int, params: Dict[str, str]) -> Dict[str, Any]:
+        message = self._message(chat_id, params)
+        self._store(chat_id, message)
+        return message
+
+    def _edit(self, chat_id: int, params: Dict[str, str]):
+        message = self.messages.get(chat_id, {}).get(int(params.get("message_id", 0)))
+        if message is None:
+            return self._error("Bad Request: message to edit not found")
+        if "media" in params:
+            media = json.loads(params["media"])
+            message["photo"] = [self._photo_size(media["media"])]
+            message["caption"] = media.get("caption", "")
+        message.pop("reply_markup", None)
+        self._fill(message, params)
+        self._store(chat_id, message)
+        return message
+
+    def _sendMediaGroup(self, chat_id: int, params: Dict[str, str]):
+        return [
+            self._send(chat_id, {"photo": item["media"], "caption": item.get("caption", "")})
+            for item in json.loads(params["media"])
+        ]
+
+    def _deleteMessage(self, chat_id: int, params: Dict[str, str]):
+        message = self.messages.get(chat_id, {}).pop(int(params["message_id"]), None)
+        if message is None:
+            return self._error("Bad Request: message to delete not found")
+        if self.last_markup.get(chat_id) is message:
+            del self.last_markup[chat_id]
+        return True
+
+    def _getMe(self, chat_id, params):
+        return {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+    def _getFile(self, chat_id, params):
+        return {"file_id": params["file_id"], "file_unique_id": params["file_id"][-16:]}
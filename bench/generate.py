@@ -0,0 +1,151 @@
+"""Детерминированная генерация тестовой БД для бенчмарков
+
+    python -m bench.generate --db bench/scratch.db --users 100000 --ads 1000000
+
+Схема создаётся миграциями бота, данные вставляются пачками напрямую
+через sqlite3; счётчики (user_stats, category_stats) и FTS-индекс
+заполняют триггеры, как в рабочей БД.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+from config import CATEGORIES
+
+# Фиксированная «текущая» дата, чтобы данные не зависели от дня запуска
+END = datetime(2025, 1, 1)
+PERIOD_DAYS = 365
+BATCH = 10000
+
+# Доли категорий: перекос в сторону первой, как в реальной ленте
+CATEGORY_WEIGHTS = [0.55, 0.25, 0.12, 0.08]
+WORDS = (
+    "машина седан джип купе тюнинг пробег дом квартира особняк гараж "
+    "бизнес магазин кафе заправка автосалон срочно торг новый редкий "
+    "полный комплект гос номер вип дешево обмен"
+).split()
+
+
+def _timestamp(rng: random.Random) -> str:
+    moment = END - timedelta(seconds=rng.randrange(PERIOD_DAYS * 24 * 3600))
+    return moment.strftime(db.TIMESTAMP_FORMAT)
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _seller(rng: random.Random, users: int) -> int:
+    # Степенное распределение: несколько продавцов дают большую часть объявлений
+    return 1 + int(users * rng.random() ** 3)
+
+
+def _users(rng: random.Random, count: int, blocked: float):
+    for telegram_id in range(1, count + 1):
+        # У части продавцов нет username - с ними связываются через бота
+        username = f"user{telegram_id}" if rng.random() < 0.5 else None
+        yield (
+            telegram_id, username, f"Nick_{telegram_id}", str(100000 + telegram_id),
+            int(rng.random() < blocked), _timestamp(rng)
+        )
+
+
+def _ads(rng: random.Random, count: int, users: int, deleted: float):
+    categories = list(CATEGORIES)
+    for _ in range(count):
+        value = int(rng.lognormvariate(13, 1.2))
+        negotiable = rng.random() < 0.1
+        price = f"{value:,}".replace(",", " ") + (" торг" if negotiable else "")
+        yield (
+            _seller(rng, users), _text(rng, rng.randint(2, 5)), _text(rng, rng.randint(8, 30)),
+            price, rng.choices(categories, CATEGORY_WEIGHTS[:len(categories)])[0],
+            int(rng.random() >= deleted), _timestamp(rng), value, int(negotiable)
+        )
+
+
+def _insert(conn: sqlite3.Connection, sql: str, rows, label: str):
+    batch, done, started = [], 0, time.perf_counter()
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH:
+            conn.executemany(sql, batch)
+            done += len(batch)
+            batch.clear()
+            print(f"\r{label}: {done}", end="", flush=True)
+    if batch:
+        conn.executemany(sql, batch)
+        done += len(batch)
+    print(f"\r{label}: {done} за {time.perf_counter() - started:.1f} с")
+
+
+async def _create_schema():
+    await db.init_db()
+    await db.close_db()
+
+
+def generate(path: str, users: int, ads: int, blocked: float, deleted: float,
+             photos: float, seed: int):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    # Схема, индексы и триггеры - миграциями бота
+    db.DATABASE = path
+    asyncio.run(_create_schema())
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("BEGIN")
+    _insert(
+        conn,
+        """INSERT INTO users (telegram_id, username, game_nick, game_id, is_blocked, created_at)
+           VALUES (?, ?, ?, ?, ?, ?)""",
+        _users(rng, users, blocked), "Пользователи"
+    )
+    _insert(
+        conn,
+        """INSERT INTO ads (user_id, title, description, price, category, is_active,
+                            created_at, price_value, price_negotiable)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        _ads(rng, ads, users, deleted), "Объявления"
+    )
+    photo_rows = (
+        (ad_id, position, f"AgACAgIAAxkBAAI{ad_id}_{position}")
+        for ad_id in range(1, ads + 1) if rng.random() < photos
+        for position in range(rng.randint(1, 3))
+    )
+    _insert(
+        conn, "INSERT INTO ad_photos (ad_id, position, file_id) VALUES (?, ?, ?)",
+        photo_rows, "Фото"
+    )
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    print(f"Готово: {path} ({os.path.getsize(path) / 1024 / 1024:.0f} МБ)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация тестовой БД для бенчмарков")
+    parser.add_argument("--db", default="bench/scratch.db")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--ads", type=int, default=1000000)
+    parser.add_argument("--blocked", type=float, default=0.02, help="доля заблокированных пользователей")
+    parser.add_argument("--deleted", type=float, default=0.2, help="доля удалённых объявлений")
+    parser.add_argument("--photos", type=float, default=0.6, help="доля объявлений с фото")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    generate(args.db, args.users, args.ads, args.blocked, args.deleted, args.photos, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""Нагрузочный тест диспетчера на локальной замене Bot API
+
+    python -m bench.load --users 2000 --latency 0.05 --rate-429 0.01
+    API_GLOBAL_RATE=1000 python -m bench.load --db bench/scratch.db --out bench/load.json
+
+Апдейты подаются прямо в Dispatcher со всеми роутерами и middleware,
+запросы бота уходят по HTTP в bench.fake_api. Каждый симулированный
+пользователь проходит сценарий: регистрация, (иногда) создание
+объявления с фото, листание 50 карточек, связь с продавцом; один
+админ запускает рассылку. В отчёте - перцентили времени обработки
+апдейта по шагам и хендлерам, число запросов к Bot API в чате
+пользователя на действие.
+
+Лимиты исходящих запросов и антифлуд работают как в боевом режиме
+(их настройки берутся из переменных окружения).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Токен нужен только для формата URL: запросы уходят в fake_api
+os.environ.setdefault("BOT_TOKEN", "123456:BENCH")
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Update
+
+import broadcast
+import database as db
+import metrics
+from bench.fake_api import FakeBotAPI
+from bench.generate import generate
+from bench.run import percentile
+from config import ADMIN_IDS
+from loader import create_bot, create_dispatcher
+from middlewares import throttling
+from ratelimit import api_limiter
+
+
+class Harness:
+    """Подача апдейтов в диспетчер и учёт времени и запросов по шагам"""
+
+    def __init__(self, dp: Dispatcher, bot: Bot, api: FakeBotAPI, think: float, seed: int):
+        self.dp = dp
+        self.bot = bot
+        self.api = api
+        self.think = think
+        self.seed = seed
+        self._update_id = 0
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.api_calls: Dict[str, List[int]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.updates = 0
+
+    async def feed(self, user_id: int, step: str, payload: Dict[str, Any]):
+        self._update_id += 1
+        update = Update.model_validate(
+            {"update_id": self._update_id, **payload}, context={"bot": self.bot}
+        )
+        calls_before = self.api.calls_by_chat[user_id]
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception:
+            self.errors[step] += 1
+        self.latencies[step].append(time.perf_counter() - started)
+        self.api_calls[step].append(self.api.calls_by_chat[user_id] - calls_before)
+        self.updates += 1
+
+
+class SimulatedUser:
+    """Пользователь Telegram: пишет сообщения и нажимает кнопки последнего сообщения бота"""
+
+    def __init__(self, harness: Harness, user_id: int):
+        self.h = harness
+        self.id = user_id
+        self.rng = random.Random(harness.seed * 1000003 + user_id)
+        self._callbacks = 0
+        self._messages = 0
+
+    @property
+    def _from(self) -> Dict[str, Any]:
+        user = {"id": self.id, "is_bot": False, "first_name": f"User{self.id}"}
+        # У части пользователей нет username - с ними связываются через бота
+        if self.id % 2:
+            user["username"] = f"user{self.id}"
+        return user
+
+    async def pause(self):
+        await asyncio.sleep(self.h.think * self.rng.uniform(0.5, 1.5))
+
+    async def send(self, step: str, text: str = None, photo: str = None):
+        self._messages += 1
+        message = {
+            "message_id": self._messages, "date": int(time.time()),
+            "chat": {"id": self.id, "type": "private"}, "from": self._from,
+        }
+        if photo is not None:
+            message["photo"] = [{"file_id": photo, "file_unique_id": photo[-16:],
+                                 "width": 800, "height": 600}]
+        else:
+            message["text"] = text
+        await self.h.feed(self.id, step, {"message": message})
+        await self.pause()
+
+    def buttons(self) -> List[str]:
+        """callback_data кнопок последнего сообщения бота с inline-клавиатурой"""
+        message = self.h.api.last_markup.get(self.id)
+        if message is None:
+            return []
+        return [
+            button["callback_data"]
+            for row in message["reply_markup"]["inline_keyboard"] for button in row
+            if "callback_data" in button
+        ]
+
+    def find(self, *parts: str) -> Optional[str]:
+        for data in self.buttons():
+            if all(part in data for part in parts):
+                return data
+        return None
+
+    async def click(self, step: str, data: str) -> bool:
+        message = self.h.api.last_markup.get(self.id)
+        if message is None:
+            return False
+        self._callbacks += 1
+        await self.h.feed(self.id, step, {"callback_query": {
+            "id": f"{self.id}:{self._callbacks}", "from": self._from,
+            "chat_instance": str(self.id), "data": data, "message": message,
+        }})
+        await self.pause()
+        return True
+
+
+# ========== СЦЕНАРИИ ==========
+
+async def registration(user: SimulatedUser):
+    await user.send("start", "/start")
+    await user.send("reg_nick", f"Nick{user.id}")
+    await user.send("reg_game_id", str(100000 + user.id % 900000))
+
+
+async def create_ad(user: SimulatedUser, photos: int):
+    await user.send("create_start", "📢 Разместить объявление")
+    await user.send("create_title", f"Продам машину {user.id}")
+    await user.send("create_description", "Седан, полный комплект, тюнинг, гос номер")
+    await user.send("create_price", f"{user.rng.randint(1, 500) * 10000}$")
+    category = user.find("create_cat_")
+    if category is None:
+        return
+    await user.click("create_category", category)
+    for index in range(photos):
+        await user.send("create_photo", photo=f"AgACAgIAAxkBAAI{user.id}_{index}")
+    await user.click("create_photos_done", "photos_done")
+    await user.click("create_confirm", "confirm_ad")
+
+
+async def browse(user: SimulatedUser, pages: int):
+    await user.send("browse_start", "🔍 Смотреть объявления")
+    categories = [data for data in user.buttons() if data.startswith("view_cat_")]
+    if not categories:
+        return
+    await user.click("browse_category", user.rng.choice(categories))
+    for _ in range(pages):
+        next_page = user.find("nav_", "_n_")
+        if next_page is None:
+            break
+        await user.click("browse_next", next_page)
+
+
+async def contact(user: SimulatedUser):
+    button = user.find("contact_")
+    if button is None or not await user.click("contact_start", button):
+        return
+    await user.send("contact_message", "Здравствуйте! Ещё продаёте?")
+
+
+async def user_script(user: SimulatedUser, create_share: float, photos: int, pages: int):
+    await registration(user)
+    if user.rng.random() < create_share:
+        await create_ad(user, photos)
+    await browse(user, pages)
+    await contact(user)
+
+
+async def admin_script(admin: SimulatedUser):
+    await registration(admin)
+    await admin.send("admin_panel", "🔧 Админ-панель")
+    await admin.click("admin_broadcast", "admin_broadcast")
+    await admin.send("admin_broadcast_text", "Нагрузочный тест: техработы в 03:00")
+
+
+# ========== ОТЧЁТ ==========
+
+def summary(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 0.5) * 1000,
+        "p95_ms": percentile(samples, 0.95) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+def histogram_quantile(child, q: float) -> float:
+    """Оценка перцентиля по корзинам гистограммы metrics (верхняя граница корзины)"""
+    target, cumulative = q * child.count, 0
+    for bound, count in zip(child.bounds + (float("inf"),), child.counts):
+        cumulative += count
+        if cumulative >= target:
+            return bound
+    return float("inf")
+
+
+def report(harness: Harness, api: FakeBotAPI, elapsed: float) -> Dict[str, Any]:
+    steps = {}
+    for step, samples in harness.latencies.items():
+        calls = harness.api_calls[step]
+        steps[step] = {
+            **summary(samples),
+            "api_calls_per_action": sum(calls) / len(calls),
+            "errors": harness.errors.get(step, 0),
+        }
+    handlers = {
+        f"{router}.{handler}": {
+            "count": child.count,
+            "mean_ms": child.sum / child.count * 1000,
+            "p50_le_ms": histogram_quantile(child, 0.5) * 1000,
+            "p99_le_ms": histogram_quantile(child, 0.99) * 1000,
+        }
+        for (router, handler), child in metrics.HANDLER_SECONDS._children.items() if child.count
+    }
+    all_samples = [s for samples in harness.latencies.values() for s in samples]
+    return {
+        "updates": harness.updates,
+        "elapsed_sec": elapsed,
+        "updates_per_sec": harness.updates / elapsed,
+        "latency": summary(all_samples),
+        "steps": steps,
+        "handlers": handlers,
+        "api": {
+            "calls": dict(api.calls),
+            "calls_per_update": sum(api.calls.values()) / max(harness.updates, 1),
+            "injected_429": api.injected_429,
+            "limiter": api_limiter.stats(),
+        },
+        "throttling": throttling.stats(),
+        "broadcast": broadcast.stats(),
+    }
+
+
+def print_report(result: Dict[str, Any]):
+    print(f"\nАпдейтов: {result['updates']} за {result['elapsed_sec']:.1f} с "
+          f"({result['updates_per_sec']:.0f}/с), запросов к API на апдейт: "
+          f"{result['api']['calls_per_update']:.2f}, 429: {result['api']['injected_429']}")
+    print(f"\n{'шаг':22} {'n':>6} {'p50 мс':>9} {'p95 мс':>9} {'p99 мс':>9} {'API/действие':>13} {'ошибки':>7}")
+    for step, s in result["steps"].items():
+        print(f"{step:22} {s['count']:6} {s['p50_ms']:9.1f} {s['p95_ms']:9.1f} {s['p99_ms']:9.1f} "
+              f"{s['api_calls_per_action']:13.2f} {s['errors']:7}")
+    print(f"\n{'хендлер':40} {'n':>6} {'среднее мс':>11} {'p99 ≤ мс':>9}")
+    for name, s in sorted(result["handlers"].items(), key=lambda item: -item[1]["mean_ms"]):
+        print(f"{name:40} {s['count']:6} {s['mean_ms']:11.1f} {s['p99_le_ms']:9.0f}")
+    limiter = result["api"]["limiter"]
+    print(f"\nЛимитер: ждали {limiter['waited']} раз, в среднем {limiter['wait_avg'] * 1000:.0f} мс, "
+          f"повторов после 429: {limiter['retries']}")
+    print(f"Антифлуд: {result['throttling']['throttled']}")
+    print(f"Рассылка: {result['broadcast']}")
+
+
+# ========== ЗАПУСК ==========
+
+async def run(args) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="load-")
+    path = os.path.join(workdir, "load.db")
+    if args.db:
+        shutil.copyfile(args.db, path)
+    else:
+        # generate запускает свой event loop - выполняем в отдельном потоке
+        await asyncio.to_thread(generate, path, users=1000, ads=10000, blocked=0.02,
+                                deleted=0.2, photos=0.6, seed=args.seed)
+
+    conn = sqlite3.connect(path)
+    first_id = (conn.execute("SELECT MAX(telegram_id) FROM users").fetchone()[0] or 0) + 1
+    conn.close()
+    admin_id = first_id + args.users
+    ADMIN_IDS.append(admin_id)
+
+    api = FakeBotAPI(args.latency, args.jitter, args.rate_429, seed=args.seed)
+    url = await api.start()
+    db.DATABASE = path
+    await db.init_db()
+    bot = create_bot(AiohttpSession(api=TelegramAPIServer.from_base(url)))
+    dp = create_dispatcher()
+    await dp.emit_startup(bot=bot)
+
+    harness = Harness(dp, bot, api, args.think, args.seed)
+    started = time.perf_counter()
+
+    async def start_user(index: int, user_id: int):
+        await asyncio.sleep(args.ramp * index / max(args.users, 1))
+        await user_script(SimulatedUser(harness, user_id), args.create_share, args.photos, args.pages)
+
+    async def start_admin():
+        # Рассылка стартует в середине подключения пользователей
+        await asyncio.sleep(args.ramp / 2)
+        await admin_script(SimulatedUser(harness, admin_id))
+
+    async def progress():
+        while True:
+            await asyncio.sleep(5)
+            print(f"{time.perf_counter() - started:6.0f} с: апдейтов {harness.updates}, "
+                  f"запросов к API {sum(api.calls.values())}", flush=True)
+
+    reporter = asyncio.create_task(progress())
+    try:
+        await asyncio.gather(
+            *(start_user(index, first_id + index) for index in range(args.users)),
+            start_admin()
+        )
+        elapsed = time.perf_counter() - started
+        result = report(harness, api, elapsed)
+    finally:
+        reporter.cancel()
+        await dp.emit_shutdown(bot=bot)
+        await dp.storage.close()
+        await bot.session.close()
+        await db.close_db()
+        await api.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result["config"] = {key: value for key, value in vars(args).items() if key != "verbose"}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота на замене Bot API")
+    parser.add_argument("--db", help="исходная БД (по умолчанию генерируется небольшая)")
+    parser.add_argument("--users", type=int, default=1000, help="число симулированных пользователей")
+    parser.add_argument("--ramp", type=float, default=30, help="время подключения всех пользователей, с")
+    parser.add_argument("--think", type=float, default=0.5, help="пауза между действиями пользователя, с")
+    parser.add_argument("--pages", type=int, default=50, help="сколько карточек листает пользователь")
+    parser.add_argument("--create-share", type=float, default=0.2, help="доля создающих объявление")
+    parser.add_argument("--photos", type=int, default=3, help="фото в новом объявлении")
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа API, с")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="JSON с результатами")
+    parser.add_argument("-v", "--verbose", action="store_true", help="показывать предупреждения бота")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING if args.verbose else logging.ERROR)
+
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""Бенчмарки публичных функций database.py
+
+    python -m bench.run --db bench/scratch.db --out bench/results.json
+    python -m bench.run --baseline bench/baseline.json   # выход 1 при регрессии
+    python -m bench.run --save-baseline bench/baseline.json
+
+Каждый прогон работает на копии БД из --db (записывающие бенчмарки её
+меняют) со своим зерном случайных чисел, поэтому результаты повторяемы.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+from config import CATEGORIES
+
+Benchmark = Callable[[random.Random], Awaitable[Any]]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Перцентиль q (0..1) по отсортированной выборке"""
+    index = min(len(samples) - 1, max(0, round(q * (len(samples) - 1))))
+    return samples[index]
+
+
+class Context:
+    """Данные БД, нужные бенчмаркам: диапазоны id, курсоры глубоких страниц"""
+
+    def __init__(self, path: str, depth: int):
+        conn = sqlite3.connect(path)
+        self.max_user = conn.execute("SELECT MAX(telegram_id) FROM users").fetchone()[0]
+        self.max_ad = conn.execute("SELECT MAX(id) FROM ads").fetchone()[0]
+        # Продавец с наибольшим числом объявлений - худший случай для «Моих объявлений»
+        self.top_seller = conn.execute(
+            "SELECT user_id FROM ads GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1"
+        ).fetchone()[0]
+        self.depth = depth
+        self.deep_cursors = {}
+        for category in CATEGORIES:
+            row = conn.execute(
+                """SELECT ads.created_at, ads.id FROM ads
+                   JOIN users ON ads.user_id = users.telegram_id
+                   WHERE ads.category = ? AND ads.is_active = 1 AND users.is_blocked = 0
+                   ORDER BY ads.created_at DESC, ads.id DESC LIMIT 1 OFFSET ?""",
+                (category, depth)
+            ).fetchone()
+            if row is not None:
+                self.deep_cursors[category] = (row[0], row[1])
+        conn.close()
+        self.next_user = self.max_user + 1
+
+
+def benchmarks(ctx: Context) -> Dict[str, Benchmark]:
+    categories = list(CATEGORIES)
+
+    def category(rng):
+        return rng.choice(categories)
+
+    async def browse_first_page(rng):
+        return await db.get_ads_after(category(rng))
+
+    async def browse_deep_keyset(rng):
+        cat = rng.choice(list(ctx.deep_cursors))
+        return await db.get_ads_after(cat, ctx.deep_cursors[cat])
+
+    async def browse_deep_offset(rng):
+        return await db.get_ads_by_category(category(rng), offset=ctx.depth)
+
+    async def browse_price_filtered(rng):
+        return await db.get_ads_after(category(rng), sort="price_asc",
+                                      min_price=100000, max_price=1000000)
+
+    async def count_category(rng):
+        return await db.count_ads_by_category(category(rng))
+
+    async def count_category_filtered(rng):
+        return await db.count_ads_by_category(category(rng), "price_asc", 100000, 1000000)
+
+    async def category_counts(rng):
+        return await db.get_category_counts()
+
+    async def get_ad(rng):
+        return await db.get_ad(rng.randint(1, ctx.max_ad))
+
+    async def get_ad_photos(rng):
+        return await db.get_ad_photos(rng.randint(1, ctx.max_ad))
+
+    async def my_ads(rng):
+        return await db.get_user_ads(rng.randint(1, ctx.max_user))
+
+    async def my_ads_top_seller(rng):
+        return await db.get_user_ads(ctx.top_seller)
+
+    async def get_user(rng):
+        return await db.get_user(rng.randint(1, ctx.max_user))
+
+    async def search(rng):
+        return await db.search_ads("машина торг", category(rng))
+
+    async def admin_ads_page(rng):
+        return await db.get_admin_ads_after({"category": category(rng)})
+
+    async def admin_users_page(rng):
+        return await db.get_users_after()
+
+    async def user_stats(rng):
+        return await db.get_user_stats()
+
+    async def broadcast_recipients(rng):
+        return await db.get_broadcast_recipients(rng.randint(0, ctx.max_user), 500)
+
+    async def add_user(rng):
+        ctx.next_user += 1
+        return await db.add_user(ctx.next_user, None, "Bench", "1")
+
+    async def add_ad(rng):
+        return await db.add_ad(rng.randint(1, ctx.max_user), "бенч машина", "описание",
+                               "1000", category(rng), ["file_a", "file_b"], 1000)
+
+    async def update_ad(rng):
+        return await db.update_ad(rng.randint(1, ctx.max_ad), title=f"бенч {rng.random()}")
+
+    async def update_user(rng):
+        return await db.update_user(rng.randint(1, ctx.max_user), game_nick="Bench")
+
+    async def block_user(rng):
+        user_id = rng.randint(1, ctx.max_user)
+        await db.block_user(user_id, True)
+        await db.block_user(user_id, False)
+
+    async def delete_ad(rng):
+        return await db.delete_ad(rng.randint(1, ctx.max_ad))
+
+    return {
+        name: fn for name, fn in locals().items()
+        if callable(fn) and name not in ("category", "categories", "ctx")
+    }
+
+
+async def run_benchmark(fn: Benchmark, seed: int, iterations: int, warmup: int) -> Dict[str, float]:
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        await fn(rng)
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        await fn(rng)
+        samples.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "p50_ms": percentile(samples, 0.5) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "max_ms": samples[-1] * 1000,
+        "ops_per_sec": iterations / elapsed,
+    }
+
+
+async def run_all(source: str, iterations: int, warmup: int, depth: int,
+                  seed: int, only: List[str]) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    path = os.path.join(workdir, "bench.db")
+    shutil.copyfile(source, path)
+    ctx = Context(path, depth)
+    db.DATABASE = path
+    await db.init_db()
+    results = {}
+    try:
+        for index, (name, fn) in enumerate(benchmarks(ctx).items()):
+            if only and name not in only:
+                continue
+            results[name] = await run_benchmark(fn, seed + index, iterations, warmup)
+            r = results[name]
+            print(f"{name:26} p50 {r['p50_ms']:8.3f} мс  p99 {r['p99_ms']:8.3f} мс  "
+                  f"{r['ops_per_sec']:9.0f} оп/с")
+    finally:
+        await db.close_db()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    conn = sqlite3.connect(source)
+    scale = {
+        "users": conn.execute("SELECT COUNT(*) FROM users").fetchone()[0],
+        "ads": conn.execute("SELECT COUNT(*) FROM ads").fetchone()[0],
+    }
+    conn.close()
+    return {
+        "meta": {
+            "scale": scale,
+            "iterations": iterations,
+            "seed": seed,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Регрессии относительно базовой линии
+
+    p50 может вырасти не больше чем на tolerance, p99 (более шумный) -
+    на 2 * tolerance; пропускная способность - упасть не больше чем на tolerance.
+    """
+    if baseline["meta"]["scale"] != results["meta"]["scale"]:
+        print(f"Внимание: масштаб БД отличается от базовой линии {baseline['meta']['scale']}")
+    regressions = []
+    for name, base in baseline["results"].items():
+        current = results["results"].get(name)
+        if current is None:
+            continue
+        checks = (
+            ("p50_ms", current["p50_ms"] > base["p50_ms"] * (1 + tolerance)),
+            ("p99_ms", current["p99_ms"] > base["p99_ms"] * (1 + 2 * tolerance)),
+            ("ops_per_sec", current["ops_per_sec"] < base["ops_per_sec"] * (1 - tolerance)),
+        )
+        for metric, failed in checks:
+            if failed:
+                regressions.append(
+                    f"{name}: {metric} {base[metric]:.3f} -> {current[metric]:.3f}"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки слоя хранения")
+    parser.add_argument("--db", default="bench/scratch.db", help="БД из bench.generate")
+    parser.add_argument("--out", default="bench/results.json")
+    parser.add_argument("--baseline", help="сравнить с базовой линией, выход 1 при регрессии")
+    parser.add_argument("--save-baseline", help="сохранить результаты как базовую линию")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--depth", type=int, default=5000, help="глубина страницы для browse_deep_*")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", nargs="*", default=[], help="имена бенчмарков")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} не найдена, сначала запустите python -m bench.generate")
+
+    results = asyncio.run(run_all(
+        args.db, args.iterations, args.warmup, args.depth, args.seed, args.only
+    ))
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Результаты: {args.out}")
+
+    if args.save_baseline:
+        shutil.copyfile(args.out, args.save_baseline)
+        print(f"Базовая линия сохранена: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Регрессии:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
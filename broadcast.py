@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError, TelegramBadRequest, TelegramForbiddenError
+)
+
+import database as db
+from config import (
+    BROADCAST_CONCURRENCY, BROADCAST_CHUNK,
+    BROADCAST_MAX_RETRIES, BROADCAST_PROGRESS_INTERVAL
+)
+from keyboards import broadcast_control_keyboard
+from ratelimit import background
+
+logger = logging.getLogger(__name__)
+
+_jobs: Dict[int, "BroadcastJob"] = {}
+
+
+def progress_text(job: dict) -> str:
+    """Текст статуса рассылки"""
+    processed = job['sent'] + job['failed']
+    if job['status'] == "done":
+        header = "✅ **Рассылка завершена!**"
+    elif job['status'] == "cancelled":
+        header = "🛑 **Рассылка отменена**"
+    elif job['status'] == "paused":
+        header = f"⏸ **Рассылка #{job['id']} на паузе**"
+    else:
+        header = f"📤 **Рассылка #{job['id']}...**"
+    return (
+        f"{header}\n\n"
+        f"📨 Успешно: {job['sent']}\n"
+        f"❌ Не доставлено: {job['failed']}\n"
+        f"⏳ Обработано: {processed}/{job['total']}"
+    )
+
+
+class BroadcastJob:
+    """Фоновая отправка одной рассылки с сохранением прогресса в БД"""
+
+    def __init__(self, bot: Bot, job: dict):
+        self.bot = bot
+        self.job = job
+        self.id = job['id']
+        self.task: Optional[asyncio.Task] = None
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self._semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+        self._reported_at = 0.0
+
+    @property
+    def status(self) -> str:
+        return self.job['status']
+
+    async def set_status(self, status: str):
+        self.job['status'] = status
+        await db.set_broadcast_status(self.id, status)
+        if status == "paused":
+            self._resumed.clear()
+        else:
+            self._resumed.set()
+        await self.report(force=True)
+
+    async def run(self):
+        # Запросы рассылки пропускают вперёд ответы пользователям в общем лимите Bot API
+        background.set(True)
+        try:
+            while self.status != "cancelled":
+                await self._resumed.wait()
+                if self.status == "cancelled":
+                    break
+
+                recipients = await db.get_broadcast_recipients(self.job['cursor'], BROADCAST_CHUNK)
+                if not recipients:
+                    await self.set_status("done")
+                    break
+
+                results = await asyncio.gather(*(self._deliver(uid) for uid in recipients))
+                await db.save_broadcast_progress(
+                    self.id, recipients[-1], list(zip(recipients, results))
+                )
+                sent = sum(results)
+                self.job['cursor'] = recipients[-1]
+                self.job['sent'] += sent
+                self.job['failed'] += len(results) - sent
+                await self.report()
+        except asyncio.CancelledError:
+            # Остановка бота: статус остаётся running, продолжим после перезапуска
+            raise
+        except Exception:
+            logger.exception(f"Рассылка #{self.id} прервана ошибкой")
+            await self.set_status("paused")
+        finally:
+            _jobs.pop(self.id, None)
+
+    async def _deliver(self, telegram_id: int) -> bool:
+        async with self._semaphore:
+            for attempt in range(BROADCAST_MAX_RETRIES):
+                try:
+                    await self.bot.send_message(
+                        telegram_id,
+                        f"📢 **Объявление от администрации:**\n\n{self.job['text']}",
+                        parse_mode="Markdown"
+                    )
+                    return True
+                except (TelegramForbiddenError, TelegramBadRequest):
+                    # Пользователь заблокировал бота или чат недоступен
+                    return False
+                except TelegramAPIError as e:
+                    # 429 повторяет лимитер сессии, сюда он доходит после API_MAX_RETRIES
+                    logger.warning(f"Рассылка #{self.id}: ошибка отправки {telegram_id}: {e}")
+                    await asyncio.sleep(2 ** attempt)
+            return False
+
+    async def report(self, force: bool = False):
+        """Обновление сообщения со статусом (не чаще BROADCAST_PROGRESS_INTERVAL)"""
+        now = time.monotonic()
+        if not force and now - self._reported_at < BROADCAST_PROGRESS_INTERVAL:
+            return
+        self._reported_at = now
+        try:
+            await self.bot.edit_message_text(
+                progress_text(self.job),
+                chat_id=self.job['chat_id'],
+                message_id=self.job['message_id'],
+                reply_markup=broadcast_control_keyboard(self.id, self.status),
+                parse_mode="Markdown"
+            )
+        except TelegramAPIError as e:
+            logger.debug(f"Не удалось обновить статус рассылки #{self.id}: {e}")
+
+
+def _start(bot: Bot, job: dict) -> BroadcastJob:
+    runner = BroadcastJob(bot, job)
+    _jobs[runner.id] = runner
+    runner.task = asyncio.create_task(runner.run())
+    return runner
+
+
+async def start_broadcast(bot: Bot, admin_id: int, chat_id: int,
+                          message_id: int, text: str) -> int:
+    """Создание и запуск рассылки, возвращает её номер"""
+    broadcast_id = await db.create_broadcast(admin_id, chat_id, message_id, text)
+    runner = _start(bot, await db.get_broadcast(broadcast_id))
+    await runner.report(force=True)
+    return broadcast_id
+
+
+async def pause_broadcast(broadcast_id: int) -> bool:
+    runner = _jobs.get(broadcast_id)
+    if runner is None or runner.status != "running":
+        return False
+    await runner.set_status("paused")
+    return True
+
+
+async def resume_broadcast(bot: Bot, broadcast_id: int) -> bool:
+    runner = _jobs.get(broadcast_id)
+    if runner is not None:
+        if runner.status != "paused":
+            return False
+        await runner.set_status("running")
+        return True
+
+    # Задание на паузе после перезапуска бота - поднимаем из БД
+    job = await db.get_broadcast(broadcast_id)
+    if job is None or job['status'] not in ("paused", "running"):
+        return False
+    job['status'] = "running"
+    await db.set_broadcast_status(broadcast_id, "running")
+    await _start(bot, job).report(force=True)
+    return True
+
+
+async def cancel_broadcast(bot: Bot, broadcast_id: int) -> bool:
+    runner = _jobs.get(broadcast_id)
+    if runner is None:
+        job = await db.get_broadcast(broadcast_id)
+        if job is None or job['status'] in ("cancelled", "done"):
+            return False
+        # Задание не запущено (на паузе после перезапуска) - только статус и сообщение
+        runner = BroadcastJob(bot, job)
+    await runner.set_status("cancelled")
+    return True
+
+
+def stats() -> Dict[str, Any]:
+    """Рассылки, выполняемые процессом, и их суммарный прогресс"""
+    jobs: Dict[str, int] = {}
+    for runner in _jobs.values():
+        jobs[runner.status] = jobs.get(runner.status, 0) + 1
+    return {
+        "jobs": jobs,
+        "sent": sum(runner.job['sent'] for runner in _jobs.values()),
+        "failed": sum(runner.job['failed'] for runner in _jobs.values()),
+        "total": sum(runner.job['total'] for runner in _jobs.values()),
+    }
+
+
+async def resume_unfinished(bot: Bot):
+    """Продолжение рассылок, прерванных остановкой бота"""
+    for job in await db.get_broadcasts_by_status("running"):
+        logger.info(f"Продолжаем рассылку #{job['id']} с получателя {job['cursor']}")
+        _start(bot, job)
+
+
+async def shutdown():
+    """Остановка фоновых рассылок (прогресс уже сохранён в БД)"""
+    tasks = [runner.task for runner in _jobs.values() if runner.task]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
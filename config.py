@@ -15,4 +15,88 @@ CATEGORIES = {
 }
 
 MAX_PHOTOS = 10
-ADS_PER_PAGE = 1
\ No newline at end of file
+ADS_PER_PAGE = 1
+USERS_PER_PAGE = 20
+
+# База данных
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+DB_BUSY_RETRIES = int(os.getenv("DB_BUSY_RETRIES", "5"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+# Групповая запись: сколько ждать попутные записи и сколько брать в одну транзакцию
+DB_WRITE_BATCH_WINDOW_MS = float(os.getenv("DB_WRITE_BATCH_WINDOW_MS", "2"))
+DB_WRITE_BATCH_MAX = int(os.getenv("DB_WRITE_BATCH_MAX", "100"))
+
+# Кэш пользователей для проверки доступа
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+# С воркерами: как часто сверять флаг блокировки закэшированного пользователя с БД
+USER_BLOCK_TTL = float(os.getenv("USER_BLOCK_TTL", "5"))
+
+# Кэш объявлений и отрисованных карточек, ключ (id, version)
+AD_CACHE_SIZE = int(os.getenv("AD_CACHE_SIZE", "5000"))
+
+# FSM-хранилище
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1"))
+FSM_TTL = int(os.getenv("FSM_TTL", str(3 * 24 * 3600)))
+FSM_CACHE_IDLE = int(os.getenv("FSM_CACHE_IDLE", "600"))
+
+# Лимиты исходящих запросов к Bot API (общий лимит делится между воркерами,
+# воркер 0 с рассылками получает сверх доли резерв, см. ratelimit.process_rate)
+API_GLOBAL_RATE = float(os.getenv("API_GLOBAL_RATE", "30"))
+API_CHAT_RATE = float(os.getenv("API_CHAT_RATE", "1"))
+API_CHAT_BURST = float(os.getenv("API_CHAT_BURST", "3"))
+API_GROUP_PER_MINUTE = float(os.getenv("API_GROUP_PER_MINUTE", "20"))
+API_CHAT_BUCKETS = int(os.getenv("API_CHAT_BUCKETS", "10000"))
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "3"))
+
+# Антифлуд: лимит событий пользователя за THROTTLE_WINDOW секунд по группам хендлеров
+THROTTLE_WINDOW = float(os.getenv("THROTTLE_WINDOW", "10"))
+THROTTLE_NAV_LIMIT = int(os.getenv("THROTTLE_NAV_LIMIT", "25"))
+THROTTLE_CONTACT_LIMIT = int(os.getenv("THROTTLE_CONTACT_LIMIT", "5"))
+THROTTLE_CALLBACK_LIMIT = int(os.getenv("THROTTLE_CALLBACK_LIMIT", "15"))
+THROTTLE_MESSAGE_LIMIT = int(os.getenv("THROTTLE_MESSAGE_LIMIT", "20"))
+# Повтор той же кнопки быстрее THROTTLE_DEBOUNCE секунд отбрасывается
+THROTTLE_DEBOUNCE = float(os.getenv("THROTTLE_DEBOUNCE", "0.7"))
+THROTTLE_USERS = int(os.getenv("THROTTLE_USERS", "10000"))
+
+# Журнал медленных запросов: порог в мс, файл (пусто - общий лог), размер топа в админке
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "50"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "")
+SLOW_QUERY_TOP = int(os.getenv("SLOW_QUERY_TOP", "10"))
+
+# Метрики Prometheus на http://METRICS_HOST:METRICS_PORT/metrics (0 - выключены);
+# в режиме воркеров воркер N слушает METRICS_PORT + N
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Рассылка
+# Потолок рассылок внутри лимита Bot API (сообщений в секунду), см. ratelimit
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "30"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "20"))
+BROADCAST_CHUNK = int(os.getenv("BROADCAST_CHUNK", "100"))
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "3"))
+
+# Карантин фото: отказов до карантина и перепроверка через getFile
+PHOTO_FAILURE_THRESHOLD = int(os.getenv("PHOTO_FAILURE_THRESHOLD", "2"))
+PHOTO_REVALIDATE_INTERVAL = int(os.getenv("PHOTO_REVALIDATE_INTERVAL", "3600"))
+PHOTO_REVALIDATE_BATCH = int(os.getenv("PHOTO_REVALIDATE_BATCH", "50"))
+
+# Поиск
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "100"))
+
+# Режим получения апдейтов: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "10"))
+
+# Многопроцессный режим: фронт раздаёт апдейты WORKERS воркерам (0 - один процесс)
+WORKERS = int(os.getenv("WORKERS", "0"))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))
+WORKER_STOP_TIMEOUT = float(os.getenv("WORKER_STOP_TIMEOUT", "15"))
+SUPERVISOR_INTERVAL = float(os.getenv("SUPERVISOR_INTERVAL", "10"))
@@ -1,97 +1,465 @@
+import asyncio
+import contextvars
+import logging
+import re
+import sqlite3
+from calendar import timegm
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Awaitable, Callable, Tuple, TypeVar
+
 import aiosqlite
-from datetime import datetime
-from typing import Optional, List, Dict, Any
+
+from cache import LRUCache, MISSING
+from config import (
+    DB_READ_POOL_SIZE, DB_BUSY_RETRIES, DB_BUSY_TIMEOUT_MS,
+    DB_WRITE_BATCH_WINDOW_MS, DB_WRITE_BATCH_MAX,
+    USER_CACHE_SIZE, USER_CACHE_TTL, USER_BLOCK_TTL, AD_CACHE_SIZE, SEARCH_MAX_RESULTS,
+    PHOTO_FAILURE_THRESHOLD, WORKERS
+)
+import metrics
+import querylog
+from migrations import apply_migrations
+from querylog import TracedConnection
 
 DATABASE = "grand_mobile.db"
 
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Курсор ленты: (created_at или price_value, id) последнего показанного объявления
+AdCursor = Tuple[Any, int]
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Настройки, применяемые к каждому соединению
+CONNECTION_PRAGMAS = (
+    f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+# ========== ПОДКЛЮЧЕНИЕ ==========
+
+def _is_busy_error(error: Exception) -> bool:
+    """Ошибка блокировки БД (SQLITE_BUSY / SQLITE_LOCKED)"""
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+class ConnectionPool:
+    """Пул соединений: одно соединение-писатель и несколько читателей
+
+    Записи выполняет одна задача-писатель: всё, что пришло в очередь за
+    batch_window секунд, выполняется в одной транзакции (group commit),
+    каждая запись - в своей точке сохранения.
+    """
+
+    def __init__(self, path: str, readers: int = DB_READ_POOL_SIZE,
+                 retries: int = DB_BUSY_RETRIES,
+                 batch_window: float = DB_WRITE_BATCH_WINDOW_MS / 1000,
+                 batch_max: int = DB_WRITE_BATCH_MAX):
+        self.path = path
+        self.readers_count = max(1, readers)
+        self.retries = retries
+        self.batch_window = batch_window
+        self.batch_max = max(1, batch_max)
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._write_task: Optional[asyncio.Task] = None
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._queue_depth = metrics.DB_WRITE_QUEUE.labels()
+        self._batch_sizes = metrics.DB_WRITE_BATCH.labels()
+        self._batches = 0
+        self._writes = 0
+        self._max_batch = 0
+        self._last_batch = 0
+
+    async def _connect(self, query_only: bool = False) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path, isolation_level=None)
+        conn.row_factory = aiosqlite.Row
+        for pragma in CONNECTION_PRAGMAS:
+            await conn.execute_fetchall(pragma)
+        if query_only:
+            await conn.execute_fetchall("PRAGMA query_only = 1")
+        return conn
+
+    async def open_writer(self):
+        """Открытие соединения-писателя"""
+        self._writer = await self._connect()
+        # WAL сохраняется в файле БД, достаточно включить один раз
+        await self._writer.execute_fetchall("PRAGMA journal_mode = WAL")
+        self._write_queue = asyncio.Queue()
+        self._write_task = asyncio.create_task(self._write_loop())
+
+    async def open_readers(self):
+        """Открытие читателей (после миграций, чтобы они видели актуальную схему)"""
+        self._idle = asyncio.Queue()
+        for _ in range(self.readers_count):
+            conn = await self._connect(query_only=True)
+            self._readers.append(conn)
+            self._idle.put_nowait(conn)
+
+    async def close(self):
+        """Закрытие всех соединений"""
+        for conn in self._readers:
+            await conn.close()
+        self._readers.clear()
+        if self._write_task is not None:
+            # Записи, уже стоящие в очереди, выполняются до закрытия писателя
+            if not self._write_task.done():
+                self._write_queue.put_nowait(None)
+                await self._write_task
+            self._write_task = None
+        if self._writer is not None:
+            # Обновляем статистику планировщика и переносим WAL в основной файл перед остановкой
+            try:
+                await self._writer.execute_fetchall("PRAGMA optimize")
+                await self._writer.execute_fetchall("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Не удалось выполнить checkpoint: {e}")
+            await self._writer.close()
+            self._writer = None
+
+    @asynccontextmanager
+    async def _reader(self):
+        conn = await self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+
+    async def _with_retries(self, operation: Callable[[], Awaitable[T]]) -> T:
+        """Повтор операции при SQLITE_BUSY с экспоненциальной задержкой"""
+        delay = 0.05
+        for attempt in range(self.retries + 1):
+            try:
+                return await operation()
+            except sqlite3.OperationalError as e:
+                if not _is_busy_error(e) or attempt == self.retries:
+                    raise
+                logger.warning(f"БД занята, повтор {attempt + 1}/{self.retries}: {e}")
+                await asyncio.sleep(delay)
+                delay *= 2
+
+    async def read(self, fn: Callable[[aiosqlite.Connection], Awaitable[T]]) -> T:
+        """Выполнение чтения на свободном соединении-читателе"""
+        async def operation():
+            async with self._reader() as conn:
+                return await fn(TracedConnection(conn))
+        return await self._with_retries(operation)
+
+    async def write(self, fn: Callable[[aiosqlite.Connection], Awaitable[T]]) -> T:
+        """Выполнение fn в транзакции писателя (возможно, вместе с другими записями)
+
+        Результат возвращается после COMMIT; исключение в fn откатывает
+        только её изменения.
+        """
+        future = asyncio.get_running_loop().create_future()
+        # fn выполняется в задаче писателя, но с контекстом вызывающего
+        # (например, имя функции database.py для журнала запросов)
+        self._write_queue.put_nowait((fn, contextvars.copy_context(), future))
+        self._queue_depth.set(self._write_queue.qsize())
+        return await future
+
+    async def _write_loop(self):
+        """Задача-писатель: сбор записей из очереди в транзакции"""
+        closing = False
+        try:
+            while not closing:
+                item = await self._write_queue.get()
+                if item is None:
+                    break
+                batch = [item]
+                # Окно ожидания - только под нагрузкой (прошлая транзакция была
+                # групповой), одиночная запись в тишине выполняется сразу
+                if self.batch_window > 0 and (self._last_batch > 1 or not self._write_queue.empty()):
+                    await asyncio.sleep(self.batch_window)
+                while len(batch) < self.batch_max and not self._write_queue.empty():
+                    item = self._write_queue.get_nowait()
+                    if item is None:
+                        closing = True
+                        break
+                    batch.append(item)
+                self._queue_depth.set(self._write_queue.qsize())
+                await self._commit_batch(batch)
+        finally:
+            # Остановка без close(): ожидающие записи не должны зависнуть
+            while not self._write_queue.empty():
+                item = self._write_queue.get_nowait()
+                if item is not None:
+                    self._fail([item], RuntimeError("Писатель БД остановлен"))
+            self._queue_depth.set(0)
+
+    async def _commit_batch(self, batch: List[Tuple[Callable, contextvars.Context, asyncio.Future]]):
+        # Отменённые до начала транзакции записи не выполняются
+        batch = [item for item in batch if not item[2].done()]
+        self._last_batch = len(batch)
+        if not batch:
+            return
+        try:
+            results = await self._with_retries(lambda: self._run_batch(batch))
+        except Exception as e:
+            # Не удалась вся транзакция (BEGIN/COMMIT) - ошибку получают все
+            self._fail(batch, e)
+            return
+        except BaseException:
+            # Задачу писателя отменили посреди транзакции (остановка процесса):
+            # транзакция откатывается, вызывающие не должны зависнуть
+            self._fail(batch, RuntimeError("Писатель БД остановлен"))
+            raise
+
+        self._batches += 1
+        self._writes += len(batch)
+        self._max_batch = max(self._max_batch, len(batch))
+        self._batch_sizes.observe(len(batch))
+        for (_, _, future), (error, result) in zip(batch, results):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    @staticmethod
+    def _fail(batch, error: BaseException):
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _run_batch(self, batch) -> List[Tuple[Optional[Exception], Any]]:
+        conn = self._writer
+        traced = TracedConnection(conn)
+        results = []
+        await conn.execute("BEGIN IMMEDIATE")
+        try:
+            for fn, context, _ in batch:
+                await conn.execute("SAVEPOINT write")
+                try:
+                    result = await context.run(asyncio.create_task, fn(traced))
+                except Exception as e:
+                    # SQLITE_BUSY - повтор всей транзакции в _with_retries
+                    if isinstance(e, sqlite3.OperationalError) and _is_busy_error(e):
+                        raise
+                    await conn.execute("ROLLBACK TO write")
+                    results.append((e, None))
+                else:
+                    results.append((None, result))
+                await conn.execute("RELEASE write")
+        except BaseException:
+            await conn.rollback()
+            raise
+        await conn.commit()
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика групповой записи"""
+        return {
+            'batches': self._batches,
+            'writes': self._writes,
+            'batch_avg': self._writes / self._batches if self._batches else 0.0,
+            'batch_max': self._max_batch,
+            'queued': self._write_queue.qsize() if self._write_queue is not None else 0,
+        }
+
+
+_pool: Optional[ConnectionPool] = None
+
+
+def get_pool() -> ConnectionPool:
+    """Текущий пул соединений"""
+    if _pool is None:
+        raise RuntimeError("База данных не инициализирована: вызовите init_db()")
+    return _pool
+
+
+async def _fetchone(sql: str, params: tuple = ()) -> Optional[aiosqlite.Row]:
+    async def run(conn):
+        async with conn.execute(sql, params) as cursor:
+            return await cursor.fetchone()
+    return await get_pool().read(run)
+
+
+async def _fetchall(sql: str, params: tuple = ()) -> List[aiosqlite.Row]:
+    async def run(conn):
+        return await conn.execute_fetchall(sql, params)
+    return await get_pool().read(run)
+
+
+async def _execute(sql: str, params: tuple = ()) -> int:
+    """Одиночная запись, возвращает lastrowid"""
+    async def run(conn):
+        async with conn.execute(sql, params) as cursor:
+            return cursor.lastrowid
+    return await get_pool().write(run)
+
+
+def write_queue_stats() -> Dict[str, Any]:
+    """Статистика групповой записи текущего пула"""
+    return get_pool().stats()
+
 
 async def init_db():
     """Инициализация базы данных"""
-    async with aiosqlite.connect(DATABASE) as db:
-        # Таблица пользователей
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                telegram_id INTEGER PRIMARY KEY,
-                username TEXT,
-                game_nick TEXT NOT NULL,
-                game_id TEXT NOT NULL,
-                is_blocked INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Таблица объявлений
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS ads (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                title TEXT NOT NULL,
-                description TEXT NOT NULL,
-                price TEXT NOT NULL,
-                category TEXT NOT NULL,
-                photos TEXT,
-                is_active INTEGER DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (telegram_id)
-            )
-        """)
-        
-        await db.commit()
+    global _pool
+    if _pool is not None:
+        return
 
+    pool = ConnectionPool(DATABASE)
+    await pool.open_writer()
+    # Запросы миграций не учитываются в журнале медленных запросов,
+    # а список таблиц для поиска полных проходов берётся уже по новой схеме
+    token = querylog.tracing.set(False)
+    try:
+        version = await apply_migrations(pool)
+    finally:
+        querylog.tracing.reset(token)
+    querylog.reset_tables()
+    await pool.open_readers()
+    _pool = pool
+    logger.info(f"Версия схемы БД: {version}")
 
-def parse_photos(photos_str: str) -> List[str]:
-    """Безопасный парсинг строки с фотографиями"""
-    if not photos_str or photos_str.strip() == "":
-        return []
-    # Фильтруем пустые строки
-    return [p.strip() for p in photos_str.split(',') if p.strip()]
+
+async def close_db():
+    """Закрытие соединений с базой данных"""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+# Колонки объявления и продавца для карточек
+AD_COLUMNS = (
+    "ads.id, ads.user_id, ads.title, ads.description, ads.price, "
+    "ads.price_value, ads.price_negotiable, ads.category, ads.is_active, ads.created_at, "
+    "ads.version, ads.broken_photos"
+)
+SELLER_COLUMNS = (
+    "users.game_nick, users.game_id, users.username, users.telegram_id as seller_id"
+)
+
+
+async def _fetch_photos(conn: aiosqlite.Connection, ads: List[Dict]) -> List[Dict]:
+    """Подгрузка фото для уже выбранных объявлений одним запросом"""
+    if not ads:
+        return ads
+    photos = {ad['id']: [] for ad in ads}
+    placeholders = ", ".join("?" * len(photos))
+    rows = await conn.execute_fetchall(
+        f"""SELECT ad_id, file_id FROM ad_photos
+            WHERE ad_id IN ({placeholders}) AND quarantined_at IS NULL
+            ORDER BY ad_id, position""",
+        tuple(photos)
+    )
+    for row in rows:
+        photos[row['ad_id']].append(row['file_id'])
+    for ad in ads:
+        ad['photos'] = photos[ad['id']]
+    return ads
 
 
-def photos_to_string(photos: List[str]) -> str:
-    """Преобразование списка фото в строку"""
-    if not photos:
-        return ""
-    # Фильтруем пустые значения
-    valid_photos = [p for p in photos if p and p.strip()]
-    return ",".join(valid_photos)
+async def _fetch_ads(sql: str, params: tuple = (), with_photos: bool = False) -> List[Dict]:
+    """Выборка объявлений; фото подгружаются только для карточек"""
+    async def run(conn):
+        rows = await conn.execute_fetchall(sql, params)
+        ads = [dict(row) for row in rows]
+        if with_photos:
+            await _fetch_photos(conn, ads)
+        return ads
+    return await get_pool().read(run)
+
+
+async def _insert_photos(db: aiosqlite.Connection, ad_id: int, photos: List[str]) -> List[str]:
+    valid_photos = [p.strip() for p in photos if p and p.strip()]
+    await db.executemany(
+        "INSERT INTO ad_photos (ad_id, position, file_id) VALUES (?, ?, ?)",
+        [(ad_id, position, file_id) for position, file_id in enumerate(valid_photos)]
+    )
+    return valid_photos
 
 
 # ========== ПОЛЬЗОВАТЕЛИ ==========
 
 async def user_exists(telegram_id: int) -> bool:
     """Проверка существования пользователя"""
-    async with aiosqlite.connect(DATABASE) as db:
-        cursor = await db.execute(
-            "SELECT 1 FROM users WHERE telegram_id = ?", (telegram_id,)
-        )
-        return await cursor.fetchone() is not None
+    row = await _fetchone(
+        "SELECT 1 FROM users WHERE telegram_id = ?", (telegram_id,)
+    )
+    return row is not None
 
 
 async def add_user(telegram_id: int, username: str, game_nick: str, game_id: str):
     """Добавление нового пользователя"""
-    async with aiosqlite.connect(DATABASE) as db:
-        await db.execute(
-            """INSERT INTO users (telegram_id, username, game_nick, game_id) 
-               VALUES (?, ?, ?, ?)""",
-            (telegram_id, username, game_nick, game_id)
-        )
-        await db.commit()
+    await _execute(
+        """INSERT INTO users (telegram_id, username, game_nick, game_id) 
+           VALUES (?, ?, ?, ?)""",
+        (telegram_id, username, game_nick, game_id)
+    )
+    invalidate_user(telegram_id)
 
 
 async def get_user(telegram_id: int) -> Optional[Dict]:
     """Получение данных пользователя"""
-    async with aiosqlite.connect(DATABASE) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT * FROM users WHERE telegram_id = ?", (telegram_id,)
-        )
-        row = await cursor.fetchone()
-        return dict(row) if row else None
+    row = await _fetchone(
+        "SELECT * FROM users WHERE telegram_id = ?", (telegram_id,)
+    )
+    return dict(row) if row else None
+
+
+# Кэш строк users для проверки доступа (None - пользователь не зарегистрирован)
+_user_cache = LRUCache(USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+_user_invalidations = 0
+# С воркерами: когда флаг блокировки в последний раз сверялся с БД
+_user_block_checks = LRUCache(USER_CACHE_SIZE, ttl=USER_BLOCK_TTL)
+
+
+def invalidate_user(telegram_id: int):
+    """Сброс закэшированного пользователя после изменения"""
+    global _user_invalidations
+    _user_invalidations += 1
+    _user_cache.invalidate(telegram_id)
+
+
+async def get_user_cached(telegram_id: int) -> Optional[Dict]:
+    """Получение пользователя через кэш
+
+    С воркерами блокировку делает админ в воркере 0, и до остальных
+    воркеров invalidate_user не доходит. Поэтому там is_blocked
+    закэшированной строки сверяется с БД не чаще раза в USER_BLOCK_TTL:
+    блокировка доходит до других воркеров с этой задержкой, зато
+    повторные апдейты пользователя обходятся без чтений.
+    """
+    user = _user_cache.get(telegram_id)
+    if user is not MISSING:
+        if not WORKERS or user is None or _user_block_checks.get(telegram_id) is not MISSING:
+            return user
+        if await is_user_blocked(telegram_id) == bool(user['is_blocked']):
+            _user_block_checks.set(telegram_id, True)
+            return user
+        invalidate_user(telegram_id)
+
+    invalidations = _user_invalidations
+    user = await get_user(telegram_id)
+    # Пока шёл запрос, запись могли изменить - тогда не кэшируем устаревшие данные
+    if invalidations == _user_invalidations:
+        _user_cache.set(telegram_id, user)
+        _user_block_checks.set(telegram_id, True)
+    return user
+
+
+def user_cache_stats() -> Dict[str, Any]:
+    """Статистика кэша пользователей"""
+    return _user_cache.stats()
 
 
 async def update_user(telegram_id: int, game_nick: str = None, game_id: str = None):
     """Обновление данных пользователя"""
-    async with aiosqlite.connect(DATABASE) as db:
+    async def run(db):
         if game_nick:
             await db.execute(
                 "UPDATE users SET game_nick = ? WHERE telegram_id = ?",
@@ -102,163 +470,590 @@ async def update_user(telegram_id: int, game_nick: str = None, game_id: str = No
                 "UPDATE users SET game_id = ? WHERE telegram_id = ?",
                 (game_id, telegram_id)
             )
-        await db.commit()
+        # Ник и игровой номер есть в карточках - закэшированные устаревают
+        await db.execute(
+            "UPDATE ads SET version = version + 1 WHERE user_id = ?", (telegram_id,)
+        )
+    await get_pool().write(run)
+    invalidate_user(telegram_id)
 
 
 async def is_user_blocked(telegram_id: int) -> bool:
     """Проверка блокировки пользователя"""
-    async with aiosqlite.connect(DATABASE) as db:
-        cursor = await db.execute(
-            "SELECT is_blocked FROM users WHERE telegram_id = ?", (telegram_id,)
-        )
-        row = await cursor.fetchone()
-        return row[0] == 1 if row else False
+    row = await _fetchone(
+        "SELECT is_blocked FROM users WHERE telegram_id = ?", (telegram_id,)
+    )
+    return row[0] == 1 if row else False
 
 
 async def block_user(telegram_id: int, block: bool = True):
     """Блокировка/разблокировка пользователя"""
-    async with aiosqlite.connect(DATABASE) as db:
-        await db.execute(
-            "UPDATE users SET is_blocked = ? WHERE telegram_id = ?",
-            (1 if block else 0, telegram_id)
-        )
-        await db.commit()
+    await _execute(
+        "UPDATE users SET is_blocked = ? WHERE telegram_id = ?",
+        (1 if block else 0, telegram_id)
+    )
+    invalidate_user(telegram_id)
+
+
+def encode_user_cursor(user: Dict) -> str:
+    """Курсор списка пользователей: <unix time регистрации>_<telegram_id>"""
+    created = datetime.strptime(user['created_at'], TIMESTAMP_FORMAT)
+    return f"{timegm(created.timetuple())}_{user['telegram_id']}"
+
+
+async def get_user_stats() -> Dict[str, int]:
+    """Число пользователей и заблокированных (счётчики на триггерах)"""
+    row = await _fetchone("SELECT total, blocked FROM user_stats WHERE id = 1")
+    return dict(row) if row else {"total": 0, "blocked": 0}
+
 
+async def _seek_users(cursor: Optional[AdCursor], limit: int, forward: bool) -> List[Dict]:
+    direction = "DESC" if forward else "ASC"
+    seek, params = "", ()
+    if cursor is not None:
+        seek = f"WHERE (created_at, telegram_id) {'<' if forward else '>'} (?, ?)"
+        params = tuple(cursor)
+    # Страница выбирается по индексу, число объявлений считается только для неё
+    rows = await _fetchall(
+        f"""SELECT page.telegram_id, page.username, page.game_nick, page.game_id,
+                  page.is_blocked, page.created_at, COUNT(ads.id) AS active_ads
+           FROM (
+               SELECT * FROM users {seek}
+               ORDER BY created_at {direction}, telegram_id {direction}
+               LIMIT ?
+           ) AS page
+           LEFT JOIN ads ON ads.user_id = page.telegram_id AND ads.is_active = 1
+           GROUP BY page.telegram_id
+           ORDER BY page.created_at DESC, page.telegram_id DESC""",
+        (*params, limit)
+    )
+    return [dict(row) for row in rows]
 
-async def get_all_users() -> List[Dict]:
-    """Получение всех пользователей"""
-    async with aiosqlite.connect(DATABASE) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute("SELECT * FROM users")
-        rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
+
+async def get_users_after(cursor: Optional[AdCursor] = None, limit: int = 20) -> List[Dict]:
+    """Страница пользователей после курсора (новые сначала) с числом активных объявлений"""
+    return await _seek_users(cursor, limit, forward=True)
+
+
+async def get_users_before(cursor: AdCursor, limit: int = 20) -> List[Dict]:
+    """Страница пользователей перед курсором (в порядке списка)"""
+    return await _seek_users(cursor, limit, forward=False)
 
 
 # ========== ОБЪЯВЛЕНИЯ ==========
 
 async def add_ad(user_id: int, title: str, description: str, 
-                 price: str, category: str, photos: List[str]) -> int:
+                 price: str, category: str, photos: List[str],
+                 price_value: Optional[int] = None, price_negotiable: bool = False) -> int:
     """Создание нового объявления"""
-    async with aiosqlite.connect(DATABASE) as db:
-        photos_str = photos_to_string(photos)
-        cursor = await db.execute(
-            """INSERT INTO ads (user_id, title, description, price, category, photos) 
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (user_id, title, description, price, category, photos_str)
-        )
-        await db.commit()
-        return cursor.lastrowid
+    async def run(db):
+        async with db.execute(
+            """INSERT INTO ads (user_id, title, description, price, category,
+                                price_value, price_negotiable) 
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (user_id, title, description, price, category, price_value, int(price_negotiable))
+        ) as cursor:
+            ad_id = cursor.lastrowid
+        await _insert_photos(db, ad_id, photos)
+        return ad_id
+    return await get_pool().write(run)
+
+
+# Объявления с продавцом и фото, ключ (id, version)
+_ad_cache = LRUCache(AD_CACHE_SIZE)
+
+
+def cache_ads(ads: List[Dict]):
+    """Кэширование уже загруженных карточек (с продавцом и фото)"""
+    for ad in ads:
+        _ad_cache.set((ad['id'], ad['version']), ad)
+
+
+def ad_cache_stats() -> Dict[str, Any]:
+    """Статистика кэша объявлений"""
+    return _ad_cache.stats()
 
 
-async def get_ad(ad_id: int) -> Optional[Dict]:
-    """Получение объявления по ID"""
-    async with aiosqlite.connect(DATABASE) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            """SELECT ads.*, users.game_nick, users.game_id, users.username, users.telegram_id as seller_id
+async def get_ad(ad_id: int, with_photos: bool = True) -> Optional[Dict]:
+    """Получение объявления по ID
+    
+    Из БД читается только версия (по первичному ключу); JOIN с продавцом
+    и фото выполняется, лишь если этой версии нет в кэше. Версия хранится
+    в БД, поэтому кэши разных процессов не расходятся. Закэшированная
+    карточка всегда содержит фото, with_photos оставлен для совместимости.
+    """
+    row = await _fetchone(
+        "SELECT version FROM ads WHERE id = ? AND is_active = 1", (ad_id,)
+    )
+    if row is None:
+        return None
+    
+    ad = _ad_cache.get((ad_id, row[0]))
+    if ad is MISSING:
+        ads = await _fetch_ads(
+            f"""SELECT {AD_COLUMNS}, {SELLER_COLUMNS}
                FROM ads 
                JOIN users ON ads.user_id = users.telegram_id 
                WHERE ads.id = ? AND ads.is_active = 1""",
-            (ad_id,)
+            (ad_id,),
+            with_photos=True
         )
-        row = await cursor.fetchone()
-        if row:
-            data = dict(row)
-            data['photos'] = parse_photos(data.get('photos', ''))
-            return data
-        return None
+        if not ads:
+            return None
+        ad = ads[0]
+        cache_ads(ads)
+    return dict(ad)
+
+
+async def get_ad_photos(ad_id: int) -> List[str]:
+    """Фото объявления в порядке загрузки (без фото в карантине)"""
+    rows = await _fetchall(
+        """SELECT file_id FROM ad_photos
+           WHERE ad_id = ? AND quarantined_at IS NULL ORDER BY position""",
+        (ad_id,)
+    )
+    return [row['file_id'] for row in rows]
+
+
+# Сортировки ленты: колонка ключа курсора и направление
+SORT_ORDERS = {
+    "new": ("ads.created_at", "DESC"),
+    "price_asc": ("ads.price_value", "ASC"),
+    "price_desc": ("ads.price_value", "DESC"),
+}
 
 
-async def get_ads_by_category(category: str, offset: int = 0, limit: int = 1) -> List[Dict]:
+def _price_filters(sort: str, min_price: Optional[int],
+                   max_price: Optional[int]) -> Tuple[str, tuple]:
+    """Условия по цене; при сортировке по цене объявления без цены не показываются"""
+    conditions, params = [], []
+    if sort != "new" or min_price is not None or max_price is not None:
+        conditions.append("ads.price_value IS NOT NULL")
+    if min_price is not None:
+        conditions.append("ads.price_value >= ?")
+        params.append(min_price)
+    if max_price is not None:
+        conditions.append("ads.price_value <= ?")
+        params.append(max_price)
+    return "".join(f" AND {condition}" for condition in conditions), tuple(params)
+
+
+async def get_ads_by_category(category: str, offset: int = 0, limit: int = 1,
+                              sort: str = "new", min_price: Optional[int] = None,
+                              max_price: Optional[int] = None) -> List[Dict]:
     """Получение объявлений по категории"""
-    async with aiosqlite.connect(DATABASE) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            """SELECT ads.*, users.game_nick, users.game_id, users.username, users.telegram_id as seller_id
-               FROM ads 
-               JOIN users ON ads.user_id = users.telegram_id 
-               WHERE ads.category = ? AND ads.is_active = 1 AND users.is_blocked = 0
-               ORDER BY ads.created_at DESC
-               LIMIT ? OFFSET ?""",
-            (category, limit, offset)
+    key, direction = SORT_ORDERS[sort]
+    filters, params = _price_filters(sort, min_price, max_price)
+    return await _fetch_ads(
+        f"""SELECT {AD_COLUMNS}, {SELLER_COLUMNS}
+           FROM ads 
+           JOIN users ON ads.user_id = users.telegram_id 
+           WHERE ads.category = ? AND ads.is_active = 1 AND users.is_blocked = 0{filters}
+           ORDER BY {key} {direction}, ads.id {direction}
+           LIMIT ? OFFSET ?""",
+        (category, *params, limit, offset),
+        with_photos=True
+    )
+
+
+def encode_cursor(ad: Dict, sort: str = "new") -> str:
+    """Компактный курсор для callback_data: <unix time или цена>_<id>"""
+    if sort != "new":
+        return f"{ad['price_value']}_{ad['id']}"
+    created = datetime.strptime(ad['created_at'], TIMESTAMP_FORMAT)
+    return f"{timegm(created.timetuple())}_{ad['id']}"
+
+
+def decode_cursor(value: str, sort: str = "new") -> AdCursor:
+    """Разбор курсора из callback_data"""
+    key, ad_id = value.split("_")
+    if sort != "new":
+        return int(key), int(ad_id)
+    created = datetime.fromtimestamp(int(key), tz=timezone.utc)
+    return created.strftime(TIMESTAMP_FORMAT), int(ad_id)
+
+
+async def _seek_ads(category: str, cursor: Optional[AdCursor], limit: int, sort: str,
+                    min_price: Optional[int], max_price: Optional[int],
+                    forward: bool) -> List[Dict]:
+    """Выборка от курсора по индексу; назад - в обратном порядке с разворотом"""
+    key, direction = SORT_ORDERS[sort]
+    if not forward:
+        direction = "ASC" if direction == "DESC" else "DESC"
+    filters, params = _price_filters(sort, min_price, max_price)
+    seek = ""
+    if cursor is not None:
+        operator = "<" if direction == "DESC" else ">"
+        seek = f" AND ({key}, ads.id) {operator} (?, ?)"
+        params += tuple(cursor)
+    ads = await _fetch_ads(
+        f"""SELECT {AD_COLUMNS}, {SELLER_COLUMNS}
+           FROM ads 
+           JOIN users ON ads.user_id = users.telegram_id 
+           WHERE ads.category = ? AND ads.is_active = 1 AND users.is_blocked = 0{filters}{seek}
+           ORDER BY {key} {direction}, ads.id {direction}
+           LIMIT ?""",
+        (category, *params, limit),
+        with_photos=True
+    )
+    cache_ads(ads)
+    return ads if forward else ads[::-1]
+
+
+async def get_ads_after(category: str, cursor: Optional[AdCursor] = None,
+                        limit: int = 1, sort: str = "new", min_price: Optional[int] = None,
+                        max_price: Optional[int] = None) -> List[Dict]:
+    """Следующие объявления категории после курсора (в порядке сортировки)"""
+    return await _seek_ads(category, cursor, limit, sort, min_price, max_price, forward=True)
+
+
+async def get_ads_before(category: str, cursor: AdCursor, limit: int = 1,
+                         sort: str = "new", min_price: Optional[int] = None,
+                         max_price: Optional[int] = None) -> List[Dict]:
+    """Предыдущие объявления категории перед курсором (в порядке ленты)"""
+    return await _seek_ads(category, cursor, limit, sort, min_price, max_price, forward=False)
+
+
+async def count_ads_by_category(category: str, sort: str = "new",
+                                min_price: Optional[int] = None,
+                                max_price: Optional[int] = None) -> int:
+    """Подсчёт объявлений в категории
+
+    Без фильтров читается счётчик, поддерживаемый триггерами;
+    с фильтром по цене считается диапазон индекса.
+    """
+    filters, params = _price_filters(sort, min_price, max_price)
+    if not filters:
+        row = await _fetchone(
+            "SELECT active_count FROM category_stats WHERE category = ?",
+            (category,)
         )
-        rows = await cursor.fetchall()
-        result = []
-        for row in rows:
-            data = dict(row)
-            data['photos'] = parse_photos(data.get('photos', ''))
-            result.append(data)
-        return result
-
-
-async def count_ads_by_category(category: str) -> int:
-    """Подсчёт объявлений в категории"""
-    async with aiosqlite.connect(DATABASE) as db:
-        cursor = await db.execute(
-            """SELECT COUNT(*) FROM ads 
+    else:
+        row = await _fetchone(
+            f"""SELECT COUNT(*) FROM ads
                JOIN users ON ads.user_id = users.telegram_id
-               WHERE ads.category = ? AND ads.is_active = 1 AND users.is_blocked = 0""",
-            (category,)
+               WHERE ads.category = ? AND ads.is_active = 1 AND users.is_blocked = 0{filters}""",
+            (category, *params)
         )
-        row = await cursor.fetchone()
-        return row[0] if row else 0
+    return row[0] if row else 0
+
+
+async def get_category_counts() -> Dict[str, int]:
+    """Количество объявлений во всех категориях"""
+    rows = await _fetchall("SELECT category, active_count FROM category_stats")
+    return {row['category']: row['active_count'] for row in rows}
 
 
 async def get_user_ads(user_id: int) -> List[Dict]:
-    """Получение объявлений пользователя"""
-    async with aiosqlite.connect(DATABASE) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            """SELECT * FROM ads WHERE user_id = ? AND is_active = 1 
-               ORDER BY created_at DESC""",
-            (user_id,)
+    """Получение объявлений пользователя (без фото)"""
+    return await _fetch_ads(
+        f"""SELECT {AD_COLUMNS} FROM ads WHERE user_id = ? AND is_active = 1 
+           ORDER BY created_at DESC, id DESC""",
+        (user_id,)
+    )
+
+
+# Колонки, которые можно менять через update_ad
+EDITABLE_AD_COLUMNS = ("title", "description", "price", "price_value", "price_negotiable", "category")
+RETURNING_AD_COLUMNS = AD_COLUMNS.replace("ads.", "")
+
+
+async def get_ad_revision(ad_id: int) -> Optional[int]:
+    """Счётчик правок активного объявления (None - удалено или не найдено)
+
+    В отличие от version (ключ кэша карточек), не меняется при ошибках фото
+    и правке профиля продавца - только при update_ad и delete_ad.
+    """
+    row = await _fetchone(
+        "SELECT revision FROM ads WHERE id = ? AND is_active = 1", (ad_id,)
+    )
+    return row[0] if row else None
+
+
+async def update_ad(ad_id: int, expected_revision: Optional[int] = None, **kwargs) -> Optional[Dict]:
+    """Обновление объявления одним UPDATE ... RETURNING
+
+    Меняются только колонки из EDITABLE_AD_COLUMNS и фото (photos).
+    Если передан expected_revision, а объявление с тех пор правили
+    (с другого устройства), ничего не записывается. Возвращает
+    свежую строку объявления без продавца (с фото, если они заменялись)
+    или None, если объявление удалено или версия не совпала.
+    """
+    photos = kwargs.pop('photos', None)
+    unknown = set(kwargs) - set(EDITABLE_AD_COLUMNS)
+    if unknown:
+        raise ValueError(f"Недопустимые колонки объявления: {', '.join(sorted(unknown))}")
+
+    assignments = [f"{key} = ?" for key in kwargs]
+    params = list(kwargs.values())
+    if photos is not None:
+        assignments.append("broken_photos = 0")
+    assignments.append("version = version + 1")
+    assignments.append("revision = revision + 1")
+    condition = "id = ? AND is_active = 1"
+    params.append(ad_id)
+    if expected_revision is not None:
+        condition += " AND revision = ?"
+        params.append(expected_revision)
+
+    async def run(db):
+        rows = await db.execute_fetchall(
+            f"UPDATE ads SET {', '.join(assignments)} WHERE {condition} "
+            f"RETURNING {RETURNING_AD_COLUMNS}",
+            tuple(params)
         )
-        rows = await cursor.fetchall()
-        result = []
-        for row in rows:
-            data = dict(row)
-            data['photos'] = parse_photos(data.get('photos', ''))
-            result.append(data)
-        return result
-
-
-async def update_ad(ad_id: int, **kwargs):
-    """Обновление объявления"""
-    async with aiosqlite.connect(DATABASE) as db:
-        for key, value in kwargs.items():
-            if key == 'photos':
-                value = photos_to_string(value)
-            await db.execute(
-                f"UPDATE ads SET {key} = ? WHERE id = ?",
-                (value, ad_id)
-            )
-        await db.commit()
+        if not rows:
+            return None
+        ad = dict(rows[0])
+        if photos is not None:
+            await db.execute("DELETE FROM ad_photos WHERE ad_id = ?", (ad_id,))
+            ad['photos'] = await _insert_photos(db, ad_id, photos)
+        return ad
+    return await get_pool().write(run)
 
 
 async def delete_ad(ad_id: int):
     """Удаление объявления (мягкое)"""
-    async with aiosqlite.connect(DATABASE) as db:
+    await _execute(
+        "UPDATE ads SET is_active = 0, version = version + 1, revision = revision + 1 WHERE id = ?",
+        (ad_id,)
+    )
+
+
+def _admin_ad_filters(filters: Dict[str, Any]) -> Tuple[str, tuple]:
+    """Условия модерации: категория, продавец, период [date_from, date_to)"""
+    conditions, params = [], []
+    if filters.get('category'):
+        conditions.append("ads.category = ?")
+        params.append(filters['category'])
+    if filters.get('seller_id'):
+        conditions.append("ads.user_id = ?")
+        params.append(filters['seller_id'])
+    if filters.get('date_from'):
+        conditions.append("ads.created_at >= ?")
+        params.append(filters['date_from'])
+    if filters.get('date_to'):
+        conditions.append("ads.created_at < ?")
+        params.append(filters['date_to'])
+    return "".join(f" AND {condition}" for condition in conditions), tuple(params)
+
+
+async def _seek_admin_ads(filters: Dict[str, Any], cursor: Optional[AdCursor],
+                          limit: int, forward: bool) -> List[Dict]:
+    direction = "DESC" if forward else "ASC"
+    conditions, params = _admin_ad_filters(filters)
+    if cursor is not None:
+        operator = "<" if forward else ">"
+        conditions += f" AND (ads.created_at, ads.id) {operator} (?, ?)"
+        params += tuple(cursor)
+    ads = await _fetch_ads(
+        f"""SELECT {AD_COLUMNS}, {SELLER_COLUMNS}
+           FROM ads 
+           JOIN users ON ads.user_id = users.telegram_id 
+           WHERE ads.is_active = 1{conditions}
+           ORDER BY ads.created_at {direction}, ads.id {direction}
+           LIMIT ?""",
+        (*params, limit)
+    )
+    return ads if forward else ads[::-1]
+
+
+async def get_admin_ads_after(filters: Dict[str, Any], cursor: Optional[AdCursor] = None,
+                              limit: int = 1) -> List[Dict]:
+    """Объявления для админа после курсора (новые сначала, без фото)
+
+    Все условия фильтра покрываются индексами по (is_active, created_at),
+    (category, ...) и (user_id, ...), поэтому страница читается seek'ом.
+    """
+    return await _seek_admin_ads(filters, cursor, limit, forward=True)
+
+
+async def get_admin_ads_before(filters: Dict[str, Any], cursor: AdCursor,
+                               limit: int = 1) -> List[Dict]:
+    """Объявления для админа перед курсором (в порядке ленты)"""
+    return await _seek_admin_ads(filters, cursor, limit, forward=False)
+
+# ========== КАРАНТИН ФОТО ==========
+
+async def record_photo_failure(ad_id: int, file_id: str) -> bool:
+    """Учёт отказа Telegram принять фото; True, если фото ушло в карантин
+    
+    После PHOTO_FAILURE_THRESHOLD отказов фото перестаёт показываться,
+    а версия объявления растёт, чтобы кэши карточек обновились.
+    """
+    async def run(db):
+        async with db.execute(
+            """UPDATE ad_photos SET failures = failures + 1
+               WHERE ad_id = ? AND file_id = ? AND quarantined_at IS NULL
+               RETURNING position, failures""",
+            (ad_id, file_id)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        quarantined = [(ad_id, row[0]) for row in rows if row[1] >= PHOTO_FAILURE_THRESHOLD]
+        if not quarantined:
+            return False
+        await db.executemany(
+            """UPDATE ad_photos SET quarantined_at = CURRENT_TIMESTAMP
+               WHERE ad_id = ? AND position = ?""",
+            quarantined
+        )
         await db.execute(
-            "UPDATE ads SET is_active = 0 WHERE id = ?", (ad_id,)
+            """UPDATE ads SET broken_photos = broken_photos + ?, version = version + 1
+               WHERE id = ?""",
+            (len(quarantined), ad_id)
         )
-        await db.commit()
+        return True
+    quarantined = await get_pool().write(run)
+    if quarantined:
+        logger.warning(f"Фото объявления #{ad_id} помещено в карантин: {file_id}")
+    return quarantined
 
 
-async def get_all_ads() -> List[Dict]:
-    """Получение всех активных объявлений (для админа)"""
-    async with aiosqlite.connect(DATABASE) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            """SELECT ads.*, users.game_nick, users.game_id, users.username, users.telegram_id as seller_id
-               FROM ads 
-               JOIN users ON ads.user_id = users.telegram_id 
-               WHERE ads.is_active = 1
-               ORDER BY ads.created_at DESC"""
+async def get_quarantined_photos(checked_before: str, limit: int) -> List[Dict]:
+    """Фото в карантине, не проверявшиеся с checked_before (самые старые первыми)"""
+    rows = await _fetchall(
+        """SELECT ad_id, position, file_id FROM ad_photos
+           WHERE quarantined_at IS NOT NULL AND quarantined_at < ?
+           ORDER BY quarantined_at
+           LIMIT ?""",
+        (checked_before, limit)
+    )
+    return [dict(row) for row in rows]
+
+
+async def release_photo(ad_id: int, position: int):
+    """Возврат фото из карантина после успешной проверки"""
+    async def run(db):
+        async with db.execute(
+            """UPDATE ad_photos SET failures = 0, quarantined_at = NULL
+               WHERE ad_id = ? AND position = ? AND quarantined_at IS NOT NULL""",
+            (ad_id, position)
+        ) as cursor:
+            released = cursor.rowcount
+        if released:
+            await db.execute(
+                """UPDATE ads SET broken_photos = max(broken_photos - 1, 0), version = version + 1
+                   WHERE id = ?""",
+                (ad_id,)
+            )
+    await get_pool().write(run)
+
+
+async def touch_quarantined_photo(ad_id: int, position: int):
+    """Отметка о неудачной перепроверке: следующая - через интервал"""
+    await _execute(
+        """UPDATE ad_photos SET quarantined_at = CURRENT_TIMESTAMP
+           WHERE ad_id = ? AND position = ? AND quarantined_at IS NOT NULL""",
+        (ad_id, position)
+    )
+
+
+# ========== ПОИСК ==========
+
+def build_search_query(text: str) -> Optional[str]:
+    """Запрос FTS5 из пользовательского ввода: все слова, с поиском по префиксу"""
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words[:10])
+
+
+async def search_ads(text: str, category: Optional[str] = None,
+                     limit: int = SEARCH_MAX_RESULTS) -> List[int]:
+    """ID найденных объявлений, по убыванию релевантности (bm25, название важнее)"""
+    query = build_search_query(text)
+    if query is None:
+        return []
+    category_filter = "AND ads.category = ?" if category else ""
+    params = (query, category, limit) if category else (query, limit)
+    rows = await _fetchall(
+        f"""SELECT ads.id
+           FROM ads_fts
+           JOIN ads ON ads.id = ads_fts.rowid
+           JOIN users ON ads.user_id = users.telegram_id
+           WHERE ads_fts MATCH ? AND ads.is_active = 1 AND users.is_blocked = 0
+                 {category_filter}
+           ORDER BY bm25(ads_fts, 10.0, 1.0), ads.id DESC
+           LIMIT ?""",
+        params
+    )
+    return [row[0] for row in rows]
+
+# ========== РАССЫЛКИ ==========
+
+async def create_broadcast(admin_id: int, chat_id: int, message_id: int, text: str) -> int:
+    """Создание задания рассылки"""
+    async def run(db):
+        async with db.execute("SELECT COUNT(*) FROM users WHERE is_blocked = 0") as cursor:
+            total = (await cursor.fetchone())[0]
+        async with db.execute(
+            """INSERT INTO broadcasts (admin_id, chat_id, message_id, text, total)
+               VALUES (?, ?, ?, ?, ?)""",
+            (admin_id, chat_id, message_id, text, total)
+        ) as cursor:
+            return cursor.lastrowid
+    return await get_pool().write(run)
+
+
+async def get_broadcast(broadcast_id: int) -> Optional[Dict]:
+    """Получение задания рассылки"""
+    row = await _fetchone("SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,))
+    return dict(row) if row else None
+
+
+async def get_broadcasts_by_status(status: str) -> List[Dict]:
+    """Задания рассылки с указанным статусом"""
+    rows = await _fetchall(
+        "SELECT * FROM broadcasts WHERE status = ? ORDER BY id", (status,)
+    )
+    return [dict(row) for row in rows]
+
+
+async def set_broadcast_status(broadcast_id: int, status: str):
+    """Смена статуса рассылки (running, paused, cancelled, done)"""
+    finished = status in ("cancelled", "done")
+    await _execute(
+        """UPDATE broadcasts SET status = ?,
+               finished_at = CASE WHEN ? THEN CURRENT_TIMESTAMP ELSE finished_at END
+           WHERE id = ?""",
+        (status, finished, broadcast_id)
+    )
+
+
+async def get_broadcast_recipients(after_id: int, limit: int) -> List[int]:
+    """Следующая порция получателей рассылки по возрастанию telegram_id"""
+    rows = await _fetchall(
+        """SELECT telegram_id FROM users
+           WHERE telegram_id > ? AND is_blocked = 0
+           ORDER BY telegram_id
+           LIMIT ?""",
+        (after_id, limit)
+    )
+    return [row[0] for row in rows]
+
+
+async def save_broadcast_progress(broadcast_id: int, cursor: int,
+                                  results: List[Tuple[int, bool]]):
+    """Запись результатов порции и сдвиг курсора одной транзакцией"""
+    sent = sum(1 for _, delivered in results if delivered)
+
+    async def run(db):
+        await db.executemany(
+            """INSERT OR REPLACE INTO broadcast_recipients (broadcast_id, telegram_id, delivered)
+               VALUES (?, ?, ?)""",
+            [(broadcast_id, telegram_id, int(delivered)) for telegram_id, delivered in results]
         )
-        rows = await cursor.fetchall()
-        result = []
-        for row in rows:
-            data = dict(row)
-            data['photos'] = parse_photos(data.get('photos', ''))
-            result.append(data)
-        return result
\ No newline at end of file
+        await db.execute(
+            """UPDATE broadcasts SET cursor = ?, sent = sent + ?, failed = failed + ?
+               WHERE id = ?""",
+            (cursor, sent, len(results) - sent, broadcast_id)
+        )
+    await get_pool().write(run)
+
+
+# ========== МЕТРИКИ ==========
+
+# Имя функции для журнала медленных запросов и время каждой публичной функции модуля;
+# обёртки и метки создаются один раз при импорте
+querylog.instrument_module(globals(), __name__)
+metrics.instrument_module(globals(), __name__)
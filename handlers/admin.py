@@ -1,13 +1,26 @@
+from datetime import date, datetime, timedelta
+from html import escape
+from typing import Optional, Tuple
+
 from aiogram import Router, F, Bot
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 
+import broadcast
 import database as db
+import querylog
 from states import AdminStates
-from keyboards import admin_panel_keyboard, cancel_keyboard, admin_ad_keyboard, admin_menu_keyboard
-from config import ADMIN_IDS, CATEGORIES
+from keyboards import (
+    admin_panel_keyboard, cancel_keyboard, admin_ad_keyboard, admin_menu_keyboard,
+    admin_ads_filter_keyboard, admin_users_keyboard
+)
+from config import ADMIN_IDS, CATEGORIES, USERS_PER_PAGE, SLOW_QUERY_MS, SLOW_QUERY_TOP
+from handlers.ads import render_cache_stats
+from middlewares import throttling
+from ratelimit import api_limiter
 
-router = Router()
+router = Router(name="admin")
 
 
 def is_admin(user_id: int) -> bool:
@@ -44,103 +57,184 @@ async def admin_back(callback: CallbackQuery):
 
 @router.callback_query(F.data == "admin_users")
 async def admin_users(callback: CallbackQuery):
-    """Список всех пользователей"""
+    """Список пользователей (первая страница)"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён!")
+        return
+    
+    await show_users_page(callback, cursor=None, page=0)
+
+
+@router.callback_query(F.data.startswith("ausers_"))
+async def admin_users_navigate(callback: CallbackQuery):
+    """Листание списка пользователей"""
     if not is_admin(callback.from_user.id):
         await callback.answer("⛔ Доступ запрещён!")
         return
     
-    users = await db.get_all_users()
+    # ausers_<p|n>_<курсор>_<страница>
+    _, direction, timestamp, user_id, page = callback.data.split("_")
+    cursor = db.decode_cursor(f"{timestamp}_{user_id}")
+    await show_users_page(callback, cursor, int(page), backward=direction == "p")
+
+
+async def show_users_page(callback: CallbackQuery, cursor: Optional[db.AdCursor],
+                          page: int, backward: bool = False):
+    """Страница пользователей с числом объявлений
+    
+    Итоги берутся из счётчиков, страница - keyset-запросом,
+    поэтому стоимость не зависит от числа пользователей.
+    """
+    if backward:
+        users = await db.get_users_before(cursor, USERS_PER_PAGE)
+        has_next = True
+        if len(users) < USERS_PER_PAGE:
+            # Дошли до начала списка
+            users = await db.get_users_after(None, USERS_PER_PAGE + 1)
+            page = 0
+            has_next = len(users) > USERS_PER_PAGE
+            users = users[:USERS_PER_PAGE]
+    else:
+        users = await db.get_users_after(cursor, USERS_PER_PAGE + 1)
+        has_next = len(users) > USERS_PER_PAGE
+        users = users[:USERS_PER_PAGE]
     
     if not users:
         await callback.answer("Пользователей нет")
         return
     
-    text = "👥 **Список пользователей:**\n\n"
+    stats = await db.get_user_stats()
+    active_ads = sum((await db.get_category_counts()).values())
+    pages = max(1, -(-stats['total'] // USERS_PER_PAGE))
     
-    for user in users[:50]:  # Ограничиваем 50 пользователями
+    text = (
+        f"👥 **Пользователи:** {stats['total']} (🚫 {stats['blocked']})\n"
+        f"📦 **Активных объявлений:** {active_ads}\n"
+        f"📄 Страница {min(page + 1, pages)}/{pages}\n\n"
+    )
+    for user in users:
         status = "🚫" if user['is_blocked'] else "✅"
         text += (
             f"{status} ID: `{user['telegram_id']}`\n"
-            f"   Ник: {user['game_nick']} | Игр.ID: {user['game_id']}\n\n"
+            f"   Ник: {user['game_nick']} | Игр.ID: {user['game_id']}\n"
+            f"   📦 Объявлений: {user['active_ads']} | 📅 {(user['created_at'] or '')[:10]}\n\n"
         )
     
-    if len(users) > 50:
-        text += f"_...и ещё {len(users) - 50} пользователей_"
-    
-    text += f"\n\n📊 **Всего:** {len(users)} пользователей"
-    
     await callback.message.edit_text(
         text,
-        reply_markup=admin_panel_keyboard(),
+        reply_markup=admin_users_keyboard(
+            db.encode_user_cursor(users[0]), db.encode_user_cursor(users[-1]), page, has_next
+        ),
         parse_mode="Markdown"
     )
 
 
 # ========== ОБЪЯВЛЕНИЯ ==========
 
-@router.callback_query(F.data == "admin_ads")
+def parse_date_range(text: str) -> Tuple[Optional[str], Optional[str]]:
+    """Период «ДД.ММ.ГГГГ-ДД.ММ.ГГГГ» в границы [от, до) в формате ISO
+
+    Любую из дат можно опустить: «01.05.2026-», «-31.05.2026».
+    Одна дата без дефиса - один день.
+    """
+    def parse(value: str) -> Optional[date]:
+        value = value.strip()
+        return datetime.strptime(value, "%d.%m.%Y").date() if value else None
+    
+    if "-" in text:
+        start, end = (parse(part) for part in text.split("-", 1))
+    else:
+        start = end = parse(text)
+    if start and end and start > end:
+        start, end = end, start
+    return (
+        start.isoformat() if start else None,
+        (end + timedelta(days=1)).isoformat() if end else None
+    )
+
+
+def admin_filter_text(filters: dict) -> str:
+    """Описание фильтра модерации"""
+    parts = []
+    if filters.get('category'):
+        parts.append(CATEGORIES.get(filters['category'], filters['category']))
+    if filters.get('seller_id'):
+        parts.append(f"продавец `{filters['seller_id']}`")
+    if filters.get('date_from') or filters.get('date_to'):
+        start = filters.get('date_from') or "…"
+        end = filters.get('date_to')
+        end = (date.fromisoformat(end) - timedelta(days=1)).isoformat() if end else "…"
+        parts.append(f"{start} — {end}")
+    return ", ".join(parts) if parts else "нет"
+
+
+@router.callback_query(F.data.in_({"admin_ads", "admin_ads_show"}))
 async def admin_ads(callback: CallbackQuery, state: FSMContext):
-    """Список всех объявлений"""
+    """Просмотр объявлений с начала ленты"""
     if not is_admin(callback.from_user.id):
         await callback.answer("⛔ Доступ запрещён!")
         return
     
-    ads = await db.get_all_ads()
+    await show_admin_ads_page(callback, state, cursor=None, page=0)
+
+
+async def show_admin_ads_page(callback: CallbackQuery, state: FSMContext,
+                              cursor: Optional[str], page: int, backward: bool = False):
+    """Показ объявления для админа
     
-    if not ads:
+    В состоянии хранятся только фильтр, курсор и номер позиции:
+    каждая страница - отдельный запрос по индексу.
+    """
+    data = await state.get_data()
+    filters = data.get('admin_ads_filter') or {}
+    seek = db.decode_cursor(cursor) if cursor else None
+    
+    ad, has_next = None, True
+    if backward and seek is not None:
+        ads = await db.get_admin_ads_before(filters, seek, limit=1)
+        if ads:
+            ad = ads[0]
+        else:
+            page = 0
+            seek = None
+    if ad is None:
+        ads = await db.get_admin_ads_after(filters, seek, limit=2)
+        if ads:
+            ad, has_next = ads[0], len(ads) > 1
+        elif seek is not None:
+            # Удалили последнее объявление - показываем предыдущее
+            ads = await db.get_admin_ads_before(filters, seek, limit=1)
+            if ads:
+                ad, has_next, page = ads[0], False, page - 1
+    
+    if ad is None:
+        await state.update_data(admin_ads_cursor=None, admin_ads_page=0)
         await callback.message.edit_text(
-            "📭 Объявлений нет.",
-            reply_markup=admin_panel_keyboard()
+            f"📭 Объявлений нет.\n\n🔎 Фильтр: {admin_filter_text(filters)}",
+            reply_markup=admin_ads_filter_keyboard(filters.get('category')),
+            parse_mode="Markdown"
         )
         return
     
-    await state.update_data(admin_ads=ads, admin_ads_page=0)
-    await show_admin_ad(callback, state)
-
-
-async def show_admin_ad(callback: CallbackQuery, state: FSMContext):
-    """Показ объявления для админа"""
-    data = await state.get_data()
-    ads = data['admin_ads']
-    page = data['admin_ads_page']
-    
-    if page >= len(ads):
-        page = 0
-        await state.update_data(admin_ads_page=0)
-    
-    ad = ads[page]
+    page = max(page, 0)
+    await state.update_data(admin_ads_cursor=db.encode_cursor(ad), admin_ads_page=page)
     
     text = (
-        f"📋 **Объявление #{ad['id']}** ({page + 1}/{len(ads)})\n\n"
+        f"📋 **Объявление #{ad['id']}** ({page + 1})\n"
+        f"🔎 Фильтр: {admin_filter_text(filters)}\n\n"
         f"📦 **{ad['title']}**\n"
         f"📝 {ad['description']}\n\n"
         f"💰 Цена: {ad['price']}\n"
-        f"📂 Категория: {CATEGORIES.get(ad['category'], ad['category'])}\n\n"
+        f"📂 Категория: {CATEGORIES.get(ad['category'], ad['category'])}\n"
+        f"📅 Создано: {ad['created_at']}\n\n"
         f"👤 Продавец: {ad['game_nick']}\n"
         f"📞 Игр.ID: {ad['game_id']}\n"
         f"🆔 TG ID: `{ad['seller_id']}`"
     )
     
-    from aiogram.utils.keyboard import InlineKeyboardBuilder
-    from aiogram.types import InlineKeyboardButton
-    
-    builder = InlineKeyboardBuilder()
-    
-    # Навигация
-    nav_buttons = []
-    if page > 0:
-        nav_buttons.append(InlineKeyboardButton(text="⬅️", callback_data="admin_prev_ad"))
-    nav_buttons.append(InlineKeyboardButton(text=f"{page + 1}/{len(ads)}", callback_data="admin_current"))
-    if page < len(ads) - 1:
-        nav_buttons.append(InlineKeyboardButton(text="➡️", callback_data="admin_next_ad"))
-    
-    builder.row(*nav_buttons)
-    builder.row(InlineKeyboardButton(text="🗑 Удалить", callback_data=f"admin_delete_ad_{ad['id']}"))
-    builder.row(InlineKeyboardButton(text="🔙 Назад", callback_data="admin_panel_back"))
-    
     await callback.message.edit_text(
         text,
-        reply_markup=builder.as_markup(),
+        reply_markup=admin_ad_keyboard(ad['id'], page, has_next),
         parse_mode="Markdown"
     )
 
@@ -148,19 +242,28 @@ async def show_admin_ad(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "admin_next_ad")
 async def admin_next_ad(callback: CallbackQuery, state: FSMContext):
     """Следующее объявление"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён!")
+        return
+    
     data = await state.get_data()
-    page = data.get('admin_ads_page', 0) + 1
-    await state.update_data(admin_ads_page=page)
-    await show_admin_ad(callback, state)
+    await show_admin_ads_page(
+        callback, state, data.get('admin_ads_cursor'), data.get('admin_ads_page', 0) + 1
+    )
 
 
 @router.callback_query(F.data == "admin_prev_ad")
 async def admin_prev_ad(callback: CallbackQuery, state: FSMContext):
     """Предыдущее объявление"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён!")
+        return
+    
     data = await state.get_data()
-    page = max(0, data.get('admin_ads_page', 0) - 1)
-    await state.update_data(admin_ads_page=page)
-    await show_admin_ad(callback, state)
+    await show_admin_ads_page(
+        callback, state, data.get('admin_ads_cursor'), data.get('admin_ads_page', 0) - 1,
+        backward=True
+    )
 
 
 @router.callback_query(F.data.startswith("admin_delete_ad_"))
@@ -174,16 +277,126 @@ async def admin_delete_ad(callback: CallbackQuery, state: FSMContext):
     await db.delete_ad(ad_id)
     await callback.answer("✅ Объявление удалено!")
     
-    # Обновляем список
-    ads = await db.get_all_ads()
-    if ads:
-        await state.update_data(admin_ads=ads, admin_ads_page=0)
-        await show_admin_ad(callback, state)
+    # Курсор указывает на удалённое объявление - показываем следующее за ним
+    data = await state.get_data()
+    await show_admin_ads_page(
+        callback, state, data.get('admin_ads_cursor'), data.get('admin_ads_page', 0)
+    )
+
+
+# ========== ФИЛЬТРЫ ОБЪЯВЛЕНИЙ ==========
+
+async def show_admin_filter(message: Message, filters: dict, edit: bool = True):
+    """Меню фильтров модерации"""
+    text = (
+        "🔎 **Фильтры объявлений**\n\n"
+        f"Текущий фильтр: {admin_filter_text(filters)}"
+    )
+    markup = admin_ads_filter_keyboard(filters.get('category'))
+    if edit:
+        await message.edit_text(text, reply_markup=markup, parse_mode="Markdown")
     else:
-        await callback.message.edit_text(
-            "📭 Объявлений больше нет.",
-            reply_markup=admin_panel_keyboard()
-        )
+        await message.answer(text, reply_markup=markup, parse_mode="Markdown")
+
+
+@router.callback_query(F.data == "admin_ads_filter")
+async def admin_ads_filter(callback: CallbackQuery, state: FSMContext):
+    """Открытие фильтров"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён!")
+        return
+    
+    data = await state.get_data()
+    await show_admin_filter(callback.message, data.get('admin_ads_filter') or {})
+
+
+@router.callback_query(F.data.startswith("admin_fcat_"))
+async def admin_filter_category(callback: CallbackQuery, state: FSMContext):
+    """Фильтр по категории"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён!")
+        return
+    
+    category = callback.data.replace("admin_fcat_", "")
+    data = await state.get_data()
+    filters = data.get('admin_ads_filter') or {}
+    filters['category'] = None if category == "all" else category
+    await state.update_data(admin_ads_filter=filters)
+    await show_admin_filter(callback.message, filters)
+
+
+@router.callback_query(F.data == "admin_freset")
+async def admin_filter_reset(callback: CallbackQuery, state: FSMContext):
+    """Сброс фильтров"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён!")
+        return
+    
+    await state.update_data(admin_ads_filter={})
+    await show_admin_filter(callback.message, {})
+
+
+@router.callback_query(F.data == "admin_fseller")
+async def admin_filter_seller_start(callback: CallbackQuery, state: FSMContext):
+    """Запрос продавца для фильтра"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён!")
+        return
+    
+    await callback.message.edit_text(
+        "👤 Введите **Telegram ID** продавца (0 - все продавцы):",
+        parse_mode="Markdown"
+    )
+    await state.set_state(AdminStates.ads_seller)
+
+
+@router.message(AdminStates.ads_seller)
+async def process_filter_seller(message: Message, state: FSMContext):
+    """Фильтр по продавцу"""
+    try:
+        seller_id = int(message.text.strip())
+    except (AttributeError, ValueError):
+        await message.answer("❌ Введите корректный числовой ID")
+        return
+    
+    data = await state.get_data()
+    filters = data.get('admin_ads_filter') or {}
+    filters['seller_id'] = seller_id or None
+    await state.update_data(admin_ads_filter=filters)
+    await state.set_state(None)
+    await show_admin_filter(message, filters, edit=False)
+
+
+@router.callback_query(F.data == "admin_fdates")
+async def admin_filter_dates_start(callback: CallbackQuery, state: FSMContext):
+    """Запрос периода для фильтра"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён!")
+        return
+    
+    await callback.message.edit_text(
+        "📅 Введите **период** в формате `ДД.ММ.ГГГГ-ДД.ММ.ГГГГ`\n"
+        "Например: `01.05.2026-31.05.2026`, `01.05.2026-` или `-` для сброса",
+        parse_mode="Markdown"
+    )
+    await state.set_state(AdminStates.ads_dates)
+
+
+@router.message(AdminStates.ads_dates)
+async def process_filter_dates(message: Message, state: FSMContext):
+    """Фильтр по дате создания"""
+    try:
+        date_from, date_to = parse_date_range(message.text or "")
+    except ValueError:
+        await message.answer("❌ Неверный формат. Пример: `01.05.2026-31.05.2026`", parse_mode="Markdown")
+        return
+    
+    data = await state.get_data()
+    filters = data.get('admin_ads_filter') or {}
+    filters.update(date_from=date_from, date_to=date_to)
+    await state.update_data(admin_ads_filter=filters)
+    await state.set_state(None)
+    await show_admin_filter(message, filters, edit=False)
 
 
 @router.callback_query(F.data == "admin_panel_back")
@@ -204,6 +417,110 @@ async def admin_current(callback: CallbackQuery):
     await callback.answer()
 
 
+# ========== СТАТИСТИКА ==========
+
+def cache_line(name: str, stats: dict) -> str:
+    """Строка статистики кэша"""
+    return (
+        f"{name}: {stats['size']}/{stats['maxsize']}, "
+        f"попаданий {stats['hit_rate']:.0%} ({stats['hits']}/{stats['hits'] + stats['misses']})"
+    )
+
+
+def limiter_line(stats: dict) -> str:
+    """Строка статистики лимитов исходящих запросов"""
+    return (
+        f"🚦 Bot API: {stats['requests']} запросов, ждали {stats['waited']} "
+        f"(в среднем {stats['wait_avg']:.2f} с, макс. {stats['wait_max']:.2f} с), "
+        f"повторов после 429: {stats['retries']}"
+    )
+
+
+def throttle_line(stats: dict) -> str:
+    """Строка статистики антифлуда"""
+    dropped = sum(stats['throttled'].values())
+    reasons = ", ".join(f"{name}: {count}" for name, count in stats['throttled'].items()) or "нет"
+    offenders = ", ".join(f"`{user_id}` ({count})" for user_id, count in stats['offenders']) or "нет"
+    return (
+        f"🛑 Антифлуд: пропущено {stats['passed']}, отброшено {dropped} ({reasons})\n"
+        f"Чаще всего: {offenders}"
+    )
+
+
+def write_line(stats: dict) -> str:
+    """Строка статистики групповой записи в БД"""
+    return (
+        f"✍️ Запись в БД: {stats['writes']} записей в {stats['batches']} транзакциях "
+        f"(в среднем {stats['batch_avg']:.1f}, макс. {stats['batch_max']}), "
+        f"в очереди {stats['queued']}"
+    )
+
+
+@router.callback_query(F.data == "admin_cache_stats")
+async def admin_cache_stats(callback: CallbackQuery):
+    """Размер и hit rate кэшей процесса"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён!")
+        return
+    
+    render = render_cache_stats()
+    await callback.message.edit_text(
+        "📊 **Кэши**\n\n"
+        f"{cache_line('👥 Пользователи', db.user_cache_stats())}\n"
+        f"{cache_line('📦 Объявления', db.ad_cache_stats())}\n"
+        f"{cache_line('📝 Карточки', render['cards'])}\n"
+        f"{cache_line('⌨️ Клавиатуры', render['keyboards'])}\n\n"
+        f"{limiter_line(api_limiter.stats())}\n"
+        f"{throttle_line(throttling.stats())}\n"
+        f"{write_line(db.write_queue_stats())}",
+        reply_markup=admin_panel_keyboard(),
+        parse_mode="Markdown"
+    )
+
+
+# ========== МЕДЛЕННЫЕ ЗАПРОСЫ ==========
+
+def slow_queries_text(limit: int) -> str:
+    """Топ запросов по суммарному времени (HTML, в пределах лимита сообщения)"""
+    lines = [f"🐢 <b>Топ-{limit} запросов по суммарному времени</b> (порог {SLOW_QUERY_MS:g} мс)"]
+    for number, stats in enumerate(querylog.top(limit), 1):
+        callers = ", ".join(sorted(stats.callers, key=stats.callers.get, reverse=True)[:3])
+        lines.append(
+            f"\n{number}. {stats.total * 1000:.1f} мс всего, {stats.calls} раз, "
+            f"макс. {stats.max * 1000:.1f} мс, медленных {stats.slow}, строк {stats.rows}"
+            f"{' ⚠️ FULL SCAN' if stats.full_scan else ''}\n"
+            f"{escape(callers)}\n<code>{escape(stats.shape[:300])}</code>"
+        )
+    if len(lines) == 1:
+        lines.append("\nЗапросов пока не было")
+    text = "\n".join(lines)
+    return text if len(text) <= 4000 else text[:4000].rsplit("\n\n", 1)[0]
+
+
+@router.callback_query(F.data == "admin_slow_queries")
+async def admin_slow_queries(callback: CallbackQuery):
+    """Топ запросов к БД с момента запуска"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён!")
+        return
+    
+    await callback.message.edit_text(
+        slow_queries_text(SLOW_QUERY_TOP),
+        reply_markup=admin_panel_keyboard(),
+        parse_mode="HTML"
+    )
+
+
+@router.message(Command("slow"))
+async def admin_slow_queries_command(message: Message, command: CommandObject):
+    """/slow [N] - топ-N запросов к БД"""
+    if not is_admin(message.from_user.id):
+        return
+    
+    limit = int(command.args) if command.args and command.args.isdigit() else SLOW_QUERY_TOP
+    await message.answer(slow_queries_text(max(1, min(limit, 50))), parse_mode="HTML")
+
+
 # ========== БЛОКИРОВКА ==========
 
 @router.callback_query(F.data == "admin_block")
@@ -290,34 +607,16 @@ async def admin_broadcast_start(callback: CallbackQuery, state: FSMContext):
 
 @router.message(AdminStates.broadcast_message)
 async def process_broadcast(message: Message, state: FSMContext, bot: Bot):
-    """Отправка рассылки"""
+    """Запуск рассылки в фоне (прогресс обновляется в status_msg)"""
     broadcast_text = message.text
-    users = await db.get_all_users()
-    
-    success = 0
-    failed = 0
     
     status_msg = await message.answer("📤 Начинаю рассылку...")
-    
-    for user in users:
-        if user['is_blocked']:
-            continue
-        
-        try:
-            await bot.send_message(
-                user['telegram_id'],
-                f"📢 **Объявление от администрации:**\n\n{broadcast_text}",
-                parse_mode="Markdown"
-            )
-            success += 1
-        except Exception:
-            failed += 1
-    
-    await status_msg.edit_text(
-        f"✅ **Рассылка завершена!**\n\n"
-        f"📨 Успешно: {success}\n"
-        f"❌ Не доставлено: {failed}",
-        parse_mode="Markdown"
+    await broadcast.start_broadcast(
+        bot,
+        admin_id=message.from_user.id,
+        chat_id=status_msg.chat.id,
+        message_id=status_msg.message_id,
+        text=broadcast_text
     )
     
     await message.answer(
@@ -325,4 +624,25 @@ async def process_broadcast(message: Message, state: FSMContext, bot: Bot):
         reply_markup=admin_panel_keyboard(),
         parse_mode="Markdown"
     )
-    await state.clear()
\ No newline at end of file
+    await state.clear()
+
+
+@router.callback_query(F.data.startswith("bc_"))
+async def broadcast_control(callback: CallbackQuery, bot: Bot):
+    """Пауза, продолжение и отмена рассылки"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Доступ запрещён!")
+        return
+    
+    _, action, broadcast_id = callback.data.split("_")
+    broadcast_id = int(broadcast_id)
+    
+    if action == "pause":
+        done = await broadcast.pause_broadcast(broadcast_id)
+        await callback.answer("⏸ Рассылка приостановлена" if done else "Рассылка не выполняется")
+    elif action == "resume":
+        done = await broadcast.resume_broadcast(bot, broadcast_id)
+        await callback.answer("▶️ Рассылка продолжена" if done else "Рассылка не на паузе")
+    elif action == "cancel":
+        done = await broadcast.cancel_broadcast(bot, broadcast_id)
+        await callback.answer("🛑 Рассылка отменена" if done else "Рассылка уже завершена")
\ No newline at end of file
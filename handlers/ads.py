@@ -1,33 +1,38 @@
+from typing import Optional
+
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery, InputMediaPhoto
+from aiogram.types import Message, CallbackQuery, InputMediaPhoto, InlineKeyboardMarkup
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest
 
 import database as db
-from states import CreateAd, ViewAds, ContactSeller
+from states import CreateAd, ViewAds, ContactSeller, SearchAds
 from keyboards import (
     categories_keyboard, cancel_keyboard, done_photos_keyboard,
-    confirm_ad_keyboard, ad_navigation_keyboard, main_menu_keyboard
+    confirm_ad_keyboard, ad_navigation_keyboard, main_menu_keyboard,
+    search_categories_keyboard, search_navigation_keyboard, search_again_keyboard,
+    price_filter_keyboard, with_photo_navigation, SORT_TITLES, SORT_CODES
 )
-from config import CATEGORIES, MAX_PHOTOS, ADMIN_IDS
+from cache import LRUCache, MISSING
+from config import CATEGORIES, MAX_PHOTOS, ADMIN_IDS, AD_CACHE_SIZE
+from prices import parse_price, parse_price_range
+from quarantine import is_photo_error
 import logging
 
 logger = logging.getLogger(__name__)
 
-router = Router()
+router = Router(name="ads")
 
 
 # ========== MIDDLEWARE ДЛЯ ПРОВЕРКИ ==========
 
-async def check_user(message: Message) -> bool:
-    """Проверка регистрации и блокировки"""
-    user_id = message.from_user.id
-    
-    if await db.is_user_blocked(user_id):
+async def check_user(message: Message, db_user: Optional[dict]) -> bool:
+    """Проверка регистрации и блокировки (db_user подставляет UserMiddleware)"""
+    if db_user and db_user['is_blocked']:
         await message.answer("🚫 Вы заблокированы.")
         return False
     
-    if not await db.user_exists(user_id):
+    if not db_user:
         await message.answer("❌ Сначала пройдите регистрацию: /start")
         return False
     
@@ -37,9 +42,9 @@ async def check_user(message: Message) -> bool:
 # ========== СОЗДАНИЕ ОБЪЯВЛЕНИЯ ==========
 
 @router.message(F.text == "📢 Разместить объявление")
-async def create_ad_start(message: Message, state: FSMContext):
+async def create_ad_start(message: Message, state: FSMContext, db_user: Optional[dict]):
     """Начало создания объявления"""
-    if not await check_user(message):
+    if not await check_user(message, db_user):
         return
     
     await message.answer(
@@ -96,7 +101,8 @@ async def process_price(message: Message, state: FSMContext):
         await message.answer("❌ Цена слишком длинная (макс. 50 символов).")
         return
     
-    await state.update_data(price=price)
+    price_value, price_negotiable = parse_price(price)
+    await state.update_data(price=price, price_value=price_value, price_negotiable=price_negotiable)
     await message.answer(
         "📂 Выберите **категорию**:",
         reply_markup=categories_keyboard(for_create=True),
@@ -147,7 +153,7 @@ async def process_photos(message: Message, state: FSMContext):
 
 
 @router.callback_query(CreateAd.photos, F.data == "photos_done")
-async def photos_done(callback: CallbackQuery, state: FSMContext):
+async def photos_done(callback: CallbackQuery, state: FSMContext, db_user: Optional[dict]):
     """Завершение загрузки фото"""
     data = await state.get_data()
     photos = data.get('photos', [])
@@ -160,22 +166,20 @@ async def photos_done(callback: CallbackQuery, state: FSMContext):
         return
     
     await state.update_data(photos=photos)
-    await show_ad_preview(callback, state, data)
+    await show_ad_preview(callback, state, data, db_user)
 
 
 @router.callback_query(CreateAd.photos, F.data == "photos_skip")
-async def photos_skip(callback: CallbackQuery, state: FSMContext):
+async def photos_skip(callback: CallbackQuery, state: FSMContext, db_user: Optional[dict]):
     """Пропуск загрузки фото"""
     data = await state.get_data()
     await state.update_data(photos=[])
     data['photos'] = []
-    await show_ad_preview(callback, state, data)
+    await show_ad_preview(callback, state, data, db_user)
 
 
-async def show_ad_preview(callback: CallbackQuery, state: FSMContext, data: dict):
+async def show_ad_preview(callback: CallbackQuery, state: FSMContext, data: dict, user: dict):
     """Показ превью объявления"""
-    user = await db.get_user(callback.from_user.id)
-    
     photos = data.get('photos', [])
     photos = [p for p in photos if p and p.strip()]  # Фильтруем пустые
     
@@ -213,7 +217,9 @@ async def confirm_ad(callback: CallbackQuery, state: FSMContext):
         description=data['description'],
         price=data['price'],
         category=data['category'],
-        photos=photos
+        photos=photos,
+        price_value=data.get('price_value'),
+        price_negotiable=data.get('price_negotiable', False)
     )
     
     from keyboards import admin_menu_keyboard
@@ -233,18 +239,170 @@ async def confirm_ad(callback: CallbackQuery, state: FSMContext):
 
 # ========== ПРОСМОТР ОБЪЯВЛЕНИЙ ==========
 
+# Отрисованные карточки и клавиатуры ленты; версия в ключе делает
+# устаревшие записи недостижимыми, их вытесняет LRU
+_card_cache = LRUCache(AD_CACHE_SIZE)
+_keyboard_cache = LRUCache(AD_CACHE_SIZE)
+
+
+def render_cache_stats() -> dict:
+    """Статистика кэшей карточек и клавиатур"""
+    return {"cards": _card_cache.stats(), "keyboards": _keyboard_cache.stats()}
+
+
+def ad_card_text(ad: dict) -> str:
+    """Текст карточки объявления"""
+    key = (ad['id'], ad['version'])
+    text = _card_cache.get(key)
+    if text is MISSING:
+        text = (
+            f"📦 **{ad['title']}**\n\n"
+            f"📝 {ad['description']}\n\n"
+            f"💰 **Цена:** {ad['price']}\n"
+            f"📂 **Категория:** {CATEGORIES.get(ad['category'], ad['category'])}\n"
+            f"🕹 **Продавец:** {ad['game_nick']}\n"
+            f"📞 **Игровой номер:** {ad['game_id']}"
+        )
+        _card_cache.set(key, text)
+    return text
+
+
+def ad_keyboard(ad: dict, category: str, page: int, total: int, sort: str) -> InlineKeyboardMarkup:
+    """Клавиатура карточки в ленте (кэшируется по версии и позиции)"""
+    key = (ad['id'], ad['version'], category, page, total, sort)
+    keyboard = _keyboard_cache.get(key)
+    if keyboard is MISSING:
+        keyboard = ad_navigation_keyboard(
+            category=category,
+            current=page,
+            total=total,
+            ad_id=ad['id'],
+            cursor=db.encode_cursor(ad, sort),
+            seller_username=ad.get('username'),
+            seller_id=ad['seller_id'],
+            sort=sort
+        )
+        _keyboard_cache.set(key, keyboard)
+    return keyboard
+
+
+async def send_ad_card(callback: CallbackQuery, ad: dict, keyboard: InlineKeyboardMarkup,
+                       photo_index: int = 0):
+    """Показ карточки объявления на месте текущего сообщения
+    
+    Сообщение редактируется одним запросом (edit_message_media или
+    edit_message_text); заново отправляется, только если меняется тип
+    сообщения (фото ↔ текст). Альбом показывается одним фото с
+    переключателем «📷 k/n». Фото, отклонённое Telegram, учитывается
+    в БД и после нескольких отказов перестаёт показываться.
+    """
+    text = ad_card_text(ad)
+    message = callback.message
+    
+    # Получаем и фильтруем фото
+    photos = [p for p in ad.get('photos', []) if p and p.strip()]
+    if len(photos) > 1:
+        photo_index %= len(photos)
+        keyboard = with_photo_navigation(keyboard, ad['id'], photo_index, len(photos))
+    
+    if photos:
+        try:
+            await show_photo_card(message, photos[photo_index], text, keyboard)
+            return
+        except TelegramBadRequest as e:
+            if not is_photo_error(e):
+                raise
+            logger.warning(f"Фото объявления #{ad['id']} отклонено: {e}")
+            await db.record_photo_failure(ad['id'], photos[photo_index])
+            # Текстовое сообщение правим на месте, фото-сообщение заменяем новым
+            await show_text_card(message, text + "\n\n⚠️ _Фото недоступны_", keyboard,
+                                 edit=not message.photo)
+            return
+    else:
+        text += "\n\n📷 _Без фото_"
+    
+    await show_text_card(message, text, keyboard)
+
+
+async def replace_message(message: Message):
+    """Удаление старого сообщения после отправки карточки другого типа"""
+    try:
+        await message.delete()
+    except Exception as e:
+        logger.warning(f"Не удалось удалить сообщение: {e}")
+
+
+async def show_photo_card(message: Message, photo: str, caption: str,
+                          keyboard: InlineKeyboardMarkup):
+    """Карточка с фото: правка на месте, если текущее сообщение с фото"""
+    if message.photo:
+        try:
+            await message.edit_media(
+                InputMediaPhoto(media=photo, caption=caption, parse_mode="Markdown"),
+                reply_markup=keyboard
+            )
+            return
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                return
+            if is_photo_error(e):
+                raise
+            # Сообщение слишком старое или удалено - отправляем заново
+            logger.warning(f"Не удалось отредактировать карточку: {e}")
+    
+    # Сначала отправка: если фото отклонено, старое сообщение остаётся на месте
+    await message.answer_photo(
+        photo=photo,
+        caption=caption,
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    await replace_message(message)
+
+
+async def show_text_card(message: Message, text: str, keyboard: InlineKeyboardMarkup,
+                         edit: bool = True):
+    """Карточка без фото: правка на месте, если текущее сообщение текстовое"""
+    if edit and message.text:
+        try:
+            await message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+            return
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                return
+            logger.warning(f"Не удалось отредактировать карточку: {e}")
+    
+    await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
+    await replace_message(message)
+
+
+@router.callback_query(F.data.startswith("aph_"))
+async def switch_ad_photo(callback: CallbackQuery):
+    """Переключение фото альбома в карточке"""
+    # aph_<id объявления>_<номер фото>
+    _, ad_id, index = callback.data.split("_")
+    ad = await db.get_ad(int(ad_id))
+    if not ad:
+        await callback.answer("Объявление снято с публикации")
+        return
+    
+    await send_ad_card(callback, ad, callback.message.reply_markup, photo_index=int(index))
+    await callback.answer()
+
+
 @router.message(F.text == "🔍 Смотреть объявления")
-async def view_ads_start(message: Message, state: FSMContext):
+async def view_ads_start(message: Message, state: FSMContext, db_user: Optional[dict]):
     """Начало просмотра объявлений"""
-    if not await check_user(message):
+    if not await check_user(message, db_user):
         return
     
     await message.answer(
         "📂 Выберите **категорию**:",
-        reply_markup=categories_keyboard(for_create=False),
+        reply_markup=categories_keyboard(for_create=False, counts=await db.get_category_counts()),
         parse_mode="Markdown"
     )
     await state.set_state(ViewAds.browsing)
+    await state.update_data(browse_filter={})
 
 
 @router.callback_query(F.data.startswith("view_cat_"))
@@ -257,97 +415,175 @@ async def view_category(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("nav_"))
 async def navigate_ads(callback: CallbackQuery, state: FSMContext):
     """Навигация по объявлениям"""
+    # nav_<категория>_<p|n>_<код сортировки>_<курсор>_<позиция>
     parts = callback.data.split("_")
     category = parts[1]
-    page = int(parts[2])
-    await show_ad_page(callback, category, page, state)
+    browse_filter = (await state.get_data()).get('browse_filter') or {}
+    sort = browse_filter.get('sort', "new")
+    # Кнопка из ленты с другой сортировкой (или старого формата): курсор
+    # в ней от другого ключа, поэтому показываем ленту сначала
+    if len(parts) != 7 or parts[3] != SORT_CODES[sort]:
+        await show_ad_page(callback, category, 0, state)
+        return
+    _, _, direction, _, key, ad_id, page = parts
+    cursor = db.decode_cursor(f"{key}_{ad_id}", sort)
+    await show_ad_page(callback, category, int(page), state, cursor=cursor, direction=direction)
 
 
-async def show_ad_page(callback: CallbackQuery, category: str, page: int, state: FSMContext):
-    """Показ страницы объявления"""
-    total = await db.count_ads_by_category(category)
+async def show_ad_page(callback: CallbackQuery, category: str, page: int, state: FSMContext,
+                       cursor: db.AdCursor = None, direction: str = "n"):
+    """Показ страницы объявления
+    
+    Соседнее объявление ищется от курсора (seek по индексу), поэтому
+    стоимость перехода не зависит от глубины листания. Сортировка и
+    диапазон цены берутся из browse_filter в данных FSM.
+    """
+    browse_filter = (await state.get_data()).get('browse_filter') or {}
+    sort = browse_filter.get('sort', "new")
+    min_price, max_price = browse_filter.get('min_price'), browse_filter.get('max_price')
+    total = await db.count_ads_by_category(category, sort, min_price, max_price)
     
     if total == 0:
+        if browse_filter:
+            await send_filter_menu(
+                callback, category, browse_filter,
+                f"📭 В категории **{CATEGORIES.get(category, category)}** нет объявлений по фильтру."
+            )
+            return
         await callback.message.edit_text(
             f"📭 В категории **{CATEGORIES.get(category, category)}** пока нет объявлений.",
-            reply_markup=categories_keyboard(for_create=False),
+            reply_markup=categories_keyboard(for_create=False, counts=await db.get_category_counts()),
             parse_mode="Markdown"
         )
         return
     
-    ads = await db.get_ads_by_category(category, offset=page, limit=1)
+    if direction == "p":
+        ads = await db.get_ads_before(category, cursor, 1, sort, min_price, max_price)
+    else:
+        ads = await db.get_ads_after(category, cursor, 1, sort, min_price, max_price)
     
     if not ads:
         await callback.answer("Объявления не найдены")
         return
     
     ad = ads[0]
+    # Позиция приблизительная: пока листали, могли появиться новые объявления
+    page = max(0, min(page, total - 1))
     
-    text = (
-        f"📦 **{ad['title']}**\n\n"
-        f"📝 {ad['description']}\n\n"
-        f"💰 **Цена:** {ad['price']}\n"
-        f"📂 **Категория:** {CATEGORIES.get(ad['category'], ad['category'])}\n"
-        f"🕹 **Продавец:** {ad['game_nick']}\n"
-        f"📞 **Игровой номер:** {ad['game_id']}"
-    )
+    keyboard = ad_keyboard(ad, category, page, total, sort)
+    await send_ad_card(callback, ad, keyboard)
     
-    keyboard = ad_navigation_keyboard(
-        category=category,
-        current=page,
-        total=total,
-        ad_id=ad['id'],
-        seller_username=ad.get('username'),
-        seller_id=ad['seller_id']
+    await state.update_data(current_ad=ad, category=category, page=page)
+
+
+# ========== ФИЛЬТР ПО ЦЕНЕ ==========
+
+def format_price(value: int) -> str:
+    """Цена с разделителями разрядов"""
+    return f"{value:,}".replace(",", " ")
+
+
+def filter_text(browse_filter: dict) -> str:
+    """Описание текущей сортировки и диапазона цены"""
+    min_price, max_price = browse_filter.get('min_price'), browse_filter.get('max_price')
+    if min_price is not None and max_price is not None:
+        price_range = f"от {format_price(min_price)} до {format_price(max_price)}"
+    elif min_price is not None:
+        price_range = f"от {format_price(min_price)}"
+    elif max_price is not None:
+        price_range = f"до {format_price(max_price)}"
+    else:
+        price_range = "любая"
+    return (
+        f"📊 **Сортировка:** {SORT_TITLES[browse_filter.get('sort', 'new')]}\n"
+        f"💵 **Цена:** {price_range}"
     )
-    
-    # Удаляем предыдущее сообщение
+
+
+async def send_filter_menu(callback: CallbackQuery, category: str, browse_filter: dict,
+                           header: str = "💰 **Цена и сортировка**"):
+    """Меню фильтра вместо текущего сообщения (карточка может быть с фото)"""
     try:
         await callback.message.delete()
     except Exception as e:
         logger.warning(f"Не удалось удалить сообщение: {e}")
     
-    # Получаем и фильтруем фото
-    photos = ad.get('photos', [])
-    photos = [p for p in photos if p and p.strip()]  # Убираем пустые строки
+    await callback.message.answer(
+        f"{header}\n\n{filter_text(browse_filter)}",
+        reply_markup=price_filter_keyboard(category, browse_filter.get('sort', "new")),
+        parse_mode="Markdown"
+    )
+
+
+@router.callback_query(F.data.startswith("bfilter_"))
+async def browse_filter_menu(callback: CallbackQuery, state: FSMContext):
+    """Меню сортировки и диапазона цены"""
+    category = callback.data.replace("bfilter_", "")
+    browse_filter = (await state.get_data()).get('browse_filter') or {}
+    await send_filter_menu(callback, category, browse_filter)
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("bsort_"))
+async def browse_sort(callback: CallbackQuery, state: FSMContext):
+    """Смена сортировки: лента начинается заново"""
+    # bsort_<категория>_<сортировка>
+    _, category, sort = callback.data.split("_", 2)
+    browse_filter = (await state.get_data()).get('browse_filter') or {}
+    browse_filter['sort'] = sort
+    await state.update_data(browse_filter=browse_filter)
+    await show_ad_page(callback, category, 0, state)
+
+
+@router.callback_query(F.data.startswith("breset_"))
+async def browse_reset(callback: CallbackQuery, state: FSMContext):
+    """Сброс фильтра"""
+    category = callback.data.replace("breset_", "")
+    await state.update_data(browse_filter={})
+    await show_ad_page(callback, category, 0, state)
+
+
+@router.callback_query(F.data.startswith("brange_"))
+async def browse_range_start(callback: CallbackQuery, state: FSMContext):
+    """Запрос диапазона цены"""
+    category = callback.data.replace("brange_", "")
+    await state.update_data(category=category)
+    await state.set_state(ViewAds.price_range)
+    await callback.message.answer(
+        "💵 Введите **диапазон цены**, например:\n"
+        "`100к-1.5кк`, `-500000` (до), `1кк-` (от)",
+        reply_markup=cancel_keyboard(),
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+
+@router.message(ViewAds.price_range)
+async def process_price_range(message: Message, state: FSMContext):
+    """Обработка диапазона цены"""
+    min_price, max_price = parse_price_range(message.text or "")
+    if min_price is None and max_price is None:
+        await message.answer("❌ Не удалось разобрать цену. Пример: `100к-1.5кк`", parse_mode="Markdown")
+        return
+    if min_price is not None and max_price is not None and min_price > max_price:
+        min_price, max_price = max_price, min_price
     
-    if photos:
-        try:
-            if len(photos) == 1:
-                await callback.message.answer_photo(
-                    photo=photos[0],
-                    caption=text,
-                    reply_markup=keyboard,
-                    parse_mode="Markdown"
-                )
-            else:
-                # Отправляем альбом
-                media = [InputMediaPhoto(media=photos[0], caption=text, parse_mode="Markdown")]
-                for photo in photos[1:]:
-                    if photo and photo.strip():  # Дополнительная проверка
-                        media.append(InputMediaPhoto(media=photo))
-                
-                await callback.message.answer_media_group(media)
-                await callback.message.answer(
-                    "👆 Фото объявления",
-                    reply_markup=keyboard
-                )
-        except TelegramBadRequest as e:
-            # Если фото невалидные, отправляем без них
-            logger.error(f"Ошибка отправки фото: {e}")
-            await callback.message.answer(
-                text + "\n\n⚠️ _Фото недоступны_",
-                reply_markup=keyboard,
-                parse_mode="Markdown"
-            )
-    else:
-        await callback.message.answer(
-            text + "\n\n📷 _Без фото_",
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
+    data = await state.get_data()
+    category = data['category']
+    browse_filter = data.get('browse_filter') or {}
+    browse_filter.update(min_price=min_price, max_price=max_price)
+    await state.update_data(browse_filter=browse_filter)
+    await state.set_state(ViewAds.browsing)
     
-    await state.update_data(current_ad=ad, category=category, page=page)
+    total = await db.count_ads_by_category(
+        category, browse_filter.get('sort', "new"), min_price, max_price
+    )
+    await message.answer(
+        f"✅ **Фильтр установлен**\n\n{filter_text(browse_filter)}\n\n"
+        f"📦 Найдено объявлений: {total}",
+        reply_markup=price_filter_keyboard(category, browse_filter.get('sort', "new")),
+        parse_mode="Markdown"
+    )
 
 
 @router.callback_query(F.data == "back_categories")
@@ -360,7 +596,7 @@ async def back_to_categories(callback: CallbackQuery, state: FSMContext):
     
     await callback.message.answer(
         "📂 Выберите **категорию**:",
-        reply_markup=categories_keyboard(for_create=False),
+        reply_markup=categories_keyboard(for_create=False, counts=await db.get_category_counts()),
         parse_mode="Markdown"
     )
 
@@ -371,6 +607,112 @@ async def current_page_callback(callback: CallbackQuery):
     await callback.answer()
 
 
+# ========== ПОИСК ==========
+
+@router.message(F.text == "🔍 Поиск")
+async def search_start(message: Message, state: FSMContext, db_user: Optional[dict]):
+    """Начало поиска объявлений"""
+    if not await check_user(message, db_user):
+        return
+    
+    await message.answer(
+        "🔍 Введите **запрос** (например, модель авто):",
+        reply_markup=cancel_keyboard(),
+        parse_mode="Markdown"
+    )
+    await state.set_state(SearchAds.query)
+
+
+@router.callback_query(F.data == "search_new")
+async def search_new(callback: CallbackQuery, state: FSMContext):
+    """Новый поиск из результатов"""
+    try:
+        await callback.message.delete()
+    except Exception:
+        pass
+    
+    await callback.message.answer(
+        "🔍 Введите **запрос**:",
+        reply_markup=cancel_keyboard(),
+        parse_mode="Markdown"
+    )
+    await state.set_state(SearchAds.query)
+
+
+@router.message(SearchAds.query)
+async def process_search_query(message: Message, state: FSMContext):
+    """Обработка поискового запроса"""
+    query = (message.text or "").strip()
+    
+    if len(query) > 100 or db.build_search_query(query) is None:
+        await message.answer("❌ Введите слова для поиска (до 100 символов).")
+        return
+    
+    await state.update_data(search_query=query)
+    await message.answer(
+        "📂 Где искать?",
+        reply_markup=search_categories_keyboard()
+    )
+    await state.set_state(SearchAds.category)
+
+
+@router.callback_query(SearchAds.category, F.data.startswith("search_cat_"))
+async def process_search_category(callback: CallbackQuery, state: FSMContext):
+    """Выполнение поиска в выбранной категории"""
+    category = callback.data.replace("search_cat_", "")
+    data = await state.get_data()
+    
+    # Один запрос к FTS-индексу, дальше листаем по сохранённым ID
+    ad_ids = await db.search_ads(
+        data['search_query'],
+        category=None if category == "all" else category
+    )
+    
+    if not ad_ids:
+        await callback.message.edit_text(
+            "📭 По вашему запросу ничего не найдено.",
+            reply_markup=search_again_keyboard()
+        )
+        await state.clear()
+        return
+    
+    await state.update_data(search_results=ad_ids)
+    await state.set_state(SearchAds.results)
+    await show_search_page(callback, state, 0)
+
+
+@router.callback_query(F.data.startswith("snav_"))
+async def navigate_search(callback: CallbackQuery, state: FSMContext):
+    """Навигация по результатам поиска"""
+    await show_search_page(callback, state, int(callback.data.replace("snav_", "")))
+
+
+async def show_search_page(callback: CallbackQuery, state: FSMContext, index: int):
+    """Показ найденного объявления"""
+    data = await state.get_data()
+    ad_ids = data.get('search_results')
+    
+    if not ad_ids:
+        await callback.answer("Результаты устарели, начните новый поиск", show_alert=True)
+        return
+    
+    index = max(0, min(index, len(ad_ids) - 1))
+    ad = await db.get_ad(ad_ids[index])
+    
+    if not ad:
+        await callback.answer("Объявление снято с публикации")
+        return
+    
+    keyboard = search_navigation_keyboard(
+        current=index,
+        total=len(ad_ids),
+        ad_id=ad['id'],
+        seller_username=ad.get('username'),
+        seller_id=ad['seller_id']
+    )
+    await send_ad_card(callback, ad, keyboard)
+
+
 # ========== СВЯЗЬ С ПРОДАВЦОМ ==========
 
 @router.callback_query(F.data.startswith("contact_"))
@@ -393,14 +735,15 @@ async def contact_seller_start(callback: CallbackQuery, state: FSMContext, bot:
 
 
 @router.message(ContactSeller.message)
-async def send_message_to_seller(message: Message, state: FSMContext, bot: Bot):
+async def send_message_to_seller(message: Message, state: FSMContext, bot: Bot,
+                                 db_user: Optional[dict]):
     """Отправка сообщения продавцу"""
     data = await state.get_data()
     seller_id = data['seller_id']
     ad_id = data['ad_id']
     
-    buyer = await db.get_user(message.from_user.id)
-    ad = await db.get_ad(ad_id)
+    buyer = db_user
+    ad = await db.get_ad(ad_id, with_photos=False)
     
     if not ad:
         await message.answer("❌ Объявление не найдено.")
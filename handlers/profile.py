@@ -1,3 +1,5 @@
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
@@ -10,16 +12,45 @@ from keyboards import (
     main_menu_keyboard, done_photos_keyboard
 )
 from config import CATEGORIES, ADMIN_IDS, MAX_PHOTOS
+from prices import parse_price
+
+router = Router(name="profile")
+
+
+def broken_photos_notice(ads: list) -> str:
+    """Предупреждение продавцу о фото, которые Telegram перестал принимать"""
+    broken = sum(1 for ad in ads if ad.get('broken_photos'))
+    if not broken:
+        return ""
+    return (
+        f"\n\n⚠️ Недоступные фото в объявлениях: {broken} (отмечены ⚠️). "
+        "Покупатели их не видят - замените фото в редактировании."
+    )
+
 
-router = Router()
+# Объявление изменили между началом и концом правки
+EDIT_CONFLICT = (
+    "⚠️ Объявление изменено с другого устройства или удалено - правка не сохранена.\n"
+    "Откройте его заново в «Моих объявлениях»."
+)
+
+
+async def start_ad_edit(callback: CallbackQuery, state: FSMContext, ad_id: int, **data) -> bool:
+    """Запоминание счётчика правок в начале правки (для проверки при сохранении)"""
+    revision = await db.get_ad_revision(ad_id)
+    if revision is None:
+        await callback.answer("❌ Объявление не найдено")
+        return False
+    await state.update_data(editing_ad_id=ad_id, editing_revision=revision, **data)
+    return True
 
 
 # ========== ПРОФИЛЬ ==========
 
 @router.message(F.text == "👤 Мой профиль")
-async def show_profile(message: Message):
+async def show_profile(message: Message, db_user: Optional[dict]):
     """Показ профиля"""
-    user = await db.get_user(message.from_user.id)
+    user = db_user
     
     if not user:
         await message.answer("❌ Сначала пройдите регистрацию: /start")
@@ -106,11 +137,11 @@ async def process_new_game_id(message: Message, state: FSMContext):
 # ========== МОИ ОБЪЯВЛЕНИЯ ==========
 
 @router.message(F.text == "📋 Мои объявления")
-async def show_my_ads(message: Message):
+async def show_my_ads(message: Message, db_user: Optional[dict]):
     """Показ объявлений пользователя"""
     user_id = message.from_user.id
     
-    if not await db.user_exists(user_id):
+    if not db_user:
         await message.answer("❌ Сначала пройдите регистрацию: /start")
         return
     
@@ -126,7 +157,7 @@ async def show_my_ads(message: Message):
     
     await message.answer(
         f"📋 **Ваши объявления** ({len(ads)} шт.):\n\n"
-        "Выберите объявление для управления:",
+        f"Выберите объявление для управления:{broken_photos_notice(ads)}",
         reply_markup=my_ads_keyboard(ads),
         parse_mode="Markdown"
     )
@@ -143,7 +174,7 @@ async def back_to_my_ads(callback: CallbackQuery):
     
     await callback.message.edit_text(
         f"📋 **Ваши объявления** ({len(ads)} шт.):\n\n"
-        "Выберите объявление для управления:",
+        f"Выберите объявление для управления:{broken_photos_notice(ads)}",
         reply_markup=my_ads_keyboard(ads),
         parse_mode="Markdown"
     )
@@ -166,6 +197,11 @@ async def show_my_ad(callback: CallbackQuery):
         f"📂 **Категория:** {CATEGORIES.get(ad['category'], ad['category'])}\n"
         f"🖼 **Фото:** {len(ad.get('photos', []))} шт."
     )
+    if ad['broken_photos']:
+        text += (
+            f"\n⚠️ Недоступно фото: {ad['broken_photos']} - Telegram их не принимает, "
+            "замените через ✏️ Редактировать → 🖼 Фото"
+        )
     
     await callback.message.edit_text(
         text,
@@ -191,7 +227,8 @@ async def edit_ad_menu(callback: CallbackQuery):
 async def edit_title_start(callback: CallbackQuery, state: FSMContext):
     """Начало редактирования названия"""
     ad_id = int(callback.data.replace("edit_field_title_", ""))
-    await state.update_data(editing_ad_id=ad_id)
+    if not await start_ad_edit(callback, state, ad_id):
+        return
     
     await callback.message.edit_text(
         "📌 Введите новое **название**:",
@@ -212,11 +249,14 @@ async def process_edit_title(message: Message, state: FSMContext):
         await message.answer("❌ Название должно быть от 3 до 100 символов.")
         return
     
-    await db.update_ad(ad_id, title=new_title)
+    ad = await db.update_ad(ad_id, data.get('editing_revision'), title=new_title)
+    if ad is None:
+        await message.answer(EDIT_CONFLICT)
+        await state.clear()
+        return
     await message.answer("✅ Название обновлено!")
     
     # Показываем объявление заново
-    ad = await db.get_ad(ad_id)
     text = (
         f"📦 **{ad['title']}**\n\n"
         f"📝 {ad['description']}\n\n"
@@ -231,7 +271,8 @@ async def process_edit_title(message: Message, state: FSMContext):
 async def edit_desc_start(callback: CallbackQuery, state: FSMContext):
     """Начало редактирования описания"""
     ad_id = int(callback.data.replace("edit_field_desc_", ""))
-    await state.update_data(editing_ad_id=ad_id)
+    if not await start_ad_edit(callback, state, ad_id):
+        return
     
     await callback.message.edit_text(
         "📝 Введите новое **описание**:",
@@ -252,10 +293,13 @@ async def process_edit_desc(message: Message, state: FSMContext):
         await message.answer("❌ Описание должно быть от 10 до 1000 символов.")
         return
     
-    await db.update_ad(ad_id, description=new_desc)
+    ad = await db.update_ad(ad_id, data.get('editing_revision'), description=new_desc)
+    if ad is None:
+        await message.answer(EDIT_CONFLICT)
+        await state.clear()
+        return
     await message.answer("✅ Описание обновлено!")
     
-    ad = await db.get_ad(ad_id)
     text = (
         f"📦 **{ad['title']}**\n\n"
         f"📝 {ad['description']}\n\n"
@@ -270,7 +314,8 @@ async def process_edit_desc(message: Message, state: FSMContext):
 async def edit_price_start(callback: CallbackQuery, state: FSMContext):
     """Начало редактирования цены"""
     ad_id = int(callback.data.replace("edit_field_price_", ""))
-    await state.update_data(editing_ad_id=ad_id)
+    if not await start_ad_edit(callback, state, ad_id):
+        return
     
     await callback.message.edit_text(
         "💰 Введите новую **цену**:",
@@ -291,10 +336,17 @@ async def process_edit_price(message: Message, state: FSMContext):
         await message.answer("❌ Цена слишком длинная (макс. 50 символов).")
         return
     
-    await db.update_ad(ad_id, price=new_price)
+    price_value, price_negotiable = parse_price(new_price)
+    ad = await db.update_ad(
+        ad_id, data.get('editing_revision'),
+        price=new_price, price_value=price_value, price_negotiable=int(price_negotiable)
+    )
+    if ad is None:
+        await message.answer(EDIT_CONFLICT)
+        await state.clear()
+        return
     await message.answer("✅ Цена обновлена!")
     
-    ad = await db.get_ad(ad_id)
     text = (
         f"📦 **{ad['title']}**\n\n"
         f"📝 {ad['description']}\n\n"
@@ -309,7 +361,8 @@ async def process_edit_price(message: Message, state: FSMContext):
 async def edit_photos_start(callback: CallbackQuery, state: FSMContext):
     """Начало редактирования фото"""
     ad_id = int(callback.data.replace("edit_field_photos_", ""))
-    await state.update_data(editing_ad_id=ad_id, new_photos=[])
+    if not await start_ad_edit(callback, state, ad_id, new_photos=[]):
+        return
     
     await callback.message.edit_text(
         f"🖼 Отправьте новые фотографии (до {MAX_PHOTOS} шт.)\n"
@@ -352,10 +405,13 @@ async def edit_photos_done(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Добавьте хотя бы одно фото!")
         return
     
-    await db.update_ad(ad_id, photos=new_photos)
+    ad = await db.update_ad(ad_id, data.get('editing_revision'), photos=new_photos)
+    if ad is None:
+        await callback.message.edit_text(EDIT_CONFLICT)
+        await state.clear()
+        return
     await callback.message.edit_text("✅ Фотографии обновлены!")
     
-    ad = await db.get_ad(ad_id)
     text = (
         f"📦 **{ad['title']}**\n\n"
         f"📝 {ad['description']}\n\n"
@@ -395,7 +451,7 @@ async def delete_ad_final(callback: CallbackQuery):
     
     if ads:
         await callback.message.answer(
-            f"📋 **Ваши объявления** ({len(ads)} шт.):",
+            f"📋 **Ваши объявления** ({len(ads)} шт.):{broken_photos_notice(ads)}",
             reply_markup=my_ads_keyboard(ads),
             parse_mode="Markdown"
         )
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import CommandStart
@@ -8,26 +10,25 @@ from states import Registration
 from keyboards import main_menu_keyboard, admin_menu_keyboard, cancel_keyboard
 from config import ADMIN_IDS
 
-router = Router()
+router = Router(name="start")
 
 
 @router.message(CommandStart())
-async def cmd_start(message: Message, state: FSMContext):
+async def cmd_start(message: Message, state: FSMContext, db_user: Optional[dict]):
     """Обработка команды /start"""
     await state.clear()
     user_id = message.from_user.id
     
     # Проверка блокировки
-    if await db.is_user_blocked(user_id):
+    if db_user and db_user['is_blocked']:
         await message.answer("🚫 Вы заблокированы и не можете использовать бот.")
         return
     
     # Проверка регистрации
-    if await db.user_exists(user_id):
-        user = await db.get_user(user_id)
+    if db_user:
         keyboard = admin_menu_keyboard() if user_id in ADMIN_IDS else main_menu_keyboard()
         await message.answer(
-            f"👋 С возвращением, **{user['game_nick']}**!\n\n"
+            f"👋 С возвращением, **{db_user['game_nick']}**!\n\n"
             "🎮 Это бот для торговли в Grand Mobile.\n"
             "Выберите действие:",
             reply_markup=keyboard,
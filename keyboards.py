@@ -1,3 +1,5 @@
+from typing import Optional
+
 from aiogram.types import (
     ReplyKeyboardMarkup, KeyboardButton,
     InlineKeyboardMarkup, InlineKeyboardButton
@@ -13,6 +15,9 @@ def main_menu_keyboard() -> ReplyKeyboardMarkup:
         KeyboardButton(text="📢 Разместить объявление"),
         KeyboardButton(text="🔍 Смотреть объявления")
     )
+    builder.row(
+        KeyboardButton(text="🔍 Поиск")
+    )
     builder.row(
         KeyboardButton(text="👤 Мой профиль"),
         KeyboardButton(text="📋 Мои объявления")
@@ -27,6 +32,9 @@ def admin_menu_keyboard() -> ReplyKeyboardMarkup:
         KeyboardButton(text="📢 Разместить объявление"),
         KeyboardButton(text="🔍 Смотреть объявления")
     )
+    builder.row(
+        KeyboardButton(text="🔍 Поиск")
+    )
     builder.row(
         KeyboardButton(text="👤 Мой профиль"),
         KeyboardButton(text="📋 Мои объявления")
@@ -53,18 +61,24 @@ def admin_panel_keyboard() -> InlineKeyboardMarkup:
     builder.row(
         InlineKeyboardButton(text="📢 Рассылка", callback_data="admin_broadcast")
     )
+    builder.row(
+        InlineKeyboardButton(text="📊 Кэши", callback_data="admin_cache_stats"),
+        InlineKeyboardButton(text="🐢 Запросы", callback_data="admin_slow_queries")
+    )
     builder.row(
         InlineKeyboardButton(text="◀️ Назад", callback_data="admin_back")
     )
     return builder.as_markup()
 
 
-def categories_keyboard(for_create: bool = False) -> InlineKeyboardMarkup:
-    """Клавиатура выбора категории"""
+def categories_keyboard(for_create: bool = False, counts: dict = None) -> InlineKeyboardMarkup:
+    """Клавиатура выбора категории (counts - количество объявлений по категориям)"""
     builder = InlineKeyboardBuilder()
     prefix = "create_cat_" if for_create else "view_cat_"
     
     for cat_id, cat_name in CATEGORIES.items():
+        if counts is not None:
+            cat_name = f"{cat_name} ({counts.get(cat_id, 0)})"
         builder.row(
             InlineKeyboardButton(text=cat_name, callback_data=f"{prefix}{cat_id}")
         )
@@ -115,48 +129,165 @@ def done_photos_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def ad_navigation_keyboard(category: str, current: int, total: int, ad_id: int, 
-                           seller_username: str = None, seller_id: int = None) -> InlineKeyboardMarkup:
-    """Навигация по объявлениям"""
+def contact_seller_button(ad_id: int, seller_username: str = None,
+                          seller_id: int = None) -> InlineKeyboardButton:
+    """Кнопка связи с продавцом"""
+    if seller_username:
+        return InlineKeyboardButton(
+            text="📩 Связаться с продавцом", 
+            url=f"https://t.me/{seller_username}"
+        )
+    return InlineKeyboardButton(
+        text="📩 Написать продавцу", 
+        callback_data=f"contact_{seller_id}_{ad_id}"
+    )
+
+
+def ad_navigation_keyboard(category: str, current: int, total: int, ad_id: int, cursor: str,
+                           seller_username: str = None, seller_id: int = None,
+                           sort: str = "new") -> InlineKeyboardMarkup:
+    """Навигация по объявлениям
+    
+    cursor - курсор текущего объявления в сортировке sort (см. database.encode_cursor),
+    от него ищутся соседние объявления:
+    nav_<категория>_<p|n>_<код сортировки>_<курсор>_<позиция>
+    """
+    code = SORT_CODES[sort]
     builder = InlineKeyboardBuilder()
     
     # Навигация
     nav_buttons = []
     if current > 0:
         nav_buttons.append(
-            InlineKeyboardButton(text="⬅️", callback_data=f"nav_{category}_{current - 1}")
+            InlineKeyboardButton(text="⬅️", callback_data=f"nav_{category}_p_{code}_{cursor}_{current - 1}")
         )
     nav_buttons.append(
         InlineKeyboardButton(text=f"{current + 1}/{total}", callback_data="current_page")
     )
     if current < total - 1:
         nav_buttons.append(
-            InlineKeyboardButton(text="➡️", callback_data=f"nav_{category}_{current + 1}")
+            InlineKeyboardButton(text="➡️", callback_data=f"nav_{category}_n_{code}_{cursor}_{current + 1}")
         )
     
     if nav_buttons:
         builder.row(*nav_buttons)
     
-    # Связь с продавцом
-    if seller_username:
-        builder.row(
-            InlineKeyboardButton(
-                text="📩 Связаться с продавцом", 
-                url=f"https://t.me/{seller_username}"
-            )
+    builder.row(contact_seller_button(ad_id, seller_username, seller_id))
+    
+    builder.row(
+        InlineKeyboardButton(text="💰 Цена и сортировка", callback_data=f"bfilter_{category}")
+    )
+    builder.row(
+        InlineKeyboardButton(text="🔙 К категориям", callback_data="back_categories")
+    )
+    
+    return builder.as_markup()
+
+
+def with_photo_navigation(keyboard: InlineKeyboardMarkup, ad_id: int, index: int,
+                          count: int) -> InlineKeyboardMarkup:
+    """Клавиатура карточки с переключателем фото альбома: aph_<id>_<номер>
+
+    Строка фото ставится первой (прежняя заменяется), исходная клавиатура
+    не меняется - она может лежать в кэше.
+    """
+    rows = [
+        row for row in keyboard.inline_keyboard
+        if not (row[0].callback_data or "").startswith("aph_")
+    ]
+    photo_row = [
+        InlineKeyboardButton(text="◀️", callback_data=f"aph_{ad_id}_{(index - 1) % count}"),
+        InlineKeyboardButton(text=f"📷 {index + 1}/{count}", callback_data="current_page"),
+        InlineKeyboardButton(text="▶️", callback_data=f"aph_{ad_id}_{(index + 1) % count}"),
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=[photo_row] + rows)
+
+
+# Сортировки ленты (ключи совпадают с database.SORT_ORDERS)
+SORT_TITLES = {
+    "new": "🆕 Новые",
+    "price_asc": "⬆️ Дешевле",
+    "price_desc": "⬇️ Дороже",
+}
+# Короткие коды сортировок в callback_data навигации
+SORT_CODES = {"new": "n", "price_asc": "a", "price_desc": "d"}
+
+
+def price_filter_keyboard(category: str, sort: str = "new") -> InlineKeyboardMarkup:
+    """Выбор сортировки и диапазона цены в категории"""
+    builder = InlineKeyboardBuilder()
+    
+    builder.row(*[
+        InlineKeyboardButton(
+            text=f"✅ {title}" if key == sort else title,
+            callback_data=f"bsort_{category}_{key}"
         )
-    else:
+        for key, title in SORT_TITLES.items()
+    ])
+    builder.row(
+        InlineKeyboardButton(text="💵 Диапазон цены", callback_data=f"brange_{category}")
+    )
+    builder.row(
+        InlineKeyboardButton(text="♻️ Сбросить фильтр", callback_data=f"breset_{category}")
+    )
+    builder.row(
+        InlineKeyboardButton(text="🔙 К объявлениям", callback_data=f"view_cat_{category}")
+    )
+    
+    return builder.as_markup()
+
+
+def search_categories_keyboard() -> InlineKeyboardMarkup:
+    """Выбор категории для поиска"""
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text="🌐 Все категории", callback_data="search_cat_all")
+    )
+    for cat_id, cat_name in CATEGORIES.items():
         builder.row(
-            InlineKeyboardButton(
-                text="📩 Написать продавцу", 
-                callback_data=f"contact_{seller_id}_{ad_id}"
-            )
+            InlineKeyboardButton(text=cat_name, callback_data=f"search_cat_{cat_id}")
         )
-    
     builder.row(
-        InlineKeyboardButton(text="🔙 К категориям", callback_data="back_categories")
+        InlineKeyboardButton(text="❌ Отмена", callback_data="cancel_create")
+    )
+    return builder.as_markup()
+
+
+def search_navigation_keyboard(current: int, total: int, ad_id: int,
+                               seller_username: str = None, seller_id: int = None) -> InlineKeyboardMarkup:
+    """Навигация по результатам поиска"""
+    builder = InlineKeyboardBuilder()
+    
+    nav_buttons = []
+    if current > 0:
+        nav_buttons.append(
+            InlineKeyboardButton(text="⬅️", callback_data=f"snav_{current - 1}")
+        )
+    nav_buttons.append(
+        InlineKeyboardButton(text=f"{current + 1}/{total}", callback_data="current_page")
     )
+    if current < total - 1:
+        nav_buttons.append(
+            InlineKeyboardButton(text="➡️", callback_data=f"snav_{current + 1}")
+        )
+    builder.row(*nav_buttons)
     
+    builder.row(contact_seller_button(ad_id, seller_username, seller_id))
+    builder.row(
+        InlineKeyboardButton(text="🔍 Новый поиск", callback_data="search_new")
+    )
+    return builder.as_markup()
+
+
+def search_again_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура при пустом результате поиска"""
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text="🔍 Новый поиск", callback_data="search_new")
+    )
+    builder.row(
+        InlineKeyboardButton(text="🔙 В меню", callback_data="back_menu")
+    )
     return builder.as_markup()
 
 
@@ -165,9 +296,10 @@ def my_ads_keyboard(ads: list) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
     for ad in ads:
+        icon = "⚠️" if ad.get('broken_photos') else "📦"
         builder.row(
             InlineKeyboardButton(
-                text=f"📦 {ad['title'][:30]}... - {ad['price']}",
+                text=f"{icon} {ad['title'][:30]}... - {ad['price']}",
                 callback_data=f"my_ad_{ad['id']}"
             )
         )
@@ -240,13 +372,92 @@ def profile_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def admin_ad_keyboard(ad_id: int) -> InlineKeyboardMarkup:
+def admin_users_keyboard(first_cursor: str, last_cursor: str, page: int,
+                         has_next: bool) -> InlineKeyboardMarkup:
+    """Навигация по списку пользователей: ausers_<p|n>_<курсор>_<страница>"""
+    builder = InlineKeyboardBuilder()
+    
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(
+            InlineKeyboardButton(text="⬅️", callback_data=f"ausers_p_{first_cursor}_{page - 1}")
+        )
+    if has_next:
+        nav_buttons.append(
+            InlineKeyboardButton(text="➡️", callback_data=f"ausers_n_{last_cursor}_{page + 1}")
+        )
+    if nav_buttons:
+        builder.row(*nav_buttons)
+    
+    builder.row(
+        InlineKeyboardButton(text="🔙 Назад", callback_data="admin_panel_back")
+    )
+    return builder.as_markup()
+
+
+def admin_ad_keyboard(ad_id: int, page: int, has_next: bool) -> InlineKeyboardMarkup:
     """Управление объявлением для админа"""
     builder = InlineKeyboardBuilder()
+    
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(InlineKeyboardButton(text="⬅️", callback_data="admin_prev_ad"))
+    nav_buttons.append(InlineKeyboardButton(text=f"{page + 1}", callback_data="admin_current"))
+    if has_next:
+        nav_buttons.append(InlineKeyboardButton(text="➡️", callback_data="admin_next_ad"))
+    builder.row(*nav_buttons)
+    
     builder.row(
         InlineKeyboardButton(text="🗑 Удалить", callback_data=f"admin_delete_ad_{ad_id}")
     )
     builder.row(
-        InlineKeyboardButton(text="🔙 Назад", callback_data="admin_ads")
+        InlineKeyboardButton(text="🔎 Фильтры", callback_data="admin_ads_filter")
+    )
+    builder.row(
+        InlineKeyboardButton(text="🔙 Назад", callback_data="admin_panel_back")
+    )
+    return builder.as_markup()
+
+
+def admin_ads_filter_keyboard(category: Optional[str] = None) -> InlineKeyboardMarkup:
+    """Фильтры модерации объявлений"""
+    builder = InlineKeyboardBuilder()
+    
+    builder.row(
+        InlineKeyboardButton(
+            text="✅ Все категории" if category is None else "Все категории",
+            callback_data="admin_fcat_all"
+        )
+    )
+    for cat_id, cat_name in CATEGORIES.items():
+        builder.row(
+            InlineKeyboardButton(
+                text=f"✅ {cat_name}" if cat_id == category else cat_name,
+                callback_data=f"admin_fcat_{cat_id}"
+            )
+        )
+    builder.row(
+        InlineKeyboardButton(text="👤 Продавец", callback_data="admin_fseller"),
+        InlineKeyboardButton(text="📅 Период", callback_data="admin_fdates")
+    )
+    builder.row(
+        InlineKeyboardButton(text="♻️ Сбросить", callback_data="admin_freset"),
+        InlineKeyboardButton(text="📋 Показать", callback_data="admin_ads_show")
+    )
+    return builder.as_markup()
+
+
+def broadcast_control_keyboard(broadcast_id: int, status: str) -> Optional[InlineKeyboardMarkup]:
+    """Управление рассылкой (для завершённой - без кнопок)"""
+    if status not in ("running", "paused"):
+        return None
+    builder = InlineKeyboardBuilder()
+    if status == "running":
+        toggle = InlineKeyboardButton(text="⏸ Пауза", callback_data=f"bc_pause_{broadcast_id}")
+    else:
+        toggle = InlineKeyboardButton(text="▶️ Продолжить", callback_data=f"bc_resume_{broadcast_id}")
+    builder.row(
+        toggle,
+        InlineKeyboardButton(text="🛑 Отменить", callback_data=f"bc_cancel_{broadcast_id}")
     )
     return builder.as_markup()
\ No newline at end of file
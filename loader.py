@@ -0,0 +1,53 @@
+from typing import Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+
+import broadcast
+import metrics
+import quarantine
+from config import BOT_TOKEN
+from handlers import start_router, ads_router, profile_router, admin_router
+from middlewares import UserMiddleware, throttling
+from ratelimit import api_limiter
+from states import (
+    Registration, CreateAd, EditAd, EditProfile, ViewAds, SearchAds, AdminStates, ContactSeller
+)
+from storage import SQLiteStorage
+
+# Группы состояний, для которых заранее создаются метки метрик FSM
+STATE_GROUPS = (
+    Registration, CreateAd, EditAd, EditProfile, ViewAds, SearchAds, AdminStates, ContactSeller
+)
+
+
+def create_bot(session: Optional[BaseSession] = None) -> Bot:
+    """Бот, все запросы которого проходят через лимиты исходящих запросов"""
+    bot = Bot(token=BOT_TOKEN, session=session)
+    bot.session.middleware(api_limiter)
+    # Метрики после лимитов: замеряется сам запрос, без ожидания в очереди
+    bot.session.middleware(metrics.api_metrics)
+    return bot
+
+
+def create_dispatcher() -> Dispatcher:
+    """Диспетчер со всеми роутерами и middleware"""
+    dp = Dispatcher(storage=SQLiteStorage())
+    
+    # Антифлуд первым: отброшенные события не доходят до БД
+    dp.update.outer_middleware(throttling)
+    # Пользователь из БД загружается один раз на апдейт
+    dp.update.outer_middleware(UserMiddleware())
+    
+    # Подключение роутеров
+    dp.include_router(start_router)
+    dp.include_router(ads_router)
+    dp.include_router(profile_router)
+    dp.include_router(admin_router)
+    
+    metrics.instrument_dispatcher(dp, STATE_GROUPS, broadcast.stats)
+    
+    dp.shutdown.register(broadcast.shutdown)
+    dp.shutdown.register(quarantine.shutdown)
+    dp.shutdown.register(metrics.shutdown)
+    return dp
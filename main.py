@@ -1,12 +1,15 @@
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 
-from config import BOT_TOKEN
+from config import BOT_MODE, WORKERS, METRICS_HOST, METRICS_PORT
+import broadcast
 import database as db
-from handlers import start_router, ads_router, profile_router, admin_router
+import metrics
+import quarantine
+import workers
+from loader import create_bot, create_dispatcher
+from webhook import run_webhook
 
 # Настройка логирования
 logging.basicConfig(
@@ -17,25 +20,42 @@ logger = logging.getLogger(__name__)
 
 
 async def main():
-    # Инициализация БД
+    # Инициализация БД (миграции применяются до запуска воркеров)
     await db.init_db()
     logger.info("База данных инициализирована")
     
     # Инициализация бота
-    bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
+    bot = create_bot()
     
-    # Подключение роутеров
-    dp.include_router(start_router)
-    dp.include_router(ads_router)
-    dp.include_router(profile_router)
-    dp.include_router(admin_router)
+    if WORKERS > 0:
+        logger.info(f"Бот запущен! Режим: {BOT_MODE}, воркеров: {WORKERS}")
+        # Фронту БД не нужна, воркеры открывают свои соединения
+        await db.close_db()
+        await workers.run_front(bot)
+        return
     
-    logger.info("Бот запущен!")
+    dp = create_dispatcher()
     
-    # Запуск поллинга
-    await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+    # Рассылки, прерванные прошлой остановкой, продолжаются в фоне
+    await broadcast.resume_unfinished(bot)
+    quarantine.start(bot)
+    await metrics.start_server(METRICS_HOST, METRICS_PORT)
+    
+    logger.info(f"Бот запущен! Режим: {BOT_MODE}")
+    
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            # Вебхук от прошлого запуска в режиме webhook мешает getUpdates
+            await bot.delete_webhook()
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+    finally:
+        # Несохранённые FSM-состояния записываются до закрытия БД
+        await dp.storage.close()
+        await db.close_db()
+        logger.info("Соединения с базой данных закрыты")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
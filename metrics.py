@@ -0,0 +1,308 @@
+import functools
+import inspect
+import logging
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Dispatcher, Router
+from aiogram import methods as api_methods
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.fsm.state import StatesGroup
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм в секундах
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# ========== ТИПЫ МЕТРИК ==========
+
+class _Value:
+    """Значение счётчика или gauge для одного набора меток"""
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _Buckets:
+    """Гистограмма для одного набора меток"""
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        # Последняя корзина - +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    """Метрика с набором меток; дочерние значения создаются один раз и переиспользуются"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        REGISTRY.append(self)
+
+    def _new_child(self):
+        return _Value()
+
+    def labels(self, *values: str):
+        """Значение для набора меток (создаётся при первом обращении)"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _label_text(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for values, child in self._children.items():
+            lines.append(f"{self.name}{self._label_text(values)} {child.value}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _Buckets(self.buckets)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = self._label_text(values, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(values)} {child.sum}")
+            lines.append(f"{self.name}_count{self._label_text(values)} {child.count}")
+        return lines
+
+
+REGISTRY: List[Metric] = []
+# Функции, обновляющие gauge перед выдачей /metrics
+_collectors: List[Callable[[], None]] = []
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus"""
+    for collect in _collectors:
+        try:
+            collect()
+        except Exception:
+            logger.exception("Ошибка сбора метрик")
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ========== МЕТРИКИ БОТА ==========
+
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Время работы хендлера", ("router", "handler"))
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Исключения в хендлерах", ("router", "handler"))
+DB_SECONDS = Histogram("bot_db_seconds", "Время функций database.py", ("function",))
+DB_ERRORS = Counter("bot_db_errors_total", "Исключения в функциях database.py", ("function",))
+API_SECONDS = Histogram("bot_api_seconds", "Время запросов к Bot API", ("method",))
+API_ERRORS = Counter("bot_api_errors_total", "Ошибки запросов к Bot API", ("method",))
+FSM_RECORDS = Gauge("bot_fsm_records", "Сессии FSM в памяти", ("kind",))
+FSM_STATES = Gauge("bot_fsm_active_states", "Сессии FSM по текущему состоянию", ("state",))
+BROADCAST_JOBS = Gauge("bot_broadcast_jobs", "Рассылки, выполняемые процессом", ("status",))
+BROADCAST_RECIPIENTS = Gauge("bot_broadcast_recipients", "Прогресс выполняемых рассылок", ("kind",))
+DB_WRITE_QUEUE = Gauge("bot_db_write_queue", "Записи, ожидающие транзакции писателя")
+DB_WRITE_BATCH = Histogram("bot_db_write_batch_size", "Записей в одной транзакции писателя",
+                           buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+
+# Метки методов Bot API создаются заранее, при отправке только поиск в словаре
+_api_children: Dict[str, Tuple[_Buckets, _Value]] = {
+    method.__api_method__: (API_SECONDS.labels(method.__api_method__), API_ERRORS.labels(method.__api_method__))
+    for method in (getattr(api_methods, name) for name in api_methods.__all__)
+    if isinstance(getattr(method, "__api_method__", None), str)
+}
+
+
+def timed(fn: Callable[..., Awaitable[Any]], seconds: _Buckets, errors: _Value):
+    """Обёртка корутины с замером времени и подсчётом исключений"""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            seconds.observe(time.perf_counter() - started)
+    return wrapper
+
+
+def instrument_module(namespace: Dict[str, Any], module_name: str):
+    """Замер времени всех публичных корутин модуля по имени функции"""
+    for name, fn in list(namespace.items()):
+        if (not name.startswith("_") and inspect.iscoroutinefunction(fn)
+                and fn.__module__ == module_name):
+            namespace[name] = timed(fn, DB_SECONDS.labels(name), DB_ERRORS.labels(name))
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Время и ошибки хендлеров роутера (внутренний middleware)"""
+
+    def __init__(self, router: Router):
+        self._children: Dict[Callable, Tuple[_Buckets, _Value]] = {}
+        for observer in (router.message, router.callback_query):
+            for handler in observer.handlers:
+                labels = (router.name, handler.callback.__name__)
+                self._children[handler.callback] = (
+                    HANDLER_SECONDS.labels(*labels), HANDLER_ERRORS.labels(*labels)
+                )
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        children = self._children.get(data["handler"].callback)
+        if children is None:
+            return await handler(event, data)
+        seconds, errors = children
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            seconds.observe(time.perf_counter() - started)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Время и ошибки запросов к Bot API по методу (middleware сессии бота)"""
+
+    async def __call__(self, make_request, bot, method):
+        children = _api_children.get(method.__api_method__)
+        if children is None:
+            return await make_request(bot, method)
+        seconds, errors = children
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            seconds.observe(time.perf_counter() - started)
+
+
+api_metrics = ApiMetricsMiddleware()
+
+
+def instrument_dispatcher(dp: Dispatcher, states: Sequence[Type[StatesGroup]],
+                          broadcast_stats: Callable[[], Dict[str, Any]]):
+    """Метрики хендлеров всех роутеров, FSM-хранилища и рассылок"""
+    for router in dp.sub_routers:
+        middleware = HandlerMetricsMiddleware(router)
+        router.message.middleware(middleware)
+        router.callback_query.middleware(middleware)
+
+    state_children = {
+        state.state: FSM_STATES.labels(state.state)
+        for group in states
+        for state in group.__all_states__
+    }
+    records, dirty = FSM_RECORDS.labels("cached"), FSM_RECORDS.labels("dirty")
+
+    def collect_storage():
+        stats = dp.storage.stats()
+        records.set(stats['records'])
+        dirty.set(stats['dirty'])
+        counts = dp.storage.state_counts()
+        for state, child in state_children.items():
+            child.set(counts.get(state, 0))
+
+    jobs = {status: BROADCAST_JOBS.labels(status) for status in ("running", "paused")}
+    recipients = {kind: BROADCAST_RECIPIENTS.labels(kind) for kind in ("sent", "failed", "total")}
+
+    def collect_broadcasts():
+        stats = broadcast_stats()
+        for status, child in jobs.items():
+            child.set(stats['jobs'].get(status, 0))
+        for kind, child in recipients.items():
+            child.set(stats[kind])
+
+    _collectors[:] = [collect_storage, collect_broadcasts]
+
+
+# ========== HTTP ==========
+
+_runner: Optional[web.AppRunner] = None
+
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Prometheus-Format": "0.0.4"})
+
+
+async def start_server(host: str, port: int):
+    """Локальный HTTP-сервер с /metrics (port 0 - не запускать)"""
+    global _runner
+    if not port or _runner is not None:
+        return
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app, handle_signals=False, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    _runner = runner
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+
+
+async def shutdown():
+    global _runner
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
@@ -0,0 +1,134 @@
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+import database as db
+from cache import LRUCache, MISSING
+from config import (
+    ADMIN_IDS, THROTTLE_WINDOW, THROTTLE_NAV_LIMIT, THROTTLE_CONTACT_LIMIT,
+    THROTTLE_CALLBACK_LIMIT, THROTTLE_MESSAGE_LIMIT, THROTTLE_DEBOUNCE, THROTTLE_USERS
+)
+
+# Группы callback-хендлеров по префиксу данных кнопки: (группа, префиксы, лимит)
+THROTTLE_GROUPS = (
+    ("nav", ("nav_", "snav_", "aph_", "view_cat_", "bsort_", "ausers_",
+             "admin_next_ad", "admin_prev_ad"), THROTTLE_NAV_LIMIT),
+    ("contact", ("contact_",), THROTTLE_CONTACT_LIMIT),
+)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Антифлуд: скользящее окно событий на пользователя и группу хендлеров
+
+    Стоит первым на уровне апдейта, поэтому отброшенное событие не доходит
+    ни до БД, ни до хендлеров. Повторное нажатие той же кнопки быстрее
+    THROTTLE_DEBOUNCE отбрасывается всегда, лимиты окна на админов
+    не действуют. На отброшенный callback сразу отвечаем, чтобы у
+    пользователя не висели «часики».
+    """
+
+    def __init__(self, window: float = THROTTLE_WINDOW, debounce: float = THROTTLE_DEBOUNCE):
+        self.window = window
+        self.debounce = debounce
+        # (user_id, группа) -> время событий в окне
+        self._events = LRUCache(THROTTLE_USERS)
+        # user_id -> (данные последней кнопки, время нажатия)
+        self._last_callback = LRUCache(THROTTLE_USERS)
+        self.passed = 0
+        self.throttled: Counter = Counter()
+        # user_id -> число отброшенных событий, не больше THROTTLE_USERS записей
+        self.offenders: Counter = Counter()
+
+    @staticmethod
+    def _group(update: Update) -> Optional[Tuple[str, int]]:
+        if update.callback_query is not None:
+            data = update.callback_query.data or ""
+            for group, prefixes, limit in THROTTLE_GROUPS:
+                if data.startswith(prefixes):
+                    return group, limit
+            return "callback", THROTTLE_CALLBACK_LIMIT
+        if update.message is not None:
+            return "message", THROTTLE_MESSAGE_LIMIT
+        return None
+
+    def _is_repeat(self, user_id: int, data: Optional[str], now: float) -> bool:
+        last = self._last_callback.get(user_id)
+        self._last_callback.set(user_id, (data, now))
+        return last is not MISSING and last[0] == data and now - last[1] < self.debounce
+
+    def _over_limit(self, user_id: int, group: str, limit: int, now: float) -> bool:
+        events = self._events.get((user_id, group))
+        if events is MISSING:
+            events = deque()
+            self._events.set((user_id, group), events)
+        while events and now - events[0] >= self.window:
+            events.popleft()
+        if len(events) >= limit:
+            return True
+        events.append(now)
+        return False
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        group = self._group(event)
+        if user is None or group is None:
+            return await handler(event, data)
+
+        name, limit = group
+        now = time.monotonic()
+        callback = event.callback_query
+        if callback is not None and self._is_repeat(user.id, callback.data, now):
+            reason = "repeat"
+        elif user.id not in ADMIN_IDS and self._over_limit(user.id, name, limit, now):
+            reason = name
+        else:
+            self.passed += 1
+            return await handler(event, data)
+
+        self.throttled[reason] += 1
+        self.offenders[user.id] += 1
+        if len(self.offenders) > THROTTLE_USERS:
+            # Оставляем самых активных, единичные нарушения забываем
+            self.offenders = Counter(dict(self.offenders.most_common(THROTTLE_USERS // 2)))
+        if callback is not None:
+            # Повтор той же кнопки гасим молча - первое нажатие уже обрабатывается
+            await callback.answer(None if reason == "repeat" else "⏳ Слишком часто, подождите немного")
+        return None
+
+    def stats(self, top: int = 5) -> Dict[str, Any]:
+        """Пропущенные и отброшенные события по причинам, самые активные нарушители"""
+        return {
+            "passed": self.passed,
+            "throttled": dict(self.throttled),
+            "offenders": self.offenders.most_common(top),
+        }
+
+
+# Один экземпляр на процесс: статистика видна в админке
+throttling = ThrottlingMiddleware()
+
+
+class UserMiddleware(BaseMiddleware):
+    """Загрузка пользователя из БД (через кэш) один раз на апдейт
+
+    Строка users передаётся в хендлеры как db_user
+    (None - пользователь не зарегистрирован).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        data["db_user"] = await db.get_user_cached(user.id) if user else None
+        return await handler(event, data)
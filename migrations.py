@@ -0,0 +1,447 @@
+import logging
+from typing import Awaitable, Callable, List, Tuple
+
+import aiosqlite
+
+from prices import parse_price
+
+logger = logging.getLogger(__name__)
+
+Migration = Tuple[int, str, Callable[[aiosqlite.Connection], Awaitable[None]]]
+
+
+# ========== МИГРАЦИИ ==========
+
+async def _has_column(db: aiosqlite.Connection, table: str, column: str) -> bool:
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        return any(row[1] == column for row in await cursor.fetchall())
+
+
+async def _create_tables(db: aiosqlite.Connection):
+    # Таблица пользователей
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            telegram_id INTEGER PRIMARY KEY,
+            username TEXT,
+            game_nick TEXT NOT NULL,
+            game_id TEXT NOT NULL,
+            is_blocked INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Таблица объявлений
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS ads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL,
+            price TEXT NOT NULL,
+            category TEXT NOT NULL,
+            photos TEXT,
+            is_active INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (telegram_id)
+        )
+    """)
+
+
+async def _create_ads_indexes(db: aiosqlite.Connection):
+    # Лента категории: get_ads_by_category, count_ads_by_category
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ads_category_active_created
+        ON ads (category, is_active, created_at DESC, id DESC)
+    """)
+    # Мои объявления: get_user_ads
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ads_user_active_created
+        ON ads (user_id, is_active, created_at DESC, id DESC)
+    """)
+    # Все объявления для админа: get_admin_ads_after/before
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ads_active_created
+        ON ads (is_active, created_at DESC, id DESC)
+    """)
+    await db.execute("ANALYZE")
+
+
+async def _clean_photos(db: aiosqlite.Connection):
+    """Удаление пустых значений из строк с фото (бывший fix_db.py)"""
+    async with db.execute(
+        "SELECT id, photos FROM ads WHERE photos IS NOT NULL AND photos != ''"
+    ) as cursor:
+        rows = await cursor.fetchall()
+
+    fixed = 0
+    for ad_id, photos_str in rows:
+        photos = [p.strip() for p in photos_str.split(',') if p.strip()]
+        new_photos_str = ','.join(photos)
+
+        if new_photos_str != photos_str:
+            await db.execute(
+                "UPDATE ads SET photos = ? WHERE id = ?",
+                (new_photos_str if new_photos_str else None, ad_id)
+            )
+            fixed += 1
+
+    if fixed:
+        logger.info(f"Исправлено записей с фото: {fixed}")
+
+
+# Объявление учитывается в счётчике, если оно активно и продавец не заблокирован
+_COUNTED_OLD = (
+    "OLD.is_active = 1 AND EXISTS "
+    "(SELECT 1 FROM users WHERE telegram_id = OLD.user_id AND is_blocked = 0)"
+)
+_COUNTED_NEW = (
+    "NEW.is_active = 1 AND EXISTS "
+    "(SELECT 1 FROM users WHERE telegram_id = NEW.user_id AND is_blocked = 0)"
+)
+
+
+async def _create_category_stats(db: aiosqlite.Connection):
+    """Счётчики активных объявлений по категориям, поддерживаемые триггерами"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS category_stats (
+            category TEXT PRIMARY KEY,
+            active_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    await db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ads_insert_stats
+        AFTER INSERT ON ads
+        WHEN {_COUNTED_NEW}
+        BEGIN
+            INSERT INTO category_stats (category, active_count) VALUES (NEW.category, 1)
+            ON CONFLICT (category) DO UPDATE SET active_count = active_count + 1;
+        END
+    """)
+    await db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ads_update_stats
+        AFTER UPDATE OF is_active, category, user_id ON ads
+        BEGIN
+            UPDATE category_stats SET active_count = active_count - 1
+            WHERE category = OLD.category AND {_COUNTED_OLD};
+            INSERT INTO category_stats (category, active_count)
+            SELECT NEW.category, 1 WHERE {_COUNTED_NEW}
+            ON CONFLICT (category) DO UPDATE SET active_count = active_count + 1;
+        END
+    """)
+    await db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ads_delete_stats
+        AFTER DELETE ON ads
+        WHEN {_COUNTED_OLD}
+        BEGIN
+            UPDATE category_stats SET active_count = active_count - 1
+            WHERE category = OLD.category;
+        END
+    """)
+    # Блокировка продавца убирает из счётчиков все его активные объявления
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_block_stats
+        AFTER UPDATE OF is_blocked ON users
+        WHEN (OLD.is_blocked = 0) != (NEW.is_blocked = 0)
+        BEGIN
+            INSERT INTO category_stats (category, active_count)
+            SELECT category, CASE WHEN NEW.is_blocked = 0 THEN COUNT(*) ELSE -COUNT(*) END
+            FROM ads
+            WHERE user_id = NEW.telegram_id AND is_active = 1
+            GROUP BY category
+            ON CONFLICT (category) DO UPDATE
+            SET active_count = active_count + excluded.active_count;
+        END
+    """)
+
+    # Заполнение по текущим данным
+    await db.execute("DELETE FROM category_stats")
+    await db.execute("""
+        INSERT INTO category_stats (category, active_count)
+        SELECT ads.category, COUNT(*)
+        FROM ads
+        JOIN users ON ads.user_id = users.telegram_id
+        WHERE ads.is_active = 1 AND users.is_blocked = 0
+        GROUP BY ads.category
+    """)
+
+
+async def _create_ad_photos(db: aiosqlite.Connection):
+    """Перенос фото из строки ads.photos в отдельную таблицу"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS ad_photos (
+            ad_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            file_id TEXT NOT NULL,
+            PRIMARY KEY (ad_id, position),
+            FOREIGN KEY (ad_id) REFERENCES ads (id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+
+    async with db.execute(
+        "SELECT id, photos FROM ads WHERE photos IS NOT NULL AND photos != ''"
+    ) as cursor:
+        rows = await cursor.fetchall()
+
+    for ad_id, photos_str in rows:
+        photos = [p.strip() for p in photos_str.split(',') if p.strip()]
+        await db.executemany(
+            "INSERT OR IGNORE INTO ad_photos (ad_id, position, file_id) VALUES (?, ?, ?)",
+            [(ad_id, position, file_id) for position, file_id in enumerate(photos)]
+        )
+
+    # Колонка остаётся ради старых версий SQLite без DROP COLUMN, но больше не используется
+    await db.execute("UPDATE ads SET photos = NULL WHERE photos IS NOT NULL")
+
+
+async def _create_fsm_storage(db: aiosqlite.Connection):
+    """Таблица FSM-хранилища (storage.SQLiteStorage)"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data BLOB,
+            updated_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_fsm_storage_updated
+        ON fsm_storage (updated_at)
+    """)
+
+
+async def _create_broadcasts(db: aiosqlite.Connection):
+    """Задания рассылки и журнал получателей"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            cursor INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_broadcasts_status
+        ON broadcasts (status)
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS broadcast_recipients (
+            broadcast_id INTEGER NOT NULL,
+            telegram_id INTEGER NOT NULL,
+            delivered INTEGER NOT NULL,
+            PRIMARY KEY (broadcast_id, telegram_id)
+        ) WITHOUT ROWID
+    """)
+
+
+async def _create_ads_fts(db: aiosqlite.Connection):
+    """Полнотекстовый индекс FTS5 по названию и описанию активных объявлений"""
+    await db.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS ads_fts USING fts5(
+            title, description,
+            content='ads', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+
+    # В индексе только активные объявления: удаляем из него ровно то, что добавляли
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_ads_fts_insert
+        AFTER INSERT ON ads
+        WHEN NEW.is_active = 1
+        BEGIN
+            INSERT INTO ads_fts (rowid, title, description)
+            VALUES (NEW.id, NEW.title, NEW.description);
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_ads_fts_update
+        AFTER UPDATE OF title, description, is_active ON ads
+        BEGIN
+            INSERT INTO ads_fts (ads_fts, rowid, title, description)
+            SELECT 'delete', OLD.id, OLD.title, OLD.description WHERE OLD.is_active = 1;
+            INSERT INTO ads_fts (rowid, title, description)
+            SELECT NEW.id, NEW.title, NEW.description WHERE NEW.is_active = 1;
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_ads_fts_delete
+        AFTER DELETE ON ads
+        WHEN OLD.is_active = 1
+        BEGIN
+            INSERT INTO ads_fts (ads_fts, rowid, title, description)
+            VALUES ('delete', OLD.id, OLD.title, OLD.description);
+        END
+    """)
+
+    await db.execute("INSERT INTO ads_fts (ads_fts) VALUES ('delete-all')")
+    await db.execute("""
+        INSERT INTO ads_fts (rowid, title, description)
+        SELECT id, title, description FROM ads WHERE is_active = 1
+    """)
+
+
+async def _add_price_value(db: aiosqlite.Connection):
+    """Числовая цена и признак «договорная» с заполнением из текста цены"""
+    if not await _has_column(db, "ads", "price_value"):
+        await db.execute("ALTER TABLE ads ADD COLUMN price_value INTEGER")
+    if not await _has_column(db, "ads", "price_negotiable"):
+        await db.execute(
+            "ALTER TABLE ads ADD COLUMN price_negotiable INTEGER NOT NULL DEFAULT 0"
+        )
+
+    async with db.execute("SELECT id, price FROM ads") as cursor:
+        rows = await cursor.fetchall()
+    updates = []
+    for ad_id, price in rows:
+        value, negotiable = parse_price(price)
+        updates.append((value, int(negotiable), ad_id))
+    await db.executemany(
+        "UPDATE ads SET price_value = ?, price_negotiable = ? WHERE id = ?", updates
+    )
+
+    # Фильтр по бюджету и сортировка по цене внутри категории
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ads_category_active_price
+        ON ads (category, is_active, price_value, id)
+    """)
+    await db.execute("ANALYZE")
+
+
+async def _create_user_stats(db: aiosqlite.Connection):
+    """Счётчики пользователей (всего и заблокированных) на триггерах"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_insert_count
+        AFTER INSERT ON users
+        BEGIN
+            UPDATE user_stats SET total = total + 1,
+                blocked = blocked + (IFNULL(NEW.is_blocked, 0) != 0)
+            WHERE id = 1;
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_delete_count
+        AFTER DELETE ON users
+        BEGIN
+            UPDATE user_stats SET total = total - 1,
+                blocked = blocked - (IFNULL(OLD.is_blocked, 0) != 0)
+            WHERE id = 1;
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_block_count
+        AFTER UPDATE OF is_blocked ON users
+        BEGIN
+            UPDATE user_stats SET blocked = blocked
+                + (IFNULL(NEW.is_blocked, 0) != 0) - (IFNULL(OLD.is_blocked, 0) != 0)
+            WHERE id = 1;
+        END
+    """)
+
+    # Заполнение по текущим данным
+    await db.execute("DELETE FROM user_stats")
+    await db.execute("""
+        INSERT INTO user_stats (id, total, blocked)
+        SELECT 1, COUNT(*), COUNT(*) FILTER (WHERE IFNULL(is_blocked, 0) != 0) FROM users
+    """)
+
+    # Список пользователей для админа: новые сначала, keyset по (created_at, telegram_id)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_created
+        ON users (created_at DESC, telegram_id DESC)
+    """)
+    await db.execute("ANALYZE")
+
+
+async def _add_ad_version(db: aiosqlite.Connection):
+    """Версия объявления для кэша карточек: растёт при каждом изменении"""
+    if not await _has_column(db, "ads", "version"):
+        await db.execute("ALTER TABLE ads ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+
+async def _add_photo_quarantine(db: aiosqlite.Connection):
+    """Учёт отклонённых Telegram фото: счётчик ошибок и карантин"""
+    if not await _has_column(db, "ad_photos", "failures"):
+        await db.execute(
+            "ALTER TABLE ad_photos ADD COLUMN failures INTEGER NOT NULL DEFAULT 0"
+        )
+    if not await _has_column(db, "ad_photos", "quarantined_at"):
+        await db.execute("ALTER TABLE ad_photos ADD COLUMN quarantined_at TIMESTAMP")
+    # Число фото в карантине - для предупреждения продавцу без JOIN
+    if not await _has_column(db, "ads", "broken_photos"):
+        await db.execute(
+            "ALTER TABLE ads ADD COLUMN broken_photos INTEGER NOT NULL DEFAULT 0"
+        )
+    # Задание перепроверки берёт самые давно проверенные фото из карантина
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ad_photos_quarantined
+        ON ad_photos (quarantined_at) WHERE quarantined_at IS NOT NULL
+    """)
+
+
+async def _add_ad_revision(db: aiosqlite.Connection):
+    """Счётчик правок объявления: меняют только update_ad и delete_ad"""
+    if not await _has_column(db, "ads", "revision"):
+        await db.execute("ALTER TABLE ads ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+
+
+# Порядок важен: номер версии записывается в PRAGMA user_version
+MIGRATIONS: List[Migration] = [
+    (1, "Таблицы users и ads", _create_tables),
+    (2, "Индексы для выборок объявлений", _create_ads_indexes),
+    (3, "Очистка пустых file_id в фото", _clean_photos),
+    (4, "Счётчики объявлений по категориям", _create_category_stats),
+    (5, "Таблица ad_photos вместо строки ads.photos", _create_ad_photos),
+    (6, "Таблица FSM-хранилища", _create_fsm_storage),
+    (7, "Задания рассылки", _create_broadcasts),
+    (8, "Полнотекстовый поиск по объявлениям", _create_ads_fts),
+    (9, "Числовая цена объявлений", _add_price_value),
+    (10, "Счётчики пользователей и индекс списка", _create_user_stats),
+    (11, "Версия объявления для кэша", _add_ad_version),
+    (12, "Карантин недоступных фото", _add_photo_quarantine),
+    (13, "Счётчик правок объявления", _add_ad_revision),
+]
+
+
+async def get_schema_version(db: aiosqlite.Connection) -> int:
+    """Текущая версия схемы"""
+    async with db.execute("PRAGMA user_version") as cursor:
+        row = await cursor.fetchone()
+    return row[0]
+
+
+async def apply_migrations(pool) -> int:
+    """Применение недостающих миграций, каждая в своей транзакции"""
+    version = await pool.write(get_schema_version)
+
+    for target, description, migration in MIGRATIONS:
+        if target <= version:
+            continue
+
+        async def run(db):
+            # Повторная проверка внутри транзакции: другой процесс мог успеть раньше
+            if await get_schema_version(db) >= target:
+                return
+            await migration(db)
+            await db.execute(f"PRAGMA user_version = {target}")
+
+        await pool.write(run)
+        logger.info(f"Применена миграция {target}: {description}")
+        version = target
+
+    return version
@@ -0,0 +1,59 @@
+import re
+from typing import Optional, Tuple
+
+# Множители сокращений: 1.5кк, 500к, 2 млн...
+MULTIPLIERS = {
+    "к": 10 ** 3, "k": 10 ** 3, "т": 10 ** 3, "тыс": 10 ** 3,
+    "кк": 10 ** 6, "kk": 10 ** 6, "м": 10 ** 6, "m": 10 ** 6, "млн": 10 ** 6,
+    "ккк": 10 ** 9, "kkk": 10 ** 9, "b": 10 ** 9, "млрд": 10 ** 9,
+}
+
+NEGOTIABLE_WORDS = ("договор", "торг")
+
+# Наибольшее значение, которое помещается в INTEGER SQLite
+MAX_PRICE = 2 ** 63 - 1
+
+_PRICE_RE = re.compile(r"(\d+(?:[.,]\d+)*)(ккк|kkk|кк|kk|млрд|млн|тыс|к|k|т|м|m|b)?")
+
+
+def _parse_number(number: str, has_suffix: bool) -> float:
+    """Число с разделителями: «100.000» - тысячи, «1.5» - дробь"""
+    parts = re.split(r"[.,]", number)
+    if len(parts) == 1:
+        return float(parts[0])
+    # Все группы после первой по 3 цифры и нет сокращения - это разделители разрядов
+    if not has_suffix and all(len(p) == 3 for p in parts[1:]):
+        return float("".join(parts))
+    return float("".join(parts[:-1]) + "." + parts[-1])
+
+
+def parse_price(text: str) -> Tuple[Optional[int], bool]:
+    """Разбор цены из свободного текста
+
+    Возвращает (цена в целых единицах или None, признак «договорная»);
+    сумма больше MAX_PRICE даёт None.
+    """
+    value = text.lower().replace(" ", "").replace(" ", "")
+    negotiable = any(word in value for word in NEGOTIABLE_WORDS)
+
+    match = _PRICE_RE.search(value)
+    if not match:
+        return None, negotiable
+
+    number, suffix = match.groups()
+    amount = _parse_number(number, has_suffix=suffix is not None)
+    if suffix:
+        amount *= MULTIPLIERS[suffix]
+    # Слишком большая сумма (в т.ч. inf) не сохраняется в БД - считаем цену неразобранной
+    if amount > MAX_PRICE:
+        return None, negotiable
+    return int(round(amount)), negotiable
+
+
+def parse_price_range(text: str) -> Tuple[Optional[int], Optional[int]]:
+    """Разбор диапазона «от-до»: «100к-1.5кк», «-500000», «1кк-»"""
+    if "-" not in text:
+        value, _ = parse_price(text)
+        return value, value
+    low, high = text.split("-", 1)
+    return parse_price(low)[0], parse_price(high)[0]
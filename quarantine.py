@@ -0,0 +1,86 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
+
+import database as db
+from config import PHOTO_REVALIDATE_INTERVAL, PHOTO_REVALIDATE_BATCH
+
+logger = logging.getLogger(__name__)
+
+_task: Optional[asyncio.Task] = None
+
+
+# Описания ошибок Bot API, которые относятся к самому фото
+PHOTO_ERRORS = (
+    "wrong file identifier",
+    "wrong remote file identifier",
+    "wrong file_id",
+    "file reference expired",
+    "wrong type of the web page content",
+    "failed to get http url content",
+    "wrong padding in the string",
+    "type of file mismatch",
+    "can't use file of type",
+    "image_process_failed",
+    "photo_invalid_dimensions",
+)
+
+
+def is_photo_error(error: TelegramBadRequest) -> bool:
+    """Отказ из-за самого фото (неверный или чужой file_id), а не сообщения"""
+    description = str(error).lower()
+    return any(text in description for text in PHOTO_ERRORS)
+
+
+async def revalidate(bot: Bot) -> int:
+    """Перепроверка фото из карантина через getFile, возвращает число восстановленных"""
+    checked_before = (
+        datetime.now(timezone.utc) - timedelta(seconds=PHOTO_REVALIDATE_INTERVAL)
+    ).strftime(db.TIMESTAMP_FORMAT)
+    released = 0
+    for photo in await db.get_quarantined_photos(checked_before, PHOTO_REVALIDATE_BATCH):
+        try:
+            await bot.get_file(photo['file_id'])
+        except TelegramBadRequest:
+            await db.touch_quarantined_photo(photo['ad_id'], photo['position'])
+            continue
+        except TelegramAPIError as e:
+            # Сетевая ошибка или лимит - проверим в следующий раз
+            logger.warning(f"Перепроверка фото прервана: {e}")
+            break
+        await db.release_photo(photo['ad_id'], photo['position'])
+        released += 1
+    if released:
+        logger.info(f"Из карантина возвращено фото: {released}")
+    return released
+
+
+async def _loop(bot: Bot):
+    while True:
+        try:
+            await revalidate(bot)
+        except Exception:
+            logger.exception("Ошибка перепроверки фото")
+        await asyncio.sleep(PHOTO_REVALIDATE_INTERVAL)
+
+
+def start(bot: Bot):
+    """Запуск фоновой перепроверки (в одном процессе)"""
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_loop(bot))
+
+
+async def shutdown():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
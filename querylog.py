@@ -0,0 +1,225 @@
+import functools
+import inspect
+import logging
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import aiosqlite
+
+from config import SLOW_QUERY_MS, SLOW_QUERY_LOG
+
+logger = logging.getLogger(__name__)
+
+# Отдельный журнал медленных запросов (в файл, если задан SLOW_QUERY_LOG)
+slow_logger = logging.getLogger("slow_queries")
+if SLOW_QUERY_LOG:
+    _handler = logging.FileHandler(SLOW_QUERY_LOG, encoding="utf-8")
+    _handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+    slow_logger.addHandler(_handler)
+
+# Публичная функция database.py, выполняющая запрос
+caller: ContextVar[str] = ContextVar("query_caller", default="-")
+# Выключается на время миграций: их запросы не попадают в статистику и журнал
+tracing: ContextVar[bool] = ContextVar("query_tracing", default=True)
+
+_SPACES = re.compile(r"\s+")
+_PLACEHOLDER_LIST = re.compile(r"\?(\s*,\s*\?)+")
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+# Таблицы-счётчики на триггерах: в них единицы строк, полный проход нормален
+SMALL_TABLES = {"category_stats", "user_stats"}
+
+
+def statement_shape(sql: str) -> str:
+    """Форма запроса: без лишних пробелов, списки IN (?, ?, ...) схлопнуты"""
+    return _PLACEHOLDER_LIST.sub("?, ...", _SPACES.sub(" ", sql).strip())
+
+
+def is_full_scan(plan: List[str], tables: Set[str]) -> bool:
+    """В плане есть полный проход по обычной таблице (SCAN без индекса)
+
+    Проход по подзапросу, CTE, виртуальной FTS-таблице или таблице-счётчику
+    (SMALL_TABLES) полным не считается.
+    """
+    for step in plan:
+        parts = step.split()
+        if len(parts) >= 2 and parts[0] == "SCAN" and "USING" not in parts and parts[1] in tables:
+            return True
+    return False
+
+
+@dataclass
+class QueryStats:
+    shape: str
+    calls: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    rows: int = 0
+    slow: int = 0
+    callers: Dict[str, int] = field(default_factory=dict)
+    plan: Optional[List[str]] = None
+    full_scan: bool = False
+
+
+_stats: Dict[str, QueryStats] = {}
+# Обычные таблицы схемы без SMALL_TABLES (для распознавания полного прохода в плане)
+_tables: Optional[Set[str]] = None
+
+
+def reset_tables():
+    """Перечитать список таблиц при следующем плане (после изменения схемы)"""
+    global _tables
+    _tables = None
+
+
+def _explainable(shape: str) -> bool:
+    return shape.lstrip("(").upper().startswith(_EXPLAINABLE)
+
+
+async def _record(conn: aiosqlite.Connection, sql: str, params: Any,
+                  duration: float, rows: int):
+    if not tracing.get():
+        return
+    shape = statement_shape(sql)
+    stats = _stats.get(shape)
+    if stats is None:
+        stats = _stats[shape] = QueryStats(shape)
+    name = caller.get()
+    stats.calls += 1
+    stats.total += duration
+    stats.max = max(stats.max, duration)
+    stats.rows += max(rows, 0)
+    stats.callers[name] = stats.callers.get(name, 0) + 1
+
+    # План запроса снимается один раз на форму запроса
+    if stats.plan is None and _explainable(shape):
+        global _tables
+        try:
+            if _tables is None:
+                names = await conn.execute_fetchall(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND sql NOT LIKE 'CREATE VIRTUAL%'"
+                )
+                _tables = {row[0] for row in names} - SMALL_TABLES
+            plan = await conn.execute_fetchall(f"EXPLAIN QUERY PLAN {sql}", params)
+            stats.plan = [row[3] for row in plan]
+        except Exception as e:
+            stats.plan = [f"(план недоступен: {e})"]
+        stats.full_scan = is_full_scan(stats.plan, _tables or set())
+        if stats.full_scan:
+            logger.warning(f"Полный проход по таблице в {name}: {shape}")
+
+    if duration * 1000 >= SLOW_QUERY_MS:
+        stats.slow += 1
+        plan = "; ".join(stats.plan or [])
+        slow_logger.warning(
+            f"Медленный запрос {duration * 1000:.1f} мс, строк {rows}, {name}"
+            f"{' [FULL SCAN]' if stats.full_scan else ''}: {shape} | план: {plan}"
+        )
+
+
+class _TracedCursor:
+    """Курсор, считающий полученные строки"""
+
+    def __init__(self, cursor: aiosqlite.Cursor):
+        self._cursor = cursor
+        self.fetched = 0
+
+    async def fetchone(self):
+        row = await self._cursor.fetchone()
+        if row is not None:
+            self.fetched += 1
+        return row
+
+    async def fetchall(self):
+        rows = await self._cursor.fetchall()
+        self.fetched += len(rows)
+        return rows
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+
+class _TracedStatement:
+    """Результат TracedConnection.execute: поддерживает await и async with"""
+
+    def __init__(self, conn: aiosqlite.Connection, sql: str, params: Any):
+        self._conn = conn
+        self._sql = sql
+        self._params = params
+        self._cursor: Optional[_TracedCursor] = None
+        self._started = 0.0
+
+    async def _execute(self) -> aiosqlite.Cursor:
+        started = time.perf_counter()
+        cursor = await self._conn.execute(self._sql, self._params)
+        await _record(self._conn, self._sql, self._params,
+                      time.perf_counter() - started, cursor.rowcount)
+        return cursor
+
+    def __await__(self):
+        return self._execute().__await__()
+
+    async def __aenter__(self) -> _TracedCursor:
+        # Для SELECT основное время уходит на fetch - замер до выхода из блока
+        self._started = time.perf_counter()
+        self._cursor = _TracedCursor(await self._conn.execute(self._sql, self._params))
+        return self._cursor
+
+    async def __aexit__(self, *exc_info):
+        duration = time.perf_counter() - self._started
+        await self._cursor.close()
+        rows = self._cursor.fetched or max(self._cursor.rowcount, 0)
+        await _record(self._conn, self._sql, self._params, duration, rows)
+
+
+class TracedConnection:
+    """Обёртка соединения: каждый запрос попадает в статистику и журнал медленных"""
+
+    def __init__(self, conn: aiosqlite.Connection):
+        self._conn = conn
+
+    def execute(self, sql: str, params: Any = ()) -> _TracedStatement:
+        return _TracedStatement(self._conn, sql, params)
+
+    async def execute_fetchall(self, sql: str, params: Any = ()):
+        started = time.perf_counter()
+        rows = await self._conn.execute_fetchall(sql, params)
+        await _record(self._conn, sql, params, time.perf_counter() - started, len(rows))
+        return rows
+
+    async def executemany(self, sql: str, params: Any):
+        params = list(params)
+        started = time.perf_counter()
+        cursor = await self._conn.executemany(sql, params)
+        await _record(self._conn, sql, params[0] if params else (),
+                      time.perf_counter() - started, cursor.rowcount)
+        return cursor
+
+    def __getattr__(self, name: str):
+        return getattr(self._conn, name)
+
+
+def instrument_module(namespace: Dict[str, Any], module_name: str):
+    """Запоминание имени публичной функции модуля как источника её запросов"""
+    for name, fn in list(namespace.items()):
+        if (not name.startswith("_") and inspect.iscoroutinefunction(fn)
+                and fn.__module__ == module_name):
+            namespace[name] = _with_caller(fn, name)
+
+
+def _with_caller(fn: Callable[..., Awaitable[Any]], name: str):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        token = caller.set(name)
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            caller.reset(token)
+    return wrapper
+
+
+def top(limit: int = 10) -> List[QueryStats]:
+    """Запросы с наибольшим суммарным временем с момента запуска"""
+    return sorted(_stats.values(), key=lambda s: s.total, reverse=True)[:limit]
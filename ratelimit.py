@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Dict
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from cache import LRUCache, MISSING
+from config import (
+    API_GLOBAL_RATE, API_CHAT_RATE, API_CHAT_BURST, API_GROUP_PER_MINUTE,
+    API_CHAT_BUCKETS, API_MAX_RETRIES, BROADCAST_RATE, WORKERS
+)
+
+logger = logging.getLogger(__name__)
+
+# Фоновые запросы (рассылки) уступают общий лимит интерактивным
+background: ContextVar[bool] = ContextVar("api_background", default=False)
+
+
+class TokenBucket:
+    """Ограничитель частоты: rate токенов в секунду, запас до capacity"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self._background_lock = asyncio.Lock()
+        self._waiting = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1, background: bool = False) -> float:
+        """Ожидание токена, возвращает время ожидания в секундах
+
+        Фоновый запрос ждёт, пока в очереди нет обычных, и в очереди
+        одновременно стоит не больше одного фонового.
+        """
+        started = time.monotonic()
+        if background:
+            async with self._background_lock:
+                while self._waiting:
+                    await asyncio.sleep(1 / self.rate)
+                return await self._take(tokens, started)
+        self._waiting += 1
+        try:
+            return await self._take(tokens, started)
+        finally:
+            self._waiting -= 1
+
+    async def _take(self, tokens: float, started: float) -> float:
+        # Лок выстраивает ожидающих в очередь по порядку прихода
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return time.monotonic() - started
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Остановка выдачи токенов (например, после ответа 429)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+def process_rate(index: int = 0, workers: int = WORKERS) -> float:
+    """Доля общего лимита API_GLOBAL_RATE для процесса
+
+    Без воркеров процесс получает весь лимит. С воркерами рассылки идут
+    только из воркера 0, поэтому ему сверх равной доли отдаётся резерв
+    рассылок: BROADCAST_RATE, но не больше половины общего лимита, чтобы
+    остальным воркерам оставалось на ответы. Приоритет ответов над
+    рассылкой действует внутри воркера 0: в остальных воркерах резерв
+    не используется, даже когда рассылки нет.
+    """
+    if not workers:
+        return API_GLOBAL_RATE
+    reserve = min(BROADCAST_RATE, API_GLOBAL_RATE / 2)
+    share = (API_GLOBAL_RATE - reserve) / workers
+    return share + reserve if index == 0 else share
+
+
+class OutboundRateLimiter(BaseRequestMiddleware):
+    """Ограничение исходящих запросов к Bot API (middleware сессии бота)
+
+    Запросы с chat_id (отправка, правка, удаление сообщений) проходят через
+    общий лимит API_GLOBAL_RATE (в режиме воркеров - доля процесса, см. process_rate).
+    Отправка новых сообщений (send*) дополнительно ограничена лимитом
+    чата: API_CHAT_RATE в секунду для личных чатов и API_GROUP_PER_MINUTE
+    в минуту для групп; правки и удаления в ответ на нажатия его не ждут.
+    Запросы рассылок (background) дополнительно ограничены BROADCAST_RATE
+    и получают общий лимит, только когда его не ждут ответы пользователям.
+    Ответ 429 приостанавливает лимит чата (для правок - только этот запрос)
+    на retry_after, после чего запрос повторяется до API_MAX_RETRIES раз.
+    Остальные запросы (getUpdates, answerCallbackQuery, getFile) не ждут.
+    """
+
+    def __init__(self, rate: float = process_rate(),
+                 max_retries: int = API_MAX_RETRIES,
+                 background_rate: float = BROADCAST_RATE):
+        self.max_retries = max_retries
+        self._global = TokenBucket(rate)
+        self._background = TokenBucket(background_rate)
+        self._chats = LRUCache(API_CHAT_BUCKETS)
+        self.requests = 0
+        self.limited = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.retries = 0
+
+    def set_rate(self, rate: float):
+        """Смена общего лимита процесса (до первых запросов, в воркере)"""
+        self._global = TokenBucket(rate)
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is MISSING:
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(API_CHAT_RATE, API_CHAT_BURST)
+            else:
+                # Группы, каналы и @username
+                bucket = TokenBucket(API_GROUP_PER_MINUTE / 60, API_GROUP_PER_MINUTE)
+            self._chats.set(chat_id, bucket)
+        return bucket
+
+    async def _acquire(self, chat_id, per_chat: bool) -> float:
+        is_background = background.get()
+        waited = await self._chat_bucket(chat_id).acquire() if per_chat else 0.0
+        if is_background:
+            waited += await self._background.acquire()
+        waited += await self._global.acquire(background=is_background)
+        self.limited += 1
+        if waited > 0.001:
+            self.waited += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        return waited
+
+    async def __call__(self, make_request, bot, method):
+        self.requests += 1
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        # Лимит чата Telegram считает по новым сообщениям
+        per_chat = method.__api_method__.startswith("send")
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat_id, per_chat)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                logger.warning(
+                    f"429 на {method.__api_method__} в чат {chat_id}: "
+                    f"ждём {e.retry_after} с, попытка {attempt + 1}"
+                )
+                if per_chat:
+                    self._chat_bucket(chat_id).pause(e.retry_after)
+                else:
+                    await asyncio.sleep(e.retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики запросов и ожидания в очереди лимитов"""
+        return {
+            "requests": self.requests,
+            "limited": self.limited,
+            "waited": self.waited,
+            "wait_total": self.wait_total,
+            "wait_avg": self.wait_total / self.waited if self.waited else 0.0,
+            "wait_max": self.wait_max,
+            "retries": self.retries,
+            "chats": len(self._chats),
+        }
+
+
+# Один лимитер на процесс: общий для всех экземпляров Bot
+api_limiter = OutboundRateLimiter()
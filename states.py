@@ -36,6 +36,14 @@ class EditProfile(StatesGroup):
 class ViewAds(StatesGroup):
     """Состояния просмотра объявлений"""
     browsing = State()
+    price_range = State()
+
+
+class SearchAds(StatesGroup):
+    """Состояния поиска объявлений"""
+    query = State()
+    category = State()
+    results = State()
 
 
 class AdminStates(StatesGroup):
@@ -43,6 +51,8 @@ class AdminStates(StatesGroup):
     broadcast_message = State()
     block_user_id = State()
     view_ads = State()
+    ads_seller = State()
+    ads_dates = State()
 
 
 class ContactSeller(StatesGroup):
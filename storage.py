@@ -0,0 +1,209 @@
+import asyncio
+import json
+import logging
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+import database as db
+from config import FSM_FLUSH_INTERVAL, FSM_TTL, FSM_CACHE_IDLE
+
+logger = logging.getLogger(__name__)
+
+# Данные длиннее порога сжимаются zlib
+COMPRESS_THRESHOLD = 512
+PURGE_INTERVAL = 60
+
+
+def dump_data(data: Dict[str, Any]) -> bytes:
+    """Компактная сериализация данных FSM: префикс формата + JSON"""
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+    if len(raw) > COMPRESS_THRESHOLD:
+        return b"z" + zlib.compress(raw, 1)
+    return b"j" + raw
+
+
+def load_data(blob: Optional[bytes]) -> Dict[str, Any]:
+    """Разбор данных FSM, сохранённых dump_data"""
+    if not blob:
+        return {}
+    fmt, payload = blob[:1], blob[1:]
+    if fmt == b"z":
+        payload = zlib.decompress(payload)
+    return json.loads(payload)
+
+
+@dataclass
+class _Record:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    dirty: bool = False
+    accessed_at: float = field(default_factory=time.monotonic)
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в файле БД бота
+
+    Записи держатся в памяти и сбрасываются в SQLite пачкой раз в
+    FSM_FLUSH_INTERVAL секунд, поэтому несколько update_data подряд
+    превращаются в одну запись. Сессии, не менявшиеся дольше FSM_TTL,
+    удаляются.
+    """
+
+    def __init__(self, flush_interval: float = FSM_FLUSH_INTERVAL,
+                 ttl: float = FSM_TTL, cache_idle: float = FSM_CACHE_IDLE):
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self.cache_idle = cache_idle
+        self._records: Dict[str, _Record] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._last_purge = 0.0
+        self.writes = 0
+        self.flushed_rows = 0
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or 0}:{key.destiny}"
+
+    async def _get_record(self, key: StorageKey) -> _Record:
+        key_str = self._key(key)
+        record = self._records.get(key_str)
+        if record is None:
+            row = await db.get_pool().read(
+                lambda conn: self._load_row(conn, key_str)
+            )
+            loaded = _Record()
+            if row is not None:
+                loaded.state, loaded.data = row['state'], load_data(row['data'])
+            # Пока шло чтение, запись могла появиться в памяти - она новее
+            record = self._records.setdefault(key_str, loaded)
+        record.accessed_at = time.monotonic()
+        return record
+
+    @staticmethod
+    async def _load_row(conn, key_str: str):
+        async with conn.execute(
+            "SELECT state, data FROM fsm_storage WHERE key = ?", (key_str,)
+        ) as cursor:
+            return await cursor.fetchone()
+
+    def _mark_dirty(self, record: _Record):
+        record.dirty = True
+        self.writes += 1
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._get_record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._get_record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._get_record(key)
+        record.data = data.copy()
+        self._mark_dirty(record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._get_record(key)).data.copy()
+
+    # ========== СБРОС В БД ==========
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Ошибка сохранения FSM-хранилища")
+
+    async def flush(self):
+        """Запись всех изменённых сессий одной транзакцией"""
+        now = time.time()
+        upserts, deletes = [], []
+        for key_str, record in self._records.items():
+            if not record.dirty:
+                continue
+            record.dirty = False
+            if record.state is None and not record.data:
+                deletes.append((key_str,))
+            else:
+                upserts.append((key_str, record.state, dump_data(record.data), int(now)))
+
+        purge = now - self._last_purge >= PURGE_INTERVAL
+        if upserts or deletes or purge:
+            async def run(conn):
+                if upserts:
+                    await conn.executemany(
+                        """INSERT INTO fsm_storage (key, state, data, updated_at)
+                           VALUES (?, ?, ?, ?)
+                           ON CONFLICT (key) DO UPDATE SET
+                               state = excluded.state,
+                               data = excluded.data,
+                               updated_at = excluded.updated_at""",
+                        upserts
+                    )
+                if deletes:
+                    await conn.executemany("DELETE FROM fsm_storage WHERE key = ?", deletes)
+                if purge:
+                    await conn.execute(
+                        "DELETE FROM fsm_storage WHERE updated_at < ?", (int(now - self.ttl),)
+                    )
+
+            try:
+                await db.get_pool().write(run)
+            except BaseException:
+                # Вернём флаг, чтобы записать при следующем сбросе
+                for key_str, *_ in upserts + deletes:
+                    if key_str in self._records:
+                        self._records[key_str].dirty = True
+                raise
+            self.flushed_rows += len(upserts) + len(deletes)
+            if purge:
+                self._last_purge = now
+
+        self._evict_idle()
+
+    def _evict_idle(self):
+        """Выгрузка из памяти давно не использованных сохранённых сессий"""
+        deadline = time.monotonic() - self.cache_idle
+        idle = [
+            key_str for key_str, record in self._records.items()
+            if not record.dirty and record.accessed_at < deadline
+        ]
+        for key_str in idle:
+            del self._records[key_str]
+
+    def stats(self) -> Dict[str, Any]:
+        """Размер хранилища в памяти и число активных состояний"""
+        return {
+            "records": len(self._records),
+            "active_states": sum(1 for r in self._records.values() if r.state is not None),
+            "dirty": sum(1 for r in self._records.values() if r.dirty),
+            "writes": self.writes,
+            "flushed_rows": self.flushed_rows,
+        }
+
+    def state_counts(self) -> Dict[str, int]:
+        """Число сессий в памяти по текущему состоянию"""
+        counts: Dict[str, int] = {}
+        for record in self._records.values():
+            if record.state is not None:
+                counts[record.state] = counts.get(record.state, 0) + 1
+        return counts
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
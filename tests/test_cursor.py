@@ -0,0 +1,7 @@
+from database import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    ad = {'id': 42, 'created_at': "2024-03-05 07:08:09", 'price_value': 1500000}
+    assert decode_cursor(encode_cursor(ad)) == ("2024-03-05 07:08:09", 42)
+    assert decode_cursor(encode_cursor(ad, "price_asc"), "price_asc") == (1500000, 42)
@@ -0,0 +1,21 @@
+from prices import MAX_PRICE, parse_price, parse_price_range
+
+
+def test_parse_price_suffixes():
+    assert parse_price("1.5кк") == (1500000, False)
+    assert parse_price("500к торг") == (500000, True)
+    assert parse_price("100.000") == (100000, False)
+
+
+def test_parse_price_out_of_range():
+    # Сумма вне INTEGER SQLite не должна доходить до БД
+    assert parse_price("99999999999999999999") == (None, False)
+    assert parse_price("9" * 400 + " торг") == (None, True)
+    assert parse_price("10000000000ккк") == (None, False)
+    value, _ = parse_price("9000000000000000000")
+    assert value is not None and value <= MAX_PRICE
+
+
+def test_parse_price_range_out_of_range():
+    assert parse_price_range("99999999999999999999") == (None, None)
+    assert parse_price_range("1кк-99999999999999999999") == (1000000, None)
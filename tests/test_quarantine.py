@@ -0,0 +1,21 @@
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendPhoto
+
+from quarantine import is_photo_error
+
+
+def _error(description: str) -> TelegramBadRequest:
+    method = SendPhoto(chat_id=1, photo="x")
+    return TelegramBadRequest(method=method, message=description)
+
+
+def test_photo_errors():
+    assert is_photo_error(_error("Bad Request: wrong file identifier/HTTP URL specified"))
+    assert is_photo_error(_error("Bad Request: file reference expired"))
+    assert is_photo_error(_error("Bad Request: wrong type of the web page content"))
+
+
+def test_other_errors():
+    assert not is_photo_error(_error("Bad Request: message to edit not found"))
+    assert not is_photo_error(_error("Bad Request: message is not modified"))
+    assert not is_photo_error(_error("Bad Request: chat not found"))
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import signal
+from typing import Any, Dict, List
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from config import (
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+    WEBHOOK_MAX_CONNECTIONS, WEBHOOK_DRAIN_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """Обработчик вебхука: отвечает Telegram сразу, апдейт обрабатывается в фоне
+
+    При остановке новые запросы получают 503 (Telegram повторит их позже),
+    а начатые апдейты дорабатывают до WEBHOOK_DRAIN_TIMEOUT секунд.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, drain_timeout: float, **kwargs: Any):
+        super().__init__(dispatcher, bot, handle_in_background=True, **kwargs)
+        self.drain_timeout = drain_timeout
+        self._draining = False
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self._draining:
+            return web.Response(text="Shutting down", status=503)
+        return await super().handle(request)
+
+    async def _background_feed_update(self, bot: Bot, update: Dict[str, Any]) -> None:
+        # Как и при поллинге, ошибка обработки апдейта только логируется
+        try:
+            await super()._background_feed_update(bot, update)
+        except Exception:
+            logger.exception(f"Ошибка обработки апдейта {update.get('update_id')}")
+
+    async def drain(self, app: web.Application = None):
+        """Ожидание апдейтов, принятых до остановки"""
+        self._draining = True
+        tasks = set(self._background_feed_update_tasks)
+        if not tasks:
+            return
+        logger.info(f"Ожидаем обработки {len(tasks)} апдейтов перед остановкой")
+        _, pending = await asyncio.wait(tasks, timeout=self.drain_timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Не дождались {len(pending)} апдейтов, обработка прервана")
+
+
+async def register_webhook(bot: Bot, allowed_updates: List[str]):
+    """Регистрация вебхука в Telegram (если задан WEBHOOK_URL)"""
+    if not WEBHOOK_URL:
+        logger.warning("WEBHOOK_URL не задан - вебхук в Telegram не регистрируется")
+        return
+    await bot.set_webhook(
+        url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET or None,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=allowed_updates
+    )
+    logger.info(f"Вебхук установлен: {WEBHOOK_URL}{WEBHOOK_PATH}")
+
+
+async def serve(app: web.Application):
+    """Работа aiohttp-приложения до SIGINT/SIGTERM"""
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Сервер вебхука слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
+        # Сначала перестаём принимать соединения, затем on_shutdown приложения
+        await runner.cleanup()
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    """Приём апдейтов через вебхук до SIGINT/SIGTERM
+
+    Если WEBHOOK_URL не задан, вебхук в Telegram не регистрируется -
+    так сервер можно проверить локально, отправляя JSON апдейтов
+    POST-запросом на WEBHOOK_PATH.
+    """
+    handler = DrainingRequestHandler(
+        dp, bot, drain_timeout=WEBHOOK_DRAIN_TIMEOUT, secret_token=WEBHOOK_SECRET or None
+    )
+
+    app = web.Application()
+    # Порядок остановки: дождаться апдейтов, затем shutdown диспетчера, затем закрыть сессию бота
+    app.on_shutdown.append(handler.drain)
+    setup_application(app, dp, bot=bot)
+    handler.register(app, path=WEBHOOK_PATH)
+
+    await register_webhook(bot, dp.resolve_used_update_types())
+    await serve(app)
@@ -0,0 +1,267 @@
+import asyncio
+import hmac
+import logging
+import multiprocessing as mp
+import queue
+import signal
+import time
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+
+import broadcast
+import database as db
+import metrics
+import quarantine
+from config import (
+    BOT_MODE, ADMIN_IDS, METRICS_HOST, METRICS_PORT, WEBHOOK_PATH, WEBHOOK_SECRET,
+    WORKERS, WORKER_QUEUE_SIZE, SUPERVISOR_INTERVAL, WORKER_STOP_TIMEOUT
+)
+from loader import create_bot, create_dispatcher
+from ratelimit import api_limiter, process_rate
+from webhook import register_webhook, serve
+
+logger = logging.getLogger(__name__)
+
+# Процессы создаются через spawn: форк процесса с запущенным event loop небезопасен
+_context = mp.get_context("spawn")
+
+
+def update_user_id(update: Dict[str, Any]) -> int:
+    """Отправитель апдейта (from/user первого вложенного объекта), 0 если его нет"""
+    for key, payload in update.items():
+        if key != "update_id" and isinstance(payload, dict):
+            user = payload.get("from") or payload.get("user") or {}
+            return user.get("id", 0)
+    return 0
+
+
+# ========== ВОРКЕР ==========
+
+def worker_main(index: int, updates: mp.Queue):
+    """Точка входа процесса-воркера"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - worker{index} - %(name)s - %(levelname)s - %(message)s',
+        force=True
+    )
+    # Останавливает воркер только фронт (через None в очереди), после дренажа
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(_run_worker(index, updates))
+
+
+async def _run_worker(index: int, updates: mp.Queue):
+    # Воркер 0 ведёт рассылки и получает под них больший лимит Bot API
+    api_limiter.set_rate(process_rate(index))
+    await db.init_db()
+    bot = create_bot()
+    dp = create_dispatcher()
+    await dp.emit_startup(bot=bot)
+    if METRICS_PORT:
+        await metrics.start_server(METRICS_HOST, METRICS_PORT + index)
+
+    # Все апдейты админов приходят в воркер 0, там же живут рассылки
+    # и перепроверка фото из карантина
+    if index == 0:
+        await broadcast.resume_unfinished(bot)
+        quarantine.start(bot)
+
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    try:
+        while True:
+            update = await loop.run_in_executor(None, updates.get)
+            if update is None:
+                break
+            task = asyncio.create_task(_feed(dp, bot, update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        # Дорабатываем уже полученные апдейты
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await dp.emit_shutdown(bot=bot)
+        await dp.storage.close()
+        await bot.session.close()
+        await db.close_db()
+        logger.info(f"Воркер {index} остановлен")
+
+
+async def _feed(dp, bot: Bot, update: Dict[str, Any]):
+    try:
+        await dp.feed_raw_update(bot, update)
+    except Exception:
+        logger.exception(f"Ошибка обработки апдейта {update.get('update_id')}")
+
+
+# ========== СУПЕРВИЗОР ==========
+
+class Supervisor:
+    """Запуск воркеров, раздача апдейтов по from_user.id и перезапуск упавших
+
+    Апдейты одного пользователя всегда попадают в один воркер, поэтому
+    его FSM-состояние в памяти SQLiteStorage не расходится между процессами.
+    Кэш пользователей у каждого воркера свой, поэтому блокировку
+    get_user_cached сверяет с БД при каждом обращении.
+    """
+
+    def __init__(self, count: int = WORKERS):
+        self.count = count
+        self.queues: List[mp.Queue] = [_context.Queue(WORKER_QUEUE_SIZE) for _ in range(count)]
+        self.processes: List[Optional[mp.Process]] = [None] * count
+        self.restarts = [0] * count
+        self.dispatched = [0] * count
+        self._stopping = False
+        self._monitor_task: Optional[asyncio.Task] = None
+
+    def _spawn(self, index: int):
+        process = _context.Process(
+            target=worker_main, args=(index, self.queues[index]),
+            name=f"worker{index}", daemon=False
+        )
+        process.start()
+        self.processes[index] = process
+        logger.info(f"Воркер {index} запущен (pid {process.pid})")
+
+    def start(self):
+        for index in range(self.count):
+            self._spawn(index)
+        self._monitor_task = asyncio.create_task(self._monitor())
+
+    def shard(self, update: Dict[str, Any]) -> int:
+        user_id = update_user_id(update)
+        if user_id in ADMIN_IDS:
+            return 0
+        return user_id % self.count
+
+    async def dispatch(self, update: Dict[str, Any]):
+        """Передача апдейта воркеру; при полной очереди ждём (обратное давление)"""
+        index = self.shard(update)
+        self.dispatched[index] += 1
+        try:
+            self.queues[index].put_nowait(update)
+        except queue.Full:
+            logger.warning(f"Очередь воркера {index} переполнена")
+            await asyncio.get_running_loop().run_in_executor(None, self.queues[index].put, update)
+
+    async def _monitor(self):
+        while not self._stopping:
+            await asyncio.sleep(SUPERVISOR_INTERVAL)
+            for index, process in enumerate(self.processes):
+                if self._stopping or process is None or process.is_alive():
+                    continue
+                self.restarts[index] += 1
+                # Упавший процесс мог умереть, держа блокировку чтения очереди -
+                # новый воркер получает новую очередь, буфер старой теряется
+                lost = self.queues[index].qsize()
+                self.queues[index] = _context.Queue(WORKER_QUEUE_SIZE)
+                logger.error(
+                    f"Воркер {index} завершился с кодом {process.exitcode}, "
+                    f"перезапуск #{self.restarts[index]}, потеряно апдейтов: {lost}"
+                )
+                self._spawn(index)
+            depths = ", ".join(f"{s['index']}: {s['queue']}" for s in self.stats())
+            logger.info(f"Очереди воркеров: {depths}")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Состояние воркеров: pid, жив ли, глубина очереди, перезапуски"""
+        return [
+            {
+                "index": index,
+                "pid": process.pid if process else None,
+                "alive": bool(process and process.is_alive()),
+                "queue": self.queues[index].qsize(),
+                "dispatched": self.dispatched[index],
+                "restarts": self.restarts[index],
+            }
+            for index, process in enumerate(self.processes)
+        ]
+
+    async def stop(self):
+        """Остановка: воркеры дорабатывают очередь и выходят"""
+        self._stopping = True
+        if self._monitor_task is not None:
+            self._monitor_task.cancel()
+        loop = asyncio.get_running_loop()
+        for updates in self.queues:
+            await loop.run_in_executor(None, updates.put, None)
+        deadline = time.monotonic() + WORKER_STOP_TIMEOUT
+        for index, process in enumerate(self.processes):
+            if process is None:
+                continue
+            await loop.run_in_executor(None, process.join, max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Воркер {index} не остановился вовремя, завершаем")
+                process.terminate()
+
+
+# ========== ФРОНТ ==========
+
+async def _poll(bot: Bot, supervisor: Supervisor, allowed_updates: List[str]):
+    """Long polling без обработки: апдейты сразу уходят воркерам"""
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(
+                offset=offset, timeout=30, allowed_updates=allowed_updates
+            )
+        except TelegramRetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+            continue
+        except TelegramNetworkError as e:
+            logger.warning(f"Ошибка получения апдейтов: {e}")
+            await asyncio.sleep(5)
+            continue
+        for update in updates:
+            await supervisor.dispatch(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+            offset = update.update_id + 1
+
+
+async def _run_polling(bot: Bot, supervisor: Supervisor, allowed_updates: List[str]):
+    await bot.delete_webhook()
+    task = asyncio.create_task(_poll(bot, supervisor, allowed_updates))
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    stop_task = asyncio.create_task(stop.wait())
+    try:
+        await asyncio.wait([task, stop_task], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        task.cancel()
+        stop_task.cancel()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
+    if task.done() and not task.cancelled() and task.exception():
+        raise task.exception()
+
+
+async def _run_webhook(bot: Bot, supervisor: Supervisor, allowed_updates: List[str]):
+    async def handle(request: web.Request) -> web.Response:
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if WEBHOOK_SECRET and not hmac.compare_digest(token.encode(), WEBHOOK_SECRET.encode()):
+            return web.Response(text="Unauthorized", status=401)
+        await supervisor.dispatch(await request.json())
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle)
+    await register_webhook(bot, allowed_updates)
+    await serve(app)
+
+
+async def run_front(bot: Bot):
+    """Фронт-процесс: приём апдейтов (polling или webhook) и раздача воркерам"""
+    allowed_updates = create_dispatcher().resolve_used_update_types()
+    supervisor = Supervisor()
+    supervisor.start()
+    try:
+        if BOT_MODE == "webhook":
+            await _run_webhook(bot, supervisor, allowed_updates)
+        else:
+            await _run_polling(bot, supervisor, allowed_updates)
+    finally:
+        await supervisor.stop()
+        await bot.session.close()